@@ -0,0 +1,85 @@
+import io
+import wave
+import numpy as np
+
+TARGET_RATE = 16000      # Whisper works at 16 kHz internally; anything above is wasted upload
+CHUNK_SECONDS = 120      # aim for chunks this long when a recording is split...
+SEARCH_SECONDS = 20      # ...cutting at the quietest moment within this distance of the aim
+FRAME_MS = 30            # loudness window for finding silences
+
+
+def load_wav(data):
+    """(mono float32 samples in [-1, 1], sample rate) from WAV bytes; raises wave.Error otherwise"""
+    with wave.open(io.BytesIO(data)) as w:
+        channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        frames = w.readframes(w.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+        samples = (np.where(ints >= 1 << 23, ints - (1 << 24), ints)).astype(np.float32) / (1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise wave.Error(f"unsupported sample width: {width}")
+    if channels > 1: samples = samples[: len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+
+def resample(samples, rate, target=TARGET_RATE):
+    """Low-pass (windowed sinc) then linear interpolation to `target` Hz"""
+    if rate == target or len(samples) == 0: return samples
+    if target < rate:
+        cutoff = target / rate / 2
+        taps = np.arange(-16, 17)
+        kernel = np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        samples = np.convolve(samples, kernel / kernel.sum(), mode="same")
+    n = int(len(samples) * target / rate)
+    return np.interp(np.arange(n) * rate / target, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def encode_wav(samples, rate=TARGET_RATE):
+    """16-bit mono PCM WAV bytes"""
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def split_points(samples, rate, chunk_seconds=CHUNK_SECONDS, search_seconds=SEARCH_SECONDS, frame_ms=FRAME_MS):
+    """
+    Sample offsets where a long recording should be cut: one near every `chunk_seconds`,
+    moved to the quietest frame within `search_seconds` so no word is cut in half.
+    """
+    frame = max(int(rate * frame_ms / 1000), 1)
+    n_frames = len(samples) // frame
+    if len(samples) <= rate * (chunk_seconds + search_seconds) or n_frames == 0: return []
+    energy = np.sqrt(np.mean(samples[: n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    per_chunk, search = int(chunk_seconds * 1000 // frame_ms), int(search_seconds * 1000 // frame_ms)
+    cuts, last = [], 0
+    while n_frames - last > per_chunk + search:
+        lo = last + per_chunk - search
+        quietest = lo + int(np.argmin(energy[lo: last + per_chunk + search]))
+        cuts.append(quietest * frame + frame // 2)
+        last = quietest
+    return cuts
+
+
+def prepare(data, target_rate=TARGET_RATE, chunk_seconds=CHUNK_SECONDS):
+    """
+    Turns a recording into upload-ready chunks: mono, `target_rate` 16-bit WAV, split at
+    silences when longer than `chunk_seconds`. Returns [(start offset in seconds, bytes)].
+    Non-WAV input is passed through as one chunk.
+    """
+    try: samples, rate = load_wav(data)
+    except (wave.Error, EOFError): return [(0.0, data)]
+    samples = resample(samples, rate, target_rate)
+    bounds = [0] + split_points(samples, target_rate, chunk_seconds) + [len(samples)]
+    return [(a / target_rate, encode_wav(samples[a:b], target_rate)) for a, b in zip(bounds, bounds[1:])]
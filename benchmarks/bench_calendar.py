@@ -0,0 +1,218 @@
+"""
+gcal.CalendarClient and CalendarMirror against a local fake Calendar API (token endpoint +
+events.list with syncTokens).
+
+    python benchmarks/bench_calendar.py --reruns 200 --events 500
+
+Streamlit runs every rerun on a new thread, so each "rerun" here is a fresh thread making
+one Calendar call. The pooled client must serve them from a handful of built services and
+keep-alive connections; pool_size=0 (a build and a new connection per call) is the old cost.
+
+The mirror is then synced through the same endpoint: a full sync, incremental syncs that
+only carry changes (adds, edits, cancellations), a full resync after the server answers
+410 Gone for an expired token, and background refreshes from many reruns that must all
+go through one sync thread.
+"""
+import argparse
+import datetime
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gcal
+import pytz
+
+
+class FakeCalendarServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, events=()):
+        super().__init__(("127.0.0.1", 0), FakeCalendarHandler)
+        self.lock = threading.Lock()
+        self.events = {}    # id -> event (cancelled ones stay, like Google's showDeleted)
+        self.changed = {}   # id -> version of its last change
+        self.version = 0
+        self.oldest_token = 0  # tokens older than this get 410 Gone
+        self.connections = 0
+        self.requests = 0
+        self.tokens = 0
+        self.last_items = 0
+        for event in events: self.put(event)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def put(self, event):
+        with self.lock:
+            self.version += 1
+            self.events[event["id"]] = event
+            self.changed[event["id"]] = self.version
+
+    def expire_tokens(self):
+        with self.lock: self.oldest_token = self.version + 1
+
+    def list_events(self, params):
+        """(status, body) for an events.list request (called under the lock)"""
+        token = params.get("syncToken", [None])[0]
+        if token is None:
+            items = [e for e in self.events.values() if e.get("status") != "cancelled"]
+        elif int(token) < self.oldest_token:
+            return 410, {"error": {"code": 410, "message": "Sync token is no longer valid, a full sync is required."}}
+        else:
+            items = [self.events[i] for i, v in self.changed.items() if v > int(token)]
+        self.last_items = len(items)
+        return 200, {"items": items, "nextSyncToken": str(self.version)}
+
+
+class FakeCalendarHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so reused connections show up as such
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def log_message(self, *args): pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock: self.server.connections += 1
+
+    def _reply(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):  # OAuth token exchange for the service account
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock: self.server.tokens += 1
+        self._reply({"access_token": "fake", "expires_in": 3600, "token_type": "Bearer"})
+
+    def do_GET(self):  # events.list
+        url = urlparse(self.path)
+        with self.server.lock:
+            self.server.requests += 1
+            status, body = self.server.list_events(parse_qs(url.query))
+        self._reply(body, status)
+
+
+def service_account_info(token_uri):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode()
+    return {"type": "service_account", "project_id": "bench", "private_key_id": "bench", "private_key": key,
+            "client_email": "bench@bench.iam.gserviceaccount.com", "client_id": "1", "token_uri": token_uri}
+
+
+def make_event(i, day, hour):
+    start = datetime.datetime.combine(day, datetime.time(hour)).isoformat() + "+08:00"
+    end = datetime.datetime.combine(day, datetime.time(hour + 1)).isoformat() + "+08:00"
+    return {"id": f"ev{i}", "summary": f"Event {i}", "status": "confirmed",
+            "start": {"dateTime": start}, "end": {"dateTime": end}}
+
+
+def reruns(client, n):
+    """n calls, each from a new thread; returns ms per call"""
+    times = []
+
+    def rerun():
+        start = time.perf_counter()
+        with client.service() as service:
+            service.events().list(calendarId=client.calendar_id, maxResults=10).execute()
+        times.append((time.perf_counter() - start) * 1000)
+
+    for _ in range(n):
+        t = threading.Thread(target=rerun)
+        t.start()
+        t.join()
+    return times
+
+
+def check_mirror(server, client, n):
+    """syncToken round trips and the 410 fallback; returns a list of failures"""
+    tz, day = pytz.timezone("Asia/Shanghai"), datetime.date(2025, 3, 3)
+    failures = []
+
+    def expect(label, cond):
+        print(f"  {'ok  ' if cond else 'FAIL'} {label}")
+        if not cond: failures.append(label)
+
+    def on_server(date_str):
+        return sorted(e["id"] for e in server.events.values()
+                      if e.get("status") != "cancelled" and e["start"]["dateTime"].startswith(date_str))
+
+    for i in range(n): server.put(make_event(i, day + datetime.timedelta(days=i % 5), 8 + i % 10))
+    mirror = gcal.CalendarMirror(client, tz, refresh_after=3600, max_staleness=3600)
+    mirror.sync()
+    expect(f"full sync lists all {n} events", server.last_items == n and mirror.full_syncs == 1)
+    expect("day index matches the server", sorted(e["id"] for e in mirror.events_on(day.isoformat())) == on_server(day.isoformat()))
+
+    server.put(make_event(n, day, 21))
+    server.put(dict(server.events["ev0"], status="cancelled"))
+    server.put(dict(make_event(5, day, 20), summary="Moved"))
+    mirror.sync()
+    ids = [e["id"] for e in mirror.events_on(day.isoformat())]
+    expect("incremental sync carries only the 3 changes", server.last_items == 3 and mirror.incremental_syncs == 1)
+    expect("add, cancel and edit applied", f"ev{n}" in ids and "ev0" not in ids and ids[-2:] == ["ev5", f"ev{n}"])
+
+    server.expire_tokens()
+    server.put(make_event(n + 1, day, 22))
+    mirror.sync()
+    expect("410 Gone falls back to a full resync", mirror.full_syncs == 2 and server.last_items == n + 1)
+    expect("state after the resync matches the server", all(
+        sorted(e["id"] for e in mirror.events_on((day + datetime.timedelta(days=d)).isoformat()))
+        == on_server((day + datetime.timedelta(days=d)).isoformat()) for d in range(5)))
+
+    # Every rerun finds the mirror stale: refreshes must be coalesced by one sync thread
+    mirror.refresh_after = 0
+    syncs = mirror.incremental_syncs
+    for _ in range(50):
+        t = threading.Thread(target=mirror.events_on, args=(day.isoformat(),))
+        t.start()
+        t.join()
+    time.sleep(0.2)
+    workers = sum(t.name == "calendar-sync" for t in threading.enumerate())
+    expect(f"background refreshes share one sync thread ({mirror.incremental_syncs - syncs} syncs)", workers == 1)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reruns", type=int, default=200)
+    parser.add_argument("--events", type=int, default=500)
+    args = parser.parse_args()
+
+    server = FakeCalendarServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    info = service_account_info(server.url + "/token")
+
+    ok = True
+    print(f"{'client':14} {'ms/call':>8} {'builds':>7} {'connections':>12}")
+    for name, pool_size in (("pooled", gcal.POOL_SIZE), ("unpooled", 0)):
+        before = server.connections
+        client = gcal.CalendarClient(info, api_endpoint=server.url + "/", pool_size=pool_size)
+        times = sorted(reruns(client, args.reruns))
+        s = client.stats()
+        connections = server.connections - before
+        print(f"{name:14} {times[len(times) // 2]:8.2f} {s['builds']:7} {connections:12}")
+        if pool_size: ok &= s["builds"] == 1 and connections <= 2  # token exchange + one keep-alive
+        if pool_size: pooled = client
+
+    print("mirror:")
+    builds = pooled.stats()["builds"]
+    failures = check_mirror(server, pooled, args.events)
+    ok &= not failures and pooled.stats()["builds"] == builds
+    server.shutdown()
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
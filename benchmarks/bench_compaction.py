@@ -0,0 +1,65 @@
+"""
+How long readers stall while JournalStore compacts: one thread calls load() in a loop while
+compact() rewrites the snapshot of a large store.
+
+    python benchmarks/bench_compaction.py --items 100000
+
+Prints the load() latency (p50 / max) during compaction next to the compaction time.
+Serializing the snapshot must not happen under the store's thread lock, so the worst
+load() should stay far below the time compact() takes.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--journal", type=int, default=500, help="entries in the journal when compact() starts")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "data.json")
+        db = store.JournalStore(path, compact_every=10 ** 9)
+        db.save({"Modules": {f"Module {m}": {"tasks": [{"id": f"{m}-{n}", "title": f"task {n} of module {m}", "details": "",
+                                                        "date": f"2025-{n % 12 + 1:02d}-{n % 28 + 1:02d}"}
+                                                       for n in range(args.items // 40)], "events": [], "notes": []}
+                             for m in range(40)}, "Meta": {}})
+        for n in range(args.journal): db.add_item("Module 0", "tasks", {"id": f"j-{n}", "title": "journal", "date": "2025-06-01"})
+
+        latencies, done = [], threading.Event()
+        def reader():
+            while not done.is_set():
+                start = time.perf_counter()
+                db.load()
+                latencies.append(time.perf_counter() - start)
+                time.sleep(0.001)
+        thread = threading.Thread(target=reader)
+        thread.start()
+        time.sleep(0.05)
+        start = time.perf_counter()
+        db.compact()
+        took = time.perf_counter() - start
+        done.set()
+        thread.join()
+
+        reopened = store.JournalStore(path)
+        ok = reopened._document() == db._document() and os.path.getsize(db.journal_path) == 0
+    ms = sorted(t * 1000 for t in latencies)
+    print(f"{args.items} items, {args.journal} journal entries: compact {took * 1000:.0f} ms; "
+          f"load() during it p50 {statistics.median(ms):.2f} ms, max {ms[-1]:.2f} ms over {len(ms)} calls")
+    ok = ok and ms[-1] < took * 1000 / 4
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
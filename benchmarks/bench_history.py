@@ -0,0 +1,87 @@
+"""
+Prompt size per chat turn: the whole session history (what main.py used to send) vs
+memory.ChatMemory (recent turns within a token budget + running summary).
+
+    python benchmarks/bench_history.py --turns 200 --budget 3000
+
+Conversations are synthetic and seeded: short questions, answers from a sentence to a
+few paragraphs, the odd pasted document. The summarizer is a stand-in that returns a
+summary of SUMMARY_TOKENS tokens, so the numbers measure the history policy; summary
+calls are counted because each one costs a model request in the app.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import memory
+
+WORDS = ("the exam contract remedy breach capital budget lecture essay deadline group meeting "
+         "strategy china market risk return reading chapter notes professor week plan").split()
+SYSTEM_TOKENS = 40  # the CHAT system prompt, sent either way
+
+
+def sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def conversation(turns, seed=0):
+    rng = random.Random(seed)
+    for _ in range(turns):
+        if rng.random() < 0.05: user = "Summarize this:\n" + " ".join(sentence(rng, 20) for _ in range(rng.randint(20, 60)))
+        else: user = sentence(rng, rng.randint(5, 25))
+        reply = " ".join(sentence(rng, rng.randint(8, 20)) for _ in range(rng.choice([1, 2, 4, 8, 15])))
+        yield user, reply
+
+
+def stand_in_summary(summary, evicted):
+    """A summary as long as the real one is allowed to be"""
+    rng, words = random.Random(len(evicted)), []
+    while memory.count_tokens(" ".join(words)) < memory.SUMMARY_TOKENS - 10: words.append(rng.choice(WORDS))
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=memory.HISTORY_TOKENS)
+    parser.add_argument("--seeds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"encoder: {'tiktoken' if memory._encoding() else 'local estimate'}; budget {args.budget} tokens")
+    checkpoints = sorted({t for t in (10, 25, 50, 100, 200, 500, args.turns) if t <= args.turns})
+    ok = True
+    for seed in range(args.seeds):
+        mem = memory.ChatMemory(args.budget, summarize=stand_in_summary)
+        history, full_total, managed_total, worst, elapsed = [], 0, 0, 0, 0.0
+        rows = []
+        for turn, (user, reply) in enumerate(conversation(args.turns, seed), 1):
+            prompt = [{"role": "user", "content": user}]
+            full = SYSTEM_TOKENS + memory.message_tokens(history + prompt)
+            start = time.perf_counter()
+            window = mem.window(history)
+            elapsed += time.perf_counter() - start
+            managed = SYSTEM_TOKENS + memory.message_tokens(window + prompt)
+            full_total += full
+            managed_total += managed
+            worst = max(worst, memory.message_tokens(window))
+            if turn in checkpoints: rows.append((turn, full, managed, mem.summaries))
+            history += [{"role": "user", "content": user}, {"role": "assistant", "content": reply}]
+
+        print(f"\nconversation {seed}:  turn   full prompt   managed   saved   summaries so far")
+        for turn, full, managed, summaries in rows:
+            print(f"{'':17}{turn:5} {full:12} {managed:9} {1 - managed / full:6.0%} {summaries:9}")
+        print(f"{'':17}all turns: {full_total} -> {managed_total} prompt tokens ({1 - managed_total / full_total:.0%} saved), "
+              f"{mem.summaries} summaries, window {elapsed / args.turns * 1000:.2f} ms/turn")
+        summary = memory.SUMMARY_TOKENS + 20  # summary message with its header
+        # The newest message is always kept, so one oversized paste may exceed the budget by itself
+        longest = max(memory.message_tokens([m]) for m in history)
+        ok &= worst <= max(args.budget, longest) + summary and mem.summaries < args.turns / 2
+    print("\nOK" if ok else "\nFAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Bulk NDJSON import/export (bulk.py) into the SQLite store: throughput, and peak Python
+memory that must not grow with the size of the file.
+
+    python benchmarks/bench_ndjson.py --sizes 20000 100000
+
+Records are generated line by line and never held as a list, so tracemalloc's peak is
+what the pipeline and the store keep, not the input. Rates include tracemalloc's overhead.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bulk
+import store
+
+MODULES = ["General", "Business Law", "Corporate Finance", "Strategic Management", "Chinese 101"]
+WORDS = "market contract remedy capital budget exam lecture reading essay group meeting risk return china law".split()
+
+
+def records(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        kind = ("task", "event", "note")[i % 3]
+        record = {"module": MODULES[i % len(MODULES)], "type": kind, "title": " ".join(rng.choices(WORDS, k=4)),
+                  "details": " ".join(rng.choices(WORDS, k=30)), "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+        if i % 50 == 49: record = {"module": "General", "type": "event", "title": "no date"}  # invalid, must be skipped
+        yield json.dumps(record) + "\n"
+
+
+class NullWriter:
+    def __init__(self): self.lines = 0
+    def write(self, line): self.lines += 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--chunk", type=int, default=bulk.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    ok, peaks = True, []
+    print("   lines   imported  skipped   import/s   peak MB   export/s   peak MB")
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            db = store.SQLiteStore(os.path.join(folder, "data.db"))
+            tracemalloc.start()
+            start = time.perf_counter()
+            imported, skipped = bulk.import_ndjson(db, records(n), args.chunk)
+            import_s = time.perf_counter() - start
+            import_peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+
+            db = store.SQLiteStore(os.path.join(folder, "data.db"))  # a fresh process would start here
+            out = NullWriter()
+            tracemalloc.start()
+            start = time.perf_counter()
+            exported = bulk.export_ndjson(db, out)
+            export_s = time.perf_counter() - start
+            export_peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+        print(f"{n:8} {imported:10} {skipped:8} {imported / import_s:10.0f} {import_peak:9.1f} {exported / export_s:10.0f} {export_peak:9.1f}")
+        peaks.append(max(import_peak, export_peak))
+        ok &= skipped == n // 50 and imported == n - skipped and exported == imported
+    flat = max(peaks) < 2 * min(peaks) + 1  # not proportional to the number of lines
+    print(f"peak memory {'flat' if flat else 'GROWS'} across sizes")
+    print("OK" if ok and flat else "FAILED")
+    sys.exit(0 if ok and flat else 1)
+
+
+if __name__ == "__main__":
+    main()
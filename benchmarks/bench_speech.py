@@ -0,0 +1,114 @@
+"""
+Coach metrics on long synthetic transcripts: speech.analyze (NumPy) vs a straightforward
+pure-Python reference. Both must agree, and repeated runs must give identical output.
+
+    python benchmarks/bench_speech.py --words 1000 10000 50000
+    python benchmarks/bench_speech.py --words 200000 --no-reference
+
+Transcripts are generated from a fixed seed: ~105 wpm speech with fillers, repeats and a
+spread of pauses, so a 50k-word transcript is roughly an 8-hour talk.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import speech
+
+VOCAB = ("the market growth strategy we should consider because investors value risk and return "
+         "in china firms compete on cost so this model shows how capital moves across borders").split()
+
+
+def synthetic_words(n, seed=0):
+    rng = random.Random(seed)
+    words, t = [], 0.0
+    while len(words) < n:
+        r = rng.random()
+        if r < 0.04: token = rng.choice(["um", "uh", "er", "hmm"])
+        elif r < 0.05: token = "you know"
+        elif r < 0.06 and words: token = words[-1]["word"]  # "the the"
+        else: token = rng.choice(VOCAB)
+        for part in token.split():
+            dur = rng.uniform(0.15, 0.45)
+            words.append({"word": part, "start": round(t, 3), "end": round(t + dur, 3)})
+            gap = rng.choice([0.02] * 12 + [0.35, 0.6, 1.2, 2.0])
+            t += dur + gap * rng.uniform(0.8, 1.2)
+    return words[:n]
+
+
+CLEAN = ("So the market is right where we expected. Actually, investors like firms that compete on cost, "
+         "and okay, that is literally what the model shows, basically a shift of capital across borders.")
+
+
+def timed(text, wpm=140):
+    step = 60 / wpm
+    return [{"word": w, "start": round(i * step, 3), "end": round(i * step + step * 0.8, 3)} for i, w in enumerate(text.split())]
+
+
+def reference(words, fillers=speech.FILLERS):
+    """Plain loops over the same definitions, used to check the vectorized engine"""
+    tokens, starts, ends = [], [], []
+    for w in words:
+        for tok in speech.tokenize(w["word"]):
+            tokens.append(tok); starts.append(w["start"]); ends.append(w["end"])
+    counts, used = {}, [False] * len(tokens)
+    for phrase in sorted(fillers, key=lambda p: -len(p.split())):
+        parts = phrase.split()
+        for i in range(len(tokens) - len(parts) + 1):
+            if tokens[i:i + len(parts)] == parts and not any(used[i:i + len(parts)]):
+                for k in range(len(parts)): used[i + k] = True
+                counts[phrase] = counts.get(phrase, 0) + 1
+    gaps = [starts[i + 1] - ends[i] for i in range(len(tokens) - 1)]
+    gaps = [g for g in gaps if g > speech.PAUSE_SECONDS]
+    windows, edge = [], starts[0]
+    while edge <= starts[-1] - speech.WINDOW_SECONDS:
+        windows.append(sum(1 for s in starts if edge <= s < edge + speech.WINDOW_SECONDS) * 60 / speech.WINDOW_SECONDS)
+        edge += speech.STEP_SECONDS
+    return {
+        "filler_count": sum(counts.values()),
+        "pause_count": len(gaps),
+        "long_pauses": sum(1 for g in gaps if g > speech.LONG_PAUSE_SECONDS),
+        "immediate_repeats": sum(1 for a, b in zip(tokens, tokens[1:]) if a == b),
+        "wpm_max": round(max(windows), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-reference", action="store_true", help="skip the (slow) pure-Python check")
+    args = parser.parse_args()
+
+    clean = speech.analyze(timed(CLEAN))
+    ok = clean["filler_count"] == 0
+    print(f"clean speech (so/like/right/actually as content words): fillers {clean['filler_count']}, grade {clean['grade']}")
+    for n in args.words:
+        words = synthetic_words(n)
+        runs, times = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            runs.append(speech.analyze(words))
+            times.append(time.perf_counter() - start)
+        same = all(r == runs[0] for r in runs)
+        stats = runs[0]
+        line = (f"{n:>7} words ({stats['duration'] / 60:6.1f} min): numpy {min(times) * 1000:8.1f} ms"
+                f"  grade {stats['grade']}  pace {stats['pacing_score']}  fillers {stats['filler_count']}"
+                f"  reproducible {'yes' if same else 'NO'}")
+        ok &= same
+        if not args.no_reference:
+            start = time.perf_counter()
+            ref = reference(words)
+            elapsed = time.perf_counter() - start
+            agree = all(stats[k] == v for k, v in ref.items())
+            ok &= agree
+            line += f"  | python {elapsed * 1000:9.1f} ms  agree {'yes' if agree else 'NO ' + str({k: (stats[k], v) for k, v in ref.items()})}"
+        print(line)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
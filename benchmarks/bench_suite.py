@@ -0,0 +1,348 @@
+"""
+Hot-path benchmark suite: store load/save, the views main.py builds on every rerun, the
+morning briefing and chat routing, on synthetic data.json stores of any size.
+
+    python benchmarks/bench_suite.py --sizes 1000 10000 100000 --output results.json
+    python benchmarks/bench_suite.py --sizes 1000000 --backends sqlite --output big.json
+    python benchmarks/bench_suite.py --compare results.json --output new.json
+
+Each (size, backend) runs in its own temporary folder through utils.py, so the app's
+code paths and caches are what get timed. OpenAI, Google Calendar and Telegram are local
+stubs with configurable latency (--llm-latency, --calendar-latency, --telegram-latency).
+An op is repeated --repeat times or until it has used --budget seconds.
+
+Results are JSON: one row per (backend, items, op) with runs, mean, p50, p95, min and
+max in milliseconds, plus router.stats() of the chat ops per (intent, path): turns, model
+round-trips and latency, so the local fast path and the LLM path can be told apart. --compare reads an earlier results file, prints the p50 ratio per
+op and exits 1 if any op got slower than --tolerance allows.
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import streamlit as st
+import streamlit.logger
+streamlit.logger.set_log_level(logging.ERROR)  # "missing ScriptRunContext" outside `streamlit run`
+import memory
+import notifier
+import router
+import scheduler
+import store
+import utils
+
+WORDS = ("market contract remedy capital budget exam lecture reading essay group meeting risk return "
+         "china law strategy finance case study deadline chapter slides project").split()
+EXTRA_MODULES = ["Seminar", "Workshop", "Club", "Project", "Internship", "Language Exchange", "Reading Group"]
+
+
+# --- 1. STUBS ---
+
+class FakeOpenAI:
+    """Chat completions (plain, streamed, router tool call) and embeddings after `latency` seconds"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    def _complete(self, model, messages, stream=False, tools=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        if tools:
+            # "remind" makes an event with a phone push (Calendar + Telegram), anything else is a query
+            text, today = messages[-1]["content"], utils.get_current_date_str()
+            args = {"intent": "QUERY", "date": today}
+            if "remind" in text.lower():
+                args = {"intent": "ACTION", "date": today, "action": {
+                    "type": "event", "module": "General", "title": text[-60:], "details": text, "date": today,
+                    "time": "15:00", "reminder_minutes": 15, "notify_telegram": True}}
+            call = SimpleNamespace(function=SimpleNamespace(name="route", arguments=json.dumps(args)))
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(tool_calls=[call], content=None))])
+        reply = "You have a lecture at ten and the group meeting after lunch."
+        if stream:
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=w + " "))]) for w in reply.split()])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+    def _embed(self, model, input, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[1.0] + [0.0] * 511) for i in range(len(input))])
+
+
+class FakeCalendar:
+    """gcal.CalendarClient stand-in: events().list() (what CalendarMirror syncs from) and batch inserts"""
+
+    def __init__(self, latency, events):
+        self.latency = latency
+        self.calendar_id = "primary"
+        self.stored = events
+        self.calls = 0
+
+    def service(self):
+        return contextlib.nullcontext(self)
+
+    def events(self):
+        return self
+
+    def list(self, syncToken=None, **params):
+        self.calls += 1
+        items = [] if syncToken else self.stored
+        return SimpleNamespace(execute=lambda: time.sleep(self.latency) or {"items": items, "nextSyncToken": "bench"})
+
+    def insert_events(self, events, on_created=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        for event in events:
+            if on_created: on_created(event)
+        return [True] * len(events)
+
+
+class FakeTelegramTransport:
+    """notifier transport (see RequestsTransport) answering ok after `latency` seconds"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def post(self, url, payload, timeout):
+        self.calls += 1
+        time.sleep(self.latency)
+        return 200, {"ok": True, "result": {"message_id": self.calls}}
+
+
+def calendar_events(today, days=30, per_day=4):
+    events = []
+    for d in range(-days, days):
+        day = today + datetime.timedelta(days=d)
+        for k in range(per_day):
+            start = datetime.datetime.combine(day, datetime.time(9 + 2 * k))
+            events.append({"id": f"ev{d + days}x{k}", "summary": f"Class {k}", "status": "confirmed",
+                           "start": {"dateTime": start.isoformat() + "+08:00"},
+                           "end": {"dateTime": (start + datetime.timedelta(hours=1)).isoformat() + "+08:00"}})
+    return events
+
+
+# --- 2. SYNTHETIC DATA ---
+
+def synthetic_data(n, modules, today, seed=0):
+    """data.json document with n items spread over `modules` and a year around `today`"""
+    rng = random.Random(seed)
+    names = (utils.get_all_classes() + EXTRA_MODULES + [f"Module {k}" for k in range(modules)])[:modules]
+    doc = store.empty_db()
+    for name in names: doc["Modules"][name] = store.empty_module()
+    for i in range(n):
+        mod = doc["Modules"][names[rng.randrange(len(names))]]
+        date = (today + datetime.timedelta(days=rng.randint(-180, 180))).isoformat()
+        title = " ".join(rng.choices(WORDS, k=rng.randint(3, 7))).capitalize()
+        kind = rng.random()
+        if kind < 0.5:
+            mod["tasks"].append({"id": f"t{i}", "title": title, "details": " ".join(rng.choices(WORDS, k=12)), "date": date})
+        elif kind < 0.8:
+            mod["events"].append({"id": f"e{i}", "title": title, "details": "", "date": date, "time": f"{rng.randint(8, 20):02d}:00"})
+        else:
+            mod["knowledge"].append({"id": f"n{i}", "title": title, "details": " ".join(rng.choices(WORDS, k=rng.randint(40, 200))), "date": date})
+    return doc
+
+
+# --- 3. RUNNER ---
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, round(q * (len(sorted_values) - 1)))]
+
+
+def measure(fn, repeat, budget, setup=None):
+    """Milliseconds per call of fn(state), state = setup() (untimed) if given"""
+    times, spent = [], 0.0
+    while len(times) < repeat and (spent < budget or not times):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        fn(state)
+        times.append((time.perf_counter() - start) * 1000)
+        spent += times[-1] / 1000
+    return times
+
+
+def summarize(times):
+    times = sorted(times)
+    return {"runs": len(times), "mean_ms": round(statistics.fmean(times), 3), "p50_ms": round(percentile(times, 0.5), 3),
+            "p95_ms": round(percentile(times, 0.95), 3), "min_ms": round(times[0], 3), "max_ms": round(times[-1], 3)}
+
+
+def reset_app(backend, llm, calendar, transport):
+    """Drops every cached resource (store, outbox, caches, clients) and installs the stubs"""
+    try: utils.get_outbox().stop()
+    except Exception: pass
+    st.cache_resource.clear()
+    utils.STORAGE_BACKEND = backend
+    utils.BRIEFING_SCHEDULER = "off"
+    utils.get_openai_client = lambda: llm
+    utils.get_calendar_client = lambda: calendar
+    telegram = notifier.TelegramNotifier("bench", "1", transport=transport, rate=1000, burst=1000)
+    utils.get_notifier = lambda: telegram
+    chat_memory = memory.ChatMemory(utils.CHAT_HISTORY_TOKENS)
+    utils.get_chat_memory = lambda: chat_memory  # st.session_state only exists under `streamlit run`
+
+
+def letters(n):
+    """A unique tag without digits: the router's fast path declines titles with leftover numbers"""
+    return "".join("abcdefghij"[int(c)] for c in str(n))
+
+
+def run_backend(backend, items, args, data_file, folder):
+    os.makedirs(folder)
+    shutil.copy(data_file, os.path.join(folder, utils.DATA_FILE))
+    os.chdir(folder)
+    now = datetime.datetime.now(utils.BEIJING_TZ)
+    today, today_str = now.date(), now.strftime("%Y-%m-%d")
+    llm = FakeOpenAI(args.llm_latency)
+    calendar = FakeCalendar(args.calendar_latency, calendar_events(today))
+    telegram = FakeTelegramTransport(args.telegram_latency)
+    reset_app(backend, llm, calendar, telegram)
+    rows = []
+
+    def op(name, fn, setup=None, repeat=args.repeat):
+        times = measure(fn, repeat, args.budget, setup)
+        row = {"backend": backend, "items": items, "op": name, **summarize(times)}
+        rows.append(row)
+        print(f"{backend:8} {items:9} {name:18} {row['runs']:5} {row['p50_ms']:11.2f} {row['p95_ms']:11.2f} {row['max_ms']:11.2f}", flush=True)
+
+    # Store
+    op("seed_store", lambda _: utils.load_data(), repeat=1)  # SQLite imports data.json here
+    op("cold_load", lambda _: utils.load_data(), setup=utils.get_store.clear, repeat=max(3, args.repeat // 4))
+    op("load_data", lambda _: utils.load_data())
+    op("save_data", lambda data: utils.save_data(data), setup=utils.load_data, repeat=max(3, args.repeat // 4))
+    before = len(utils.load_data()["Modules"]["General"]["tasks"])
+    op("add_item", lambda _: utils.add_manual_item("General", "tasks", "Bench task", "", today_str))
+    ids = [item["id"] for item in utils.load_data()["Modules"]["General"]["tasks"][before:]]
+    op("delete_item", lambda _: utils.delete_item("General", "tasks", ids.pop()), repeat=len(ids))
+
+    # Views (main.py)
+    week = [today - datetime.timedelta(days=today.weekday()) + datetime.timedelta(days=i) for i in range(5)]
+    op("todays_focus", lambda _: utils.get_focus_items(today_str))
+    op("week_grid", lambda _: utils.get_week_events(week))
+    op("module_options", lambda _: utils.get_module_options(utils.load_data()["Modules"]))
+
+    def task_board(_):
+        # The Task Board view renders every task of every module
+        for content in utils.load_data()["Modules"].values():
+            for task in content.get("tasks", []):
+                f"**{task['title']}**\n\n{task.get('date', '')}" if not isinstance(task, str) else task
+    op("task_board", task_board, repeat=max(3, args.repeat // 4))
+
+    # Morning briefing: lease, build from the date index, mark as sent. The text is kept here
+    # rather than queued, or the Telegram backlog would hold up the chat effects below.
+    sent = []
+    briefing = scheduler.BriefingScheduler(utils.get_store(), sent.append, utils.BEIJING_TZ, at="00:00")
+    op("briefing", lambda _: briefing.run_once(), setup=lambda: utils.get_store().set_meta("last_briefing", None))
+
+    # Chat routing, end to end through chat_with_emily (unique messages: no LLM cache hits)
+    messages = ["add task read chapter four tomorrow", "what's on my calendar friday", "hello!",
+                "could you look into the case study", "add note remedies for breach next monday"]
+    op("route_local", lambda _: [router.classify_local(m, today, utils.get_all_classes()) for m in messages])
+    n = iter(range(10 ** 9))
+    router.reset_stats()
+    op("chat_add_task", lambda _: utils.chat_with_emily(f"add task read notes {letters(next(n))} tomorrow", []), repeat=args.chat_repeat)
+    op("chat_query", lambda _: utils.chat_with_emily(f"could you check thursday for me ({next(n)})", []), repeat=args.chat_repeat)
+    op("chat_event", lambda _: utils.chat_with_emily(f"remind me about the group meeting ({next(n)})", []), repeat=args.chat_repeat)
+
+    routing = [{"backend": backend, "items": items, "intent": intent, "path": path, **s}
+               for (intent, path), s in sorted(router.stats().items())]
+    for r in routing:
+        print(f"{backend:8} {items:9} route {r['intent']:6} {r['path']:5} {r['turns']:5} turns {r['avg_llm_calls']:5.2f} LLM calls "
+              f"{r['avg_ms']:9.2f} ms avg {r['avg_first_token_ms']:9.2f} ms to first token", flush=True)
+
+    utils.get_outbox().stop()
+    print(f"{backend:8} {items:9} briefing text {len(sent[-1]) if sent else 0} chars, {calendar.calls} calendar / "
+          f"{llm.calls} OpenAI / {telegram.calls} Telegram stub calls", flush=True)
+    return rows, routing
+
+
+def compare(rows, baseline_path, tolerance, min_delta):
+    """
+    Prints p50 against an earlier run; returns the ops that got slower than tolerance allows.
+    Single-run ops and differences under min_delta ms are shown but never count: too noisy.
+    """
+    with open(baseline_path) as f: baseline = {(r["backend"], r["items"], r["op"]): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\nCompared with {baseline_path} (p50, tolerance {tolerance:.0%}):")
+    for row in rows:
+        old = baseline.get((row["backend"], row["items"], row["op"]))
+        if not old: continue
+        ratio = row["p50_ms"] / old["p50_ms"] if old["p50_ms"] else 1.0
+        slower = ratio > 1 + tolerance and row["p50_ms"] - old["p50_ms"] > min_delta and min(row["runs"], old["runs"]) >= 3
+        if slower: regressions.append(row)
+        print(f"{row['backend']:8} {row['items']:9} {row['op']:18} {old['p50_ms']:11.2f} -> {row['p50_ms']:11.2f}  x{ratio:.2f}"
+              + ("  REGRESSION" if slower else ""))
+    return regressions
+
+
+def git_commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError: return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="items per store (up to 1000000)")
+    parser.add_argument("--backends", nargs="+", default=list(store.BACKENDS), choices=store.BACKENDS)
+    parser.add_argument("--modules", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=30, help="runs per op (fewer for the heavy ones)")
+    parser.add_argument("--chat-repeat", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=5.0, help="seconds per op before it stops repeating")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--calendar-latency", type=float, default=0.03)
+    parser.add_argument("--telegram-latency", type=float, default=0.03)
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--compare", help="results JSON of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown with --compare")
+    parser.add_argument("--min-delta", type=float, default=0.5, help="ms of p50 slowdown ignored with --compare")
+    args = parser.parse_args()
+
+    started = datetime.datetime.now(datetime.timezone.utc)
+    cwd, rows, routing = os.getcwd(), [], []
+    print(f"{'backend':8} {'items':>9} {'op':18} {'runs':>5} {'p50 ms':>11} {'p95 ms':>11} {'max ms':>11}")
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            for items in args.sizes:
+                data_file = os.path.join(folder, f"data-{items}.json")
+                with open(data_file, "w") as f:
+                    json.dump(synthetic_data(items, args.modules, datetime.datetime.now(utils.BEIJING_TZ).date()), f)
+                for backend in args.backends:
+                    ops, routes = run_backend(backend, items, args, data_file, os.path.join(folder, f"{backend}-{items}"))
+                    rows += ops
+                    routing += routes
+                os.remove(data_file)
+                gc.collect()
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "suite": "hot_paths", "started": started.isoformat(timespec="seconds"), "commit": git_commit(),
+        "python": platform.python_version(), "platform": platform.platform(), "config": vars(args), "results": rows,
+        "routing": routing,
+    }
+    if args.output:
+        with open(args.output, "w") as f: json.dump(report, f, indent=2)
+        print(f"\nWrote {len(rows)} results to {args.output}")
+    regressions = compare(rows, args.compare, args.tolerance, args.min_delta) if args.compare else []
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Telegram sending against a local fake bot API: one bare requests.post per message (the old
+send_telegram_alert) vs notifier.TelegramNotifier (keep-alive session + token bucket).
+
+    python benchmarks/bench_telegram.py --messages 60 --latency 0.02 --limit 20
+
+The fake server adds `latency` seconds to every new connection (standing in for the TCP +
+TLS handshake) and answers 429 with retry_after once a chat exceeds `limit` messages per
+second, like Telegram does. Reported: wall time, connections opened, 429s received and
+messages that failed.
+"""
+import argparse
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import notifier
+
+
+class FakeBotAPI(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, limit):
+        super().__init__(("127.0.0.1", 0), FakeBotHandler)
+        self.latency = latency
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.connections = 0
+        self.rejected = 0
+        self.delivered = []
+        self.window = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FakeBotHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args): pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock: self.server.connections += 1
+        time.sleep(self.server.latency)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        now = time.monotonic()
+        with self.server.lock:
+            self.server.window = [t for t in self.server.window if now - t < 1]
+            if len(self.server.window) >= self.server.limit:
+                self.server.rejected += 1
+                status, reply = 429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}
+            elif len(body["text"]) > notifier.MAX_MESSAGE:
+                status, reply = 400, {"ok": False, "description": "message is too long"}
+            else:
+                self.server.window.append(now)
+                self.server.delivered.append(body["text"])
+                status, reply = 200, {"ok": True, "result": {}}
+        data = json.dumps(reply).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def run_bare(server, texts):
+    failed = 0
+    for text in texts:
+        url = f"{server.url}/botTOKEN/sendMessage"
+        r = requests.post(url, json={"chat_id": 1, "text": text, "parse_mode": "Markdown"})
+        if not r.ok: failed += 1
+    return failed
+
+
+def run_notifier(server, texts, rate, burst):
+    tg = notifier.TelegramNotifier("TOKEN", 1, api_base=server.url, rate=rate, burst=burst)
+    failed = 0
+    for text in texts:
+        try: tg.send(text)
+        except notifier.NotifierError: failed += 1
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added per new connection")
+    parser.add_argument("--limit", type=int, default=20, help="messages per second before 429")
+    parser.add_argument("--rate", type=float, default=18, help="notifier token bucket rate")
+    args = parser.parse_args()
+
+    server = FakeBotAPI(args.latency, args.limit)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # A few long briefings among the short alerts
+    texts = [("• line %d\n" % n) * (600 if n % 20 == 0 else 3) for n in range(args.messages)]
+
+    for name, run in (("bare requests.post", lambda: run_bare(server, texts)),
+                      ("TelegramNotifier", lambda: run_notifier(server, texts, args.rate, notifier.BURST))):
+        server.reset()
+        start = time.perf_counter()
+        failed = run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:20s} {elapsed:6.2f}s  {server.connections:4d} connections  "
+              f"{server.rejected:3d} x 429  {failed:3d} failed  {len(server.delivered):4d} texts delivered")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Cost of tracing.span: per span with tracing off (the default) and on, and what that means
+for the hottest instrumented call, utils.load_data() on a warm store. Then several
+processes trace into the same TRACE_FILE with a tiny rotation size: every span must be
+read back exactly once.
+
+    python benchmarks/bench_tracing.py --spans 200000 --items 10000
+"""
+import argparse
+import datetime
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import streamlit.logger
+streamlit.logger.set_log_level(logging.ERROR)  # "missing ScriptRunContext" outside `streamlit run`
+import store
+import tracing
+import utils
+from bench_suite import synthetic_data
+
+MAX_OFF_NS = 2000  # per span with tracing off
+WRITERS = 4
+WRITER_SPANS = 5000
+
+
+def per_call_ns(fn, n):
+    start = time.perf_counter()
+    for _ in range(n): fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def traced():
+    with tracing.span("bench.op", bytes_in=10) as span:
+        span.set(bytes_out=20)
+
+
+def writer(path):
+    tracing.configure(path, max_bytes=64 * 1024, backups=1000)
+    for _ in range(WRITER_SPANS): traced()
+
+
+def check_rotation(folder):
+    path = os.path.join(folder, "shared.jsonl")
+    procs = [multiprocessing.Process(target=writer, args=(path,)) for _ in range(WRITERS)]
+    for p in procs: p.start()
+    for p in procs: p.join()
+    paths = tracing.files(path)
+    return tracing.read_stats(paths).get("bench.op", {}).get("count", 0), len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--items", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        db = store.JournalStore(os.path.join(folder, "data.json"))
+        db.save(synthetic_data(args.items, 20, datetime.date.today()))
+        utils.get_store = lambda: db
+        db.load()
+
+        bare = per_call_ns(lambda: None, args.spans)
+        off = per_call_ns(traced, args.spans) - bare
+        direct = per_call_ns(db.load, args.spans // 10)
+        load_off = per_call_ns(utils.load_data, args.spans // 10)
+
+        tracing.configure(os.path.join(folder, "trace.jsonl"))
+        on = per_call_ns(traced, args.spans // 10) - bare
+        load_on = per_call_ns(utils.load_data, args.spans // 10)
+        tracing.disable()
+        count, written = check_rotation(folder)
+
+    print(f"span, tracing off:     {off:8.0f} ns")
+    print(f"span, tracing on:      {on / 1000:8.1f} µs (JSON line to the trace file + percentile window)")
+    print(f"load_data ({args.items} items): store.load {direct / 1000:.1f} µs, traced off {load_off / 1000:.1f} µs, "
+          f"traced on {load_on / 1000:.1f} µs")
+    print(f"{WRITERS} processes x {WRITER_SPANS} spans, rotating at 64 KB: {count} spans read back from {written} files")
+    if off >= MAX_OFF_NS: print(f"FAILED: more than {MAX_OFF_NS} ns per span with tracing off")
+    elif count != WRITERS * WRITER_SPANS: print("FAILED: spans lost or duplicated across rotations")
+    else: print("OK")
+    ok = off < MAX_OFF_NS and count == WRITERS * WRITER_SPANS
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Chat retrieval at scale (vectors.VectorIndex: memory-mapped float32 matrix, cosine top-k).
+
+    python benchmarks/bench_vectors.py --items 100000 --dimensions 512
+
+Embeddings come from a local stand-in (a pseudo-random unit vector per text hash), so the
+run measures the index, not the API: full build, top-k latency, an incremental bulk
+ingest, and a restart and a forced full comparison that must not re-embed anything.
+
+Then two indexes share one set of files (two app processes) and take turns syncing adds
+and deletes: neither may hand out a row the other uses. Last, a background sync with a
+slow embedder must not hold up searches.
+"""
+import argparse
+import hashlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import store
+import vectors
+
+MODULES = ["General", "Business Law", "Corporate Finance", "Strategic Management", "Chinese 101"]
+WORDS = "market contract remedy capital budget exam lecture reading essay group meeting risk return china law".split()
+
+
+class FakeEmbedder:
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self.calls = 0
+        self.texts = 0
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+
+    def __call__(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return [self.vector(t) for t in texts]
+
+
+def synthetic_doc(n, seed=0):
+    rng = random.Random(seed)
+    doc = store.empty_db()
+    for mod in MODULES: doc["Modules"][mod] = store.empty_module()
+    for i in range(n):
+        type_ = ("tasks", "events", "knowledge")[i % 3]
+        doc["Modules"][MODULES[i % len(MODULES)]][type_].append({
+            "id": i + 1, "title": " ".join(rng.choices(WORDS, k=4)), "details": " ".join(rng.choices(WORDS, k=30)),
+            "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        })
+    return doc
+
+
+def check_shared(folder, dimensions, embed):
+    db = store.JournalStore(os.path.join(folder, "shared.json"))
+    paths = os.path.join(folder, "shared.db"), os.path.join(folder, "shared.f32")
+    one, two = (vectors.VectorIndex(*paths, dimensions, "bench") for _ in range(2))
+    items = {}
+
+    def add(item_id, title):
+        items[item_id] = {"id": item_id, "title": title, "details": "", "date": "2025-01-01"}
+        db.apply([{"op": "add", "mod": "General", "type": "knowledge", "item": items[item_id]}])
+
+    def first(index, item_id):
+        hits = index.search(embed.vector(vectors.item_text("General", "knowledge", items[item_id])), k=1)
+        return hits[0]["id"] if hits else None
+
+    add("1", "alpha"); one.ensure_current(db, embed)
+    add("2", "beta"); two.ensure_current(db, embed)
+    add("3", "gamma"); one.ensure_current(db, embed)
+    db.delete_item("General", "knowledge", "1"); two.ensure_current(db, embed)
+    add("4", "delta"); one.ensure_current(db, embed)  # takes the row "1" freed in the other index
+    shared = all(first(index, i) == i for index in (one, two) for i in ("2", "3", "4")) and one.count() == two.count() == 3
+    print(f"Two indexes on the same files: {'every item found by both' if shared else 'ROWS OVERWRITTEN'}")
+
+    def slow(texts):
+        time.sleep(0.5)
+        return embed(texts)
+
+    add("5", "epsilon")
+    one.request_sync(db, slow)
+    start = time.perf_counter()
+    one.search(embed.vector("epsilon"), k=1)
+    waited = time.perf_counter() - start
+    while one.count() < 4 and time.perf_counter() - start < 10: time.sleep(0.01)
+    background = waited < 0.1 and first(one, "5") == "5" and first(two, "5") == "5"
+    print(f"Background sync: search during a 0.5 s embedding took {waited * 1000:.1f} ms; "
+          f"new note found afterwards: {'yes' if first(one, '5') == '5' else 'NO'}")
+    return shared and background
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    args = parser.parse_args()
+
+    embed = FakeEmbedder(args.dimensions)
+    with tempfile.TemporaryDirectory() as folder:
+        db = store.JournalStore(os.path.join(folder, "data.json"))
+        doc = synthetic_doc(args.items)
+        db.save(doc)
+        paths = os.path.join(folder, "vectors.db"), os.path.join(folder, "vectors.f32")
+
+        index = vectors.VectorIndex(*paths, args.dimensions, "bench")
+        db.subscribe(index.on_change)
+        start = time.perf_counter()
+        index.ensure_current(db, embed)
+        print(f"Full build: {index.count()} items in {time.perf_counter() - start:.1f}s, "
+              f"{embed.calls} embedding requests, matrix {os.path.getsize(paths[1]) / 2**20:.0f} MB")
+
+        # A stored item's own text must come back first
+        items = [(m, t, i) for m, c in doc["Modules"].items() for t, its in c.items() for i in its]
+        rng = random.Random(1)
+        times, correct = [], 0
+        for _ in range(args.queries):
+            mod, type_, item = rng.choice(items)
+            query = embed.vector(vectors.item_text(mod, type_, item))
+            t0 = time.perf_counter()
+            hits = index.search(query, k=args.k)
+            times.append((time.perf_counter() - t0) * 1000)
+            correct += bool(hits) and hits[0]["id"] == str(item["id"]) and hits[0]["module"] == mod
+        times.sort()
+        p95 = times[int(0.95 * (len(times) - 1))]
+        print(f"Top-{args.k} search: p50 {statistics.median(times):.2f} ms  p95 {p95:.2f} ms  max {times[-1]:.2f} ms; "
+              f"exact item first {correct}/{args.queries}")
+
+        # Bulk ingest: one store write of many notes -> one sync, batched requests
+        calls = embed.calls
+        new = [{"op": "add", "mod": "General", "type": "knowledge",
+                "item": {"id": f"scan-{i}", "title": f"Document Scan page {i}", "details": f"page {i} text", "date": "2025-06-01"}}
+               for i in range(300)]
+        db.apply(new)
+        start = time.perf_counter()
+        index.ensure_current(db, embed)
+        ingest_calls = embed.calls - calls
+        print(f"Ingest of 300 notes: {ingest_calls} embedding requests, {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        db.delete_item("General", "knowledge", "scan-0")
+        index.ensure_current(db, embed)
+        gone = all(h["id"] != "scan-0" for h in index.search(embed.vector(vectors.item_text("General", "knowledge", new[0]["item"])), k=3))
+
+        # Restart, then a forced full comparison: everything is cached by content hash
+        calls = embed.calls
+        index = vectors.VectorIndex(*paths, args.dimensions, "bench")
+        index.ensure_current(db, embed)
+        index._set_state("version", -1)
+        start = time.perf_counter()
+        index.ensure_current(db, embed)
+        recheck, recheck_calls = time.perf_counter() - start, embed.calls - calls
+        print(f"Restart + full comparison: {recheck_calls} embedding requests, {recheck:.1f}s; "
+              f"{index.count()} items, deleted note gone: {'yes' if gone else 'NO'}")
+
+        shared = check_shared(folder, args.dimensions, embed)
+
+    ok = (correct == args.queries and ingest_calls == -(-300 // vectors.EMBED_BATCH)
+          and recheck_calls == 0 and gone and index.count() == args.items + 299 and shared)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Outbox test against local stand-in endpoints that drop requests.
+
+    python benchmarks/outbox_flaky.py --events 200 --messages 300 --drop 0.3
+
+Two local HTTP servers play Google Calendar (a JSON batch insert endpoint that answers 409
+for ids it already has) and the Telegram bot API. Each drops a share of the requests, half
+of them before doing anything and half after applying them, the way a lost response looks.
+The outbox has to deliver every event exactly once and every message at least once. Bursts
+must go out in batches rather than one request per entry.
+"""
+import argparse
+import http.server
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import outbox
+
+
+class FlakyServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, drop):
+        super().__init__(("127.0.0.1", 0), FlakyHandler)
+        self.drop = drop
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.dropped = 0
+        self.events = {}    # event id -> times the server received it
+        self.messages = []  # texts received by the bot endpoint
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, *args): pass
+
+    def _drop(self):
+        self.server.dropped += 1
+        self.connection.shutdown(socket.SHUT_RDWR)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        roll = random.random()
+        with self.server.lock:
+            self.server.requests += 1
+            if roll < self.server.drop / 2: return self._drop()
+            if self.path == "/batch":
+                results = []
+                for event in body["events"]:
+                    seen = self.server.events.get(event["id"], 0)
+                    self.server.events[event["id"]] = seen + 1
+                    results.append(409 if seen else 200)
+                reply = {"results": results}
+            else:
+                self.server.messages.append(body["text"])
+                reply = {"ok": True}
+            if roll < self.server.drop: return self._drop()
+        data = json.dumps(reply).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def post(url, payload):
+    req = urllib.request.Request(url, json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=2) as resp:
+        return json.loads(resp.read())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--drop", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    calendar, bot = FlakyServer(args.drop), FlakyServer(args.drop)
+    for server in (calendar, bot): threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def insert_events(events):
+        results = post(calendar.url + "/batch", {"events": events})["results"]
+        return [status in (200, 409) for status in results]
+
+    def send_messages(messages):
+        ok = post(bot.url + "/sendMessage", {"text": "\n\n".join(messages)})["ok"]
+        return [ok] * len(messages)
+
+    with tempfile.TemporaryDirectory() as folder:
+        box = outbox.Outbox(
+            os.path.join(folder, "outbox.db"),
+            {"calendar": insert_events, "telegram": send_messages},
+            base_delay=0.05, max_delay=0.5, max_attempts=1000, hold={"telegram": 0.05}, poll=0.2,
+        ).start()
+
+        start = time.perf_counter()
+        event_ids = [uuid.uuid4().hex for _ in range(args.events)]
+        texts = [f"message {n}" for n in range(args.messages)]
+        futures = []
+        # Bursts from several threads, like concurrent chat turns
+        def produce(worker):
+            for n in range(worker, max(args.events, args.messages), 4):
+                if n < args.events: futures.append(box.enqueue("calendar", {"id": event_ids[n], "summary": f"event {n}"}))
+                if n < args.messages: futures.append(box.enqueue("telegram", texts[n]))
+                if n % 25 == 0: time.sleep(0.02)
+        producers = [threading.Thread(target=produce, args=(w,)) for w in range(4)]
+        for t in producers: t.start()
+        for t in producers: t.join()
+
+        while box.stats()["pending"] and time.perf_counter() - start < args.timeout: time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        stats = box.stats()
+        box.stop()
+
+    received = set(m for text in bot.messages for m in text.split("\n\n"))
+    lost_events = [i for i in event_ids if i not in calendar.events]
+    duplicated = sum(1 for i in event_ids if calendar.events.get(i, 0) > 1)
+    lost_messages = [t for t in texts if t not in received]
+    entries = args.events + args.messages
+
+    print(f"Delivered {stats['delivered']}/{entries} entries in {elapsed:.2f}s")
+    print(f"Requests: calendar {calendar.requests} ({calendar.dropped} dropped), telegram {bot.requests} ({bot.dropped} dropped)")
+    print(f"Outbox: {stats['sends']} sends, {stats['retries']} retries, {stats['pending']} pending, {stats['dead_entries']} dead")
+    print(f"Entries per request: {entries / max(calendar.requests + bot.requests, 1):.1f}")
+    print(f"Calendar: {len(lost_events)} lost, {duplicated} ids received more than once (answered 409)")
+    print(f"Telegram: {len(lost_messages)} lost")
+    print(f"Futures resolved: {sum(f.done() for f in futures)}/{len(futures)}")
+
+    ok = not lost_events and not lost_messages and stats["pending"] == 0 and all(f.done() for f in futures)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Telegram delivery through the outbox (utils._send_telegram_messages) against a local fake
+bot API that misbehaves the way Telegram can.
+
+    python benchmarks/outbox_telegram.py
+
+- a burst of short alerts queued together goes out as one message;
+- a message with unbalanced Markdown ("read chapter_3") gets 400 "can't parse entities",
+  also when joined with the others: the burst is then sent one by one, and only that
+  message arrives as plain text;
+- a long message whose second chunk fails once must not have its first chunk sent again;
+- every request is slow, so the long message outlives the outbox lease, while a second
+  flusher (another process) polls the same outbox.db: nothing may be sent twice.
+"""
+import http.server
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import streamlit.logger
+streamlit.logger.set_log_level(logging.ERROR)  # "missing ScriptRunContext" outside `streamlit run`
+import notifier
+import outbox
+import utils
+
+LEASE = 0.5
+DELAY = 0.3  # seconds per request: the 3-chunk message takes longer than LEASE
+
+
+class FakeBotAPI(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fail_once):
+        super().__init__(("127.0.0.1", 0), FakeBotHandler)
+        self.lock = threading.Lock()
+        self.fail_once = set(fail_once)  # chunk prefixes answered 502 the first time
+        self.delivered = []              # (text, parse_mode)
+        self.parse_errors = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FakeBotHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args): pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(DELAY)
+        text, mode = body["text"], body.get("parse_mode")
+        with self.server.lock:
+            failing = next((p for p in self.server.fail_once if text.startswith(p)), None)
+            if failing:
+                self.server.fail_once.discard(failing)
+                status, reply = 502, {"ok": False, "description": "Bad Gateway"}
+            elif mode == "Markdown" and text.count("_") % 2:
+                self.server.parse_errors += 1
+                status, reply = 400, {"ok": False, "description": "Bad Request: can't parse entities: "
+                                      "Can't find end of the entity starting at byte offset 13"}
+            else:
+                self.server.delivered.append((text, mode))
+                status, reply = 200, {"ok": True, "result": {"message_id": len(self.server.delivered)}}
+        data = json.dumps(reply).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    long_text = "\n\n".join(f"PART{n} " + "x" * 3990 for n in range(3))  # three 4096-char chunks
+    messages = ["📱 **Andy:**\nread chapter_3", "📱 **Andy:**\nplain one", long_text]
+    server = FakeBotAPI(fail_once=["PART1"])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tg = notifier.TelegramNotifier("TOKEN", 1, api_base=server.url, rate=100, burst=10)
+    utils.get_notifier = lambda: tg
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "outbox.db")
+        options = dict(base_delay=0.05, max_delay=0.2, hold={}, lease=LEASE, poll=0.05)
+        box = outbox.Outbox(path, {"telegram": utils._send_telegram_messages}, **options)
+        other = outbox.Outbox(path, {"telegram": utils._send_telegram_messages}, **options)
+        futures = [box.enqueue("telegram", m) for m in messages]
+        box.start()
+        other.start()
+        start = time.perf_counter()
+        while box.stats()["pending"] and time.perf_counter() - start < 30: time.sleep(0.05)
+        time.sleep(LEASE * 2)  # give a stray second claim time to show up
+        stats = box.stats()
+        box.stop()
+        other.stop()
+        texts = [t for t, _ in server.delivered]
+
+        burst = [f"⏰ Reminder {n}: *stand-up*" for n in range(5)]
+        box = outbox.Outbox(os.path.join(folder, "burst.db"), {"telegram": utils._send_telegram_messages}, **options)
+        burst_futures = [box.enqueue("telegram", m) for m in burst]
+        box.start()
+        start = time.perf_counter()
+        while box.stats()["pending"] and time.perf_counter() - start < 30: time.sleep(0.05)
+        box.stop()
+
+    chunks = notifier.split_message(long_text)
+    checks = [
+        ("all 3 entries delivered, none pending or dead", stats["pending"] == 0 and stats["dead_entries"] == 0),
+        ("first attempt outcomes are per message", [f.result() for f in futures][:2] == [True, True]),
+        ("unbalanced Markdown falls back to plain text", (messages[0], None) in server.delivered and server.parse_errors == 2),
+        ("other messages keep Markdown", (messages[1], "Markdown") in server.delivered),
+        ("long message: each chunk sent exactly once", all(texts.count(c) == 1 for c in chunks)),
+        ("nothing delivered twice (lease renewed during the slow send)", len(texts) == len(set(texts)) == 2 + len(chunks)),
+        ("burst of 5 alerts delivered as one message", server.delivered[len(texts):] == [("\n\n".join(burst), "Markdown")]
+         and all(f.result() is True for f in burst_futures)),
+    ]
+    for label, ok in checks: print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    ok = all(ok for _, ok in checks)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Stress test for concurrent writers: many processes hammer one store at the same time and
+the result is checked for lost updates.
+
+    python benchmarks/stress_writers.py --backend journal --procs 16 --ops 200
+
+Every process adds `ops` items, deletes one of its recent ones after every fifth, and bumps
+a shared Meta counter `ops // 10` times through Store.update() (whole-document optimistic
+writes). The journal is compacted every 50 entries so compaction races with the writers too.
+Items must stay in the order they were added, both in a store that followed the writes
+and in one opened afterwards.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import store
+
+
+def open_target(backend, folder):
+    if backend == "sqlite": return store.SQLiteStore(os.path.join(folder, "data.db"))
+    return store.JournalStore(os.path.join(folder, "data.json"), compact_every=50)
+
+
+def bump(doc):
+    doc["Meta"]["counter"] = doc["Meta"].get("counter", 0) + 1
+
+
+def worker(backend, folder, proc, ops):
+    db = open_target(backend, folder)
+    for n in range(ops):
+        db.add_item(f"Module {proc % 4}", "tasks", {"id": f"{proc}-{n}", "title": f"task {n}", "date": "2025-01-01"})
+        if n % 5 == 4: db.delete_item(f"Module {proc % 4}", "tasks", f"{proc}-{n - 2}")
+        if n % 10 == 9: db.update(bump)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=store.BACKENDS, default="journal")
+    parser.add_argument("--procs", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        follower = open_target(args.backend, folder)
+        follower.load()
+        start = time.perf_counter()
+        procs = [
+            multiprocessing.Process(target=worker, args=(args.backend, folder, p, args.ops))
+            for p in range(args.procs)
+        ]
+        for p in procs: p.start()
+        for p in procs: p.join()
+        elapsed = time.perf_counter() - start
+        failed = [p.exitcode for p in procs if p.exitcode != 0]
+
+        data = open_target(args.backend, folder).load()
+        ids = [t["id"] for m in data["Modules"].values() for t in m["tasks"]]
+        followed = [t["id"] for mod in data["Modules"] for t in follower.load()["Modules"][mod]["tasks"]]
+        added = {}  # process -> its item numbers, in list order
+        for i in ids: added.setdefault(i.split("-")[0], []).append(int(i.split("-")[1]))
+        ordered = followed == ids and all(ns == sorted(ns) for ns in added.values())
+        expected_items = args.procs * (args.ops - args.ops // 5)
+        expected_counter = args.procs * (args.ops // 10)
+        counter = data["Meta"].get("counter", 0)
+
+        print(f"{args.backend}: {args.procs} procs x {args.ops} ops in {elapsed:.2f}s")
+        print(f"  items   {len(ids)} / {expected_items} (unique: {len(set(ids))})")
+        print(f"  counter {counter} / {expected_counter}")
+        print(f"  order   {'insertion order, same in both stores' if ordered else 'REORDERED'}")
+        ok = not failed and len(ids) == len(set(ids)) == expected_items and counter == expected_counter and ordered
+        print("✅ no lost updates" if ok else "❌ lost or reordered updates")
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Streaming NDJSON import/export of tasks, events and notes (see manage.py).
+
+One JSON object per line:
+
+    {"module": "Business Law", "type": "task", "title": "Read ch. 4", "date": "2025-03-02", "details": "..."}
+
+`type` is task/tasks, event/events or note/notes/knowledge. `module` and `title` are
+required, `date` (YYYY-MM-DD) is required for events; `id` is kept if given, assigned
+otherwise. Any other fields are stored with the item. Export writes the same format.
+
+Every stage is a generator, so a file of any size is handled one line at a time and
+committed to the store in chunks of CHUNK_SIZE items.
+"""
+import datetime
+import json
+import store
+
+CHUNK_SIZE = 500
+TYPES = {
+    "task": "tasks", "tasks": "tasks",
+    "event": "events", "events": "events",
+    "note": "knowledge", "notes": "knowledge", "knowledge": "knowledge",
+}
+EXPORT_TYPES = {"tasks": "task", "events": "event", "knowledge": "note"}
+
+
+class RecordError(ValueError):
+    """A line that can't be imported"""
+
+
+def parse_lines(lines):
+    """(line number, object) for every non-blank line; RecordError for malformed JSON"""
+    for n, line in enumerate(lines, 1):
+        if not line.strip(): continue
+        try: yield n, json.loads(line)
+        except ValueError as e: yield n, RecordError(f"invalid JSON: {e}")
+
+
+def _valid_date(value):
+    try: datetime.date.fromisoformat(value)
+    except (TypeError, ValueError): return False
+    return len(value) == 10
+
+
+def validate(record):
+    """(module, type, item) for a parsed record, or raises RecordError"""
+    if isinstance(record, RecordError): raise record
+    if not isinstance(record, dict): raise RecordError("not a JSON object")
+    record = dict(record)
+    module, kind = record.pop("module", None), record.pop("type", None)
+    if not isinstance(module, str) or not module.strip(): raise RecordError("missing module")
+    if kind not in TYPES: raise RecordError(f"unknown type {kind!r} (expected task, event or note)")
+    type_ = TYPES[kind]
+    if not isinstance(record.get("title"), str) or not record["title"].strip(): raise RecordError("missing title")
+    date = record.get("date")
+    if date is not None and not _valid_date(date): raise RecordError(f"date {date!r} is not YYYY-MM-DD")
+    if type_ == "events" and date is None: raise RecordError("events need a date")
+    if "details" in record and not isinstance(record["details"], str): raise RecordError("details must be text")
+    if record.get("id") in (None, ""): record["id"] = store.new_id()
+    elif not isinstance(record["id"], (str, int)): raise RecordError("id must be a string or number")
+    return module.strip(), type_, record
+
+
+def chunks(records, size=CHUNK_SIZE):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+
+def import_ndjson(db, lines, chunk_size=CHUNK_SIZE, on_error=None):
+    """
+    Streams NDJSON `lines` into the store, one transaction (Store.apply) per chunk.
+    Records that fail validation, or whose id already exists, are skipped and reported
+    through on_error(line_number, message). Returns (imported, skipped).
+    """
+    counts = {"imported": 0, "skipped": 0}
+
+    def good():
+        for n, record in parse_lines(lines):
+            try: yield n, validate(record)
+            except RecordError as e:
+                counts["skipped"] += 1
+                if on_error: on_error(n, str(e))
+
+    for chunk in chunks(good(), chunk_size):
+        ops, seen = [], set()
+        for n, (mod, type_, item) in chunk:
+            key = (mod, type_, str(item["id"]))
+            if key in seen or db.has_item(*key):
+                counts["skipped"] += 1
+                if on_error: on_error(n, f"id {item['id']} already exists in {mod}/{type_}")
+                continue
+            seen.add(key)
+            ops.append({"op": "add", "mod": mod, "type": type_, "item": item})
+        db.apply(ops)
+        counts["imported"] += len(ops)
+    return counts["imported"], counts["skipped"]
+
+
+def export_records(db, modules=None, types=store.ITEM_TYPES, start=None, end=None):
+    """NDJSON lines (with newline) for the matching items"""
+    for mod, type_, item in db.iter_items(modules, types, start, end):
+        fields = store.thaw(item) if isinstance(item, store.ReadOnlyDict) else {"title": str(item)}  # legacy plain-string tasks
+        yield json.dumps({"module": mod, "type": EXPORT_TYPES.get(type_, type_), **fields}, ensure_ascii=False) + "\n"
+
+
+def export_ndjson(db, out, **filters):
+    """Writes export_records(db, **filters) to the text stream `out`; returns the count"""
+    count = 0
+    for line in export_records(db, **filters):
+        out.write(line)
+        count += 1
+    return count
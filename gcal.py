@@ -0,0 +1,240 @@
+import contextlib
+import datetime
+import json
+import threading
+import time
+from urllib.parse import urljoin
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import BatchHttpRequest
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+import tracing
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+HTTP_TIMEOUT = 15  # seconds per request
+POOL_SIZE = 4      # idle services (and their connections) kept for reuse
+
+
+class CalendarClient:
+    """
+    Long-lived Google Calendar client shared by every session.
+
+    The old path rebuilt service-account credentials, fetched a fresh token and parsed the
+    discovery document on every call. Here the credentials (and their token) live until
+    they expire, the discovery document bundled with googleapiclient is parsed once, and
+    built services with their keep-alive connections are pooled. httplib2 is not
+    thread-safe, so a thread checks one out for the duration of a call (service()) and
+    returns it; Streamlit's per-rerun threads then reuse the same connections.
+    """
+
+    def __init__(self, service_account_info, calendar_id="primary", api_endpoint=None, timeout=HTTP_TIMEOUT,
+                 pool_size=POOL_SIZE):
+        self.calendar_id = calendar_id
+        self.api_endpoint = api_endpoint  # e.g. a local fake Calendar server
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._creds = service_account.Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+        self._creds_lock = threading.Lock()
+        self._doc = json.loads(get_static_doc("calendar", "v3"))
+        self._idle = []  # built services nobody has checked out
+        self._pool_lock = threading.Lock()
+        self._stats = {"builds": 0, "checkouts": 0, "token_refreshes": 0}
+
+    def _refresh_token(self):
+        with self._creds_lock:
+            if not self._creds.valid:
+                self._creds.refresh(Request())
+                self._stats["token_refreshes"] += 1
+
+    def _build(self):
+        http = google_auth_httplib2.AuthorizedHttp(self._creds, http=httplib2.Http(timeout=self.timeout))
+        options = {"api_endpoint": self.api_endpoint} if self.api_endpoint else None
+        return build_from_document(self._doc, http=http, client_options=options)
+
+    @contextlib.contextmanager
+    def service(self):
+        """
+        Checks a Calendar service out of the pool for the calling thread and puts it back
+        afterwards. A new one is built only when every pooled service is in use.
+        """
+        self._refresh_token()
+        with self._pool_lock:
+            svc = self._idle.pop() if self._idle else None
+            self._stats["checkouts"] += 1
+            if svc is None: self._stats["builds"] += 1
+        if svc is None: svc = self._build()
+        try:
+            yield svc
+        finally:
+            with self._pool_lock:
+                if len(self._idle) < self.pool_size: self._idle.append(svc)
+
+    def insert_events(self, events, on_created=None):
+        """
+        Inserts events with one batch request (up to 50). Returns one outcome per event:
+        True, or the exception to retry. Events carry their own id, so a 409 means an
+        earlier attempt already created it.
+        """
+        outcomes = [RuntimeError("no response in batch")] * len(events)
+
+        def done(request_id, response, exception):
+            i = int(request_id)
+            if exception is None:
+                outcomes[i] = True
+                if on_created: on_created(response)
+            elif isinstance(exception, HttpError) and exception.resp.status == 409:
+                outcomes[i] = True
+            else:
+                outcomes[i] = exception
+
+        with self.service() as service:
+            if self.api_endpoint:
+                # The batch URL comes from the discovery document, not client_options
+                batch = BatchHttpRequest(callback=done, batch_uri=urljoin(self.api_endpoint, "/" + self._doc["batchPath"]))
+            else:
+                batch = service.new_batch_http_request(callback=done)
+            for i, event in enumerate(events):
+                batch.add(service.events().insert(calendarId=self.calendar_id, body=event), request_id=str(i))
+            with tracing.span("calendar.insert_batch", events=len(events)) as span:
+                batch.execute()
+                span.set(failed=sum(o is not True for o in outcomes))
+        return outcomes
+
+    def stats(self):
+        """Services built vs checked out (a build per checkout means the pool isn't reused)"""
+        with self._pool_lock:
+            return dict(self._stats, idle=len(self._idle))
+
+
+# --- CALENDAR MIRROR ---
+
+class CalendarMirror:
+    """
+    Local copy of the target calendar, kept current with events.list syncTokens.
+
+    The first sync lists everything once; later syncs only return what changed since the
+    last token. A full resync only happens when Google invalidates the token (410 Gone).
+    Queries are answered from a day index in memory:
+      - data older than `refresh_after` seconds wakes the background sync thread (one per
+        mirror, started on first use) for an incremental sync,
+      - data older than `max_staleness` seconds is synced inline before answering.
+    """
+
+    def __init__(self, client, tz, refresh_after=30, max_staleness=300):
+        self.client = client
+        self.tz = tz
+        self.refresh_after = refresh_after
+        self.max_staleness = max_staleness
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._events = {}   # event id -> event resource
+        self._by_day = {}   # "YYYY-MM-DD" -> {event id}
+        self._sync_token = None
+        self._synced_at = 0.0
+        self._wake = threading.Event()
+        self._worker = None
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+
+    # Indexing
+    def _days(self, event):
+        start, end = event.get("start", {}), event.get("end", {})
+        if "date" in start:  # all-day: end date is exclusive
+            first = datetime.date.fromisoformat(start["date"])
+            last = datetime.date.fromisoformat(end.get("date", start["date"])) - datetime.timedelta(days=1)
+        elif "dateTime" in start:
+            first = datetime.datetime.fromisoformat(start["dateTime"]).astimezone(self.tz).date()
+            last_dt = datetime.datetime.fromisoformat(end.get("dateTime", start["dateTime"])).astimezone(self.tz)
+            last = (last_dt - datetime.timedelta(microseconds=1)).date() if last_dt.time() == datetime.time(0) else last_dt.date()
+        else:
+            return []
+        last = max(first, last)
+        return [(first + datetime.timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+    def _remove(self, event_id):
+        old = self._events.pop(event_id, None)
+        if old is None: return
+        for day in self._days(old):
+            ids = self._by_day.get(day)
+            if ids:
+                ids.discard(event_id)
+                if not ids: del self._by_day[day]
+
+    def _put(self, event):
+        self._remove(event["id"])
+        if event.get("status") == "cancelled": return
+        self._events[event["id"]] = event
+        for day in self._days(event): self._by_day.setdefault(day, set()).add(event["id"])
+
+    # Syncing
+    def _list_all(self, **params):
+        items, page_token = [], None
+        with self.client.service() as service:
+            while True:
+                with tracing.span("calendar.events_list", incremental="syncToken" in params) as span:
+                    resp = service.events().list(
+                        calendarId=self.client.calendar_id, singleEvents=True, showDeleted=True,
+                        maxResults=2500, pageToken=page_token, **params
+                    ).execute()
+                    span.set(items=len(resp.get("items", [])))
+                items.extend(resp.get("items", []))
+                page_token = resp.get("nextPageToken")
+                if not page_token: return items, resp.get("nextSyncToken")
+
+    def sync(self):
+        """Incremental sync when we hold a token, full sync otherwise (or when it expired)"""
+        with self._sync_lock:
+            token = self._sync_token
+            try:
+                items, next_token = self._list_all(syncToken=token) if token else self._list_all()
+            except HttpError as e:
+                if e.resp.status != 410: raise
+                token = None  # sync token invalidated: start over
+                items, next_token = self._list_all()
+            with self._lock:
+                if token is None:
+                    self._events, self._by_day = {}, {}
+                    self.full_syncs += 1
+                else:
+                    self.incremental_syncs += 1
+                for event in items: self._put(event)
+                self._sync_token = next_token
+                self._synced_at = time.monotonic()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            try: self.sync()
+            except Exception as e: print(f"❌ Calendar Sync Error: {e}")
+            # Requests that came in during the sync are answered by it
+            self._wake.clear()
+
+    def _request_sync(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="calendar-sync", daemon=True)
+                self._worker.start()
+        self._wake.set()
+
+    def ensure_fresh(self):
+        age = time.monotonic() - self._synced_at
+        if self._sync_token is None or age > self.max_staleness:
+            self.sync()
+        elif age > self.refresh_after:
+            self._request_sync()
+
+    def record(self, event):
+        """Adds an event we just inserted ourselves; the next incremental sync confirms it"""
+        with self._lock: self._put(event)
+
+    # Queries
+    def events_on(self, date_str):
+        """Events touching a day (YYYY-MM-DD), ordered by start"""
+        self.ensure_fresh()
+        with self._lock:
+            events = [self._events[i] for i in self._by_day.get(date_str, ())]
+        return sorted(events, key=lambda e: e["start"].get("dateTime", e["start"].get("date", "")))
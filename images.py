@@ -0,0 +1,41 @@
+import hashlib
+import io
+from PIL import Image, ImageOps, ImageStat
+
+# gpt-4o (detail "high") fits images into 2048x2048, then scales the short side down to
+# 768 px before tiling. Pixels beyond that are uploaded only to be thrown away.
+MAX_LONG_SIDE = 2048
+MAX_SHORT_SIDE = 768
+GRAYSCALE_SATURATION = 24   # mean HSV saturation (0-255) below which a scan is treated as B/W
+JPEG_QUALITY = 85
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def prepare(data):
+    """
+    Upload-ready JPEG bytes for a photo or scan: EXIF orientation applied, shrunk to the
+    model's working resolution, converted to grayscale when it has next to no color.
+    Returns the input unchanged if it can't be decoded or re-encoding would not save bytes.
+    """
+    try:
+        img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    except Exception:
+        return data
+    scale = min(1.0, MAX_LONG_SIDE / max(img.size), MAX_SHORT_SIDE / min(img.size))
+    if scale < 1:
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGBA")
+        flat = Image.new("RGB", img.size, "white")  # transparent PNGs: paste onto paper
+        flat.paste(img, mask=img.getchannel("A"))
+        img = flat
+    if img.mode == "RGB":
+        saturation = ImageStat.Stat(img.convert("HSV").getchannel("S")).mean[0]
+        if saturation < GRAYSCALE_SATURATION: img = img.convert("L")
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    out = buf.getvalue()
+    return out if len(out) < len(data) or scale < 1 else data
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Per call-site time-to-live (seconds). Sites not listed here are not cached.
+TTLS = {
+    "router": 24 * 3600,        # intent/payload for an identical message on the same day
+    "capture": 24 * 3600,       # process_assistant_input classification
+    "query_answer": 5 * 60,     # schedule answer; the calendar data is part of the key
+    "coach": 7 * 24 * 3600,     # speech critique for an identical transcript
+    "transcribe": 30 * 24 * 3600,  # whisper transcript, keyed by the audio's content hash
+    "vision": 30 * 24 * 3600,      # document scan transcription, keyed by the image's content hash
+    "embed_query": 7 * 24 * 3600,  # embedding of a chat message for retrieval
+    "chat_summary": 24 * 3600,     # running chat summary for the same summary + evicted turns
+}
+MEMORY_ENTRIES = 512
+DISK_ENTRIES = 20000
+
+DISK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_used ON cache(used);
+"""
+
+
+def normalize(text):
+    """Case- and whitespace-insensitive form of a prompt part"""
+    return " ".join(str(text).split()).casefold()
+
+
+class LLMCache:
+    """
+    Two-tier cache for model responses: an in-memory LRU in front of a SQLite file that
+    survives restarts. Values must be JSON-serializable; failures are never cached.
+    """
+
+    def __init__(self, path, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES, ttls=TTLS):
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttls = ttls
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires, value)
+        self._writes = 0
+        self._stats = {}
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(DISK_SCHEMA)
+
+    @staticmethod
+    def key(site, parts, date_str, time_str=None):
+        """
+        Hash of the call site, normalized prompt parts (model, messages, ...) and today's date.
+        Pass time_str for calls whose answer depends on the time of day.
+        """
+        raw = json.dumps([site, [normalize(p) for p in parts], date_str, time_str])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, site, what):
+        s = self._stats.setdefault(site, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        s[what] += 1
+
+    def get(self, site, key):
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit and hit[0] > now:
+                self._memory.move_to_end(key)
+                self._count(site, "memory_hits")
+                return True, hit[1]
+            row = self._db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row and row[1] > now:
+                self._db.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+                value = json.loads(row[0])
+                self._remember(key, row[1], value)
+                self._count(site, "disk_hits")
+                return True, value
+            self._count(site, "misses")
+            return False, None
+
+    def _remember(self, key, expires, value):
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries: self._memory.popitem(last=False)
+
+    def put(self, site, key, value, ttl=None):
+        ttl = self.ttls.get(site, 0) if ttl is None else ttl
+        if ttl <= 0: return
+        now = time.time()
+        with self._lock:
+            self._remember(key, now + ttl, value)
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, site, value, expires, used) VALUES (?, ?, ?, ?, ?)",
+                (key, site, json.dumps(value, ensure_ascii=False), now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0: self._evict(now)
+
+    def _evict(self, now):
+        """Drops expired rows, then the least recently used ones above the size bound"""
+        self._db.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.disk_entries,),
+        )
+
+    def get_or_compute(self, site, key, compute, ttl=None):
+        hit, value = self.get(site, key)
+        if hit: return value
+        value = compute()
+        self.put(site, key, value, ttl)
+        return value
+
+    def stats(self):
+        """{site: {"memory_hits", "disk_hits", "misses", "hit_rate"}}"""
+        with self._lock:
+            out = {}
+            for site, s in self._stats.items():
+                total = s["memory_hits"] + s["disk_hits"] + s["misses"]
+                out[site] = dict(s, hit_rate=(s["memory_hits"] + s["disk_hits"]) / total if total else 0.0)
+            return out
@@ -12,8 +12,10 @@ st.set_page_config(page_title="Andy OS", page_icon="👓", layout="wide")
 st.markdown(styles.get_custom_css(), unsafe_allow_html=True)
 
 # --- 2. MORNING WAKE UP CALL ---
-# This checks if it's a new day and sends the Telegram Briefing if needed
-utils.check_and_send_briefing()
+# Starts the daily Telegram Briefing thread; later reruns only hit the resource cache
+utils.get_briefing_scheduler()
+# Knowledge search index subscribes to store writes (once per process)
+utils.get_search_index()
 
 # --- 3. SIDEBAR & NAVIGATION ---
 with st.sidebar:
@@ -36,18 +38,14 @@ with st.sidebar:
     data = utils.load_data()
     modules = data.get("Modules", {})
     
-    focus_items = []
-    for mod, content in modules.items():
-        # Check Tasks & Events
-        for item in content.get("tasks", []) + content.get("events", []):
-            if isinstance(item, dict) and item.get("date") == today_str:
-                focus_items.append({"mod": mod, "item": item, "type": "tasks" if item in content.get("tasks", []) else "events"})
+    # Indexed lookup of today's tasks & events
+    focus_items = utils.get_focus_items(today_str)
     
     if focus_items:
-        for idx, entry in enumerate(focus_items):
+        for entry in focus_items:
             item = entry["item"]
-            # Unique key for checkbox
-            if st.checkbox(f"{item['title']}", key=f"focus_{idx}"):
+            # Keyed by the item, not its row: after a delete the next task must not inherit the tick
+            if st.checkbox(f"{item['title']}", key=f"focus_{entry['mod']}_{entry['type']}_{item['id']}"):
                 utils.delete_item(entry["mod"], entry["type"], item["id"])
                 st.rerun()
             st.caption(f"{entry['mod']} • {item.get('details', '')}")
@@ -72,6 +70,30 @@ with st.sidebar:
             os.environ["OPENAI_API_KEY"] = api_key_input
             st.rerun()
 
+    # LLM response cache hit/miss counters
+    cache_stats = utils.get_llm_cache().stats()
+    if cache_stats:
+        with st.expander("⚡ AI Cache"):
+            for site, s in cache_stats.items():
+                st.caption(f"{site}: {s['memory_hits'] + s['disk_hits']} hits / {s['misses']} misses ({s['hit_rate']:.0%})")
+
+    # Outbound Calendar/Telegram queue
+    ob = utils.get_outbox().stats()
+    with st.expander(f"📤 Outbox ({ob['pending']} queued)"):
+        for kind, n in ob["depth"].items(): st.caption(f"{kind}: {n} queued")
+        if ob["pending"]: st.caption(f"Oldest: {ob['oldest_age']:.0f}s, max attempts {ob['max_attempts']}")
+        st.caption(f"Delivered {ob['delivered']} in {ob['sends']} sends · {ob['retries']} retries · {ob['dead_entries']} dead")
+        if ob["last_error"]: st.caption(f"Last error: {ob['last_error']}")
+
+    # Latency per API call / store operation (only with TRACING=on)
+    trace_stats = utils.get_trace_stats()
+    if trace_stats is not None:
+        with st.expander("⏱️ Latency"):
+            if not trace_stats: st.caption("No calls traced yet.")
+            for op, s in trace_stats.items():
+                errors = f" · {s['errors']} errors" if s["errors"] else ""
+                st.caption(f"**{op}** ×{s['count']}: p50 {s['p50_ms']:.0f} · p95 {s['p95_ms']:.0f} · p99 {s['p99_ms']:.0f} ms{errors}")
+
 # --- 4. VIEWS ---
 
 if view == "🎙️ Command Center":
@@ -80,13 +102,8 @@ if view == "🎙️ Command Center":
     # Smart Default Module
     default_module = utils.get_current_module()
     
-    # Populate options
-    schedule_classes = utils.get_all_classes()
-    existing_modules = list(modules.keys())
-    all_options = sorted(list(set(schedule_classes + existing_modules)))
-    # Ensure General is first
-    if "General" in all_options: all_options.remove("General")
-    module_options = ["General"] + all_options
+    # Populate options (General first)
+    module_options = utils.get_module_options(modules)
     
     default_index = 0
     if default_module in module_options:
@@ -110,10 +127,11 @@ if view == "🎙️ Command Center":
                 transcript = utils.transcribe_audio(audio_val)
                 st.info(f"Transcript: {transcript}")
                 
-                # Send to AI Router
+                # Send to AI Router (returns once saved; Calendar/Telegram go out from the outbox)
                 result_meta = utils.process_assistant_input(
                     transcript, 
-                    manual_module=selected_module
+                    manual_module=selected_module,
+                    wait=False
                 )
                 
                 # Display Result
@@ -125,8 +143,11 @@ if view == "🎙️ Command Center":
                     else:
                         st.success(f"✅ Task Added: {result_meta.get('title')}")
                         
-                    if result_meta.get("telegram_sent"):
-                        st.toast("📲 Sent to Phone")
+                    effects = result_meta.get("effects", {})
+                    if "calendar_status" in effects:
+                        st.toast("⏳ Calendar sync queued")
+                    if "telegram_sent" in effects:
+                        st.toast("⏳ Phone alert queued")
                     
                 st.session_state["last_audio"] = audio_val
                 st.rerun()
@@ -136,12 +157,32 @@ if view == "🎙️ Command Center":
         with st.container():
             img_val = st.camera_input("Scan Document")
             
-        if img_val:
+        # Only a new photo is sent; reruns show the stored transcription
+        if img_val and img_val != st.session_state.get("last_image"):
             with st.spinner("Transcribing Verbatim..."):
-                note = utils.analyze_image(img_val, manual_module=selected_module)
-                st.success("Document Saved to Knowledge Base.")
-                with st.expander("View Transcription"):
-                    st.write(note)
+                st.session_state["last_scan"] = utils.analyze_image(img_val, manual_module=selected_module)
+                st.session_state["last_image"] = img_val
+                
+        if img_val and "last_scan" in st.session_state:
+            st.success("Document Saved to Knowledge Base.")
+            with st.expander("View Transcription"):
+                st.write(st.session_state["last_scan"])
+        
+        # Multi-page handouts: pages are transcribed in parallel and saved together
+        with st.expander("📚 Scan Multiple Pages"):
+            pages = st.file_uploader("Pages (in order)", type=["jpg", "png", "jpeg"], accept_multiple_files=True)
+            combine = st.radio("Save as", ["One note", "One note per page"], horizontal=True) == "One note"
+            if pages and st.button(f"Transcribe {len(pages)} pages"):
+                bar = st.progress(0.0, text="Transcribing...")
+                for event in utils.ingest_documents(pages, manual_module=selected_module, combine=combine):
+                    if event["type"] == "page":
+                        status = f"⚠️ page {event['page']} failed" if event["error"] else f"page {event['page']} done"
+                        bar.progress(event["done"] / event["total"], text=f"{status} ({event['done']}/{event['total']})")
+                    else:
+                        bar.empty()
+                        if event["items"]: st.success(f"Saved {len(event['items'])} note(s) to {selected_module}.")
+                        else: st.info("Nothing new to save.")
+                        if event["failed"]: st.warning(f"Could not transcribe page(s): {', '.join(map(str, event['failed']))}")
 
 elif view == "📅 Calendar":
     st.header("📅 Weekly Planner")
@@ -155,20 +196,20 @@ elif view == "📅 Calendar":
             m_details = st.text_area("Details")
             
             # Module Dropdown
-            schedule_classes = utils.get_all_classes()
-            existing_modules = list(modules.keys())
-            all_options = sorted(list(set(schedule_classes + existing_modules)))
-            m_module = st.selectbox("Module", ["General"] + all_options)
+            m_module = st.selectbox("Module", utils.get_module_options(modules))
             
             if st.form_submit_button("Save Event"):
                 utils.add_manual_item(m_module, "events", m_title, m_details, str(m_date))
                 
-                # Sync to Google
-                with st.spinner("Syncing..."):
-                    iso = f"{m_date}T09:00:00"
-                    utils.add_google_calendar_event(m_title, iso)
+                # Sync to Google (queued in the outbox, retried until it goes through)
+                iso = f"{m_date}T09:00:00"
+                synced = utils.add_google_calendar_event(m_title, iso)
                 
-                st.success("Event Saved & Synced")
+                # Toasts outlive the rerun below; the Outbox panel shows when it went through
+                if synced is None:
+                    st.toast("⚠️ Event saved, Calendar not connected")
+                else:
+                    st.toast("⏳ Event saved, Calendar sync queued")
                 st.rerun()
     
     # Calendar Grid View
@@ -180,6 +221,9 @@ elif view == "📅 Calendar":
     
     cols = st.columns(5)
     
+    # One range query for the whole week, bucketed by day
+    week_events = utils.get_week_events(week_dates)
+    
     for i, col in enumerate(cols):
         current_day_date = week_dates[i]
         date_str = current_day_date.strftime("%Y-%m-%d")
@@ -190,17 +234,15 @@ elif view == "📅 Calendar":
             
             # Find events
             events_found = False
-            for mod, content in modules.items():
-                for event in content.get("events", []):
-                    if isinstance(event, dict) and event.get("date") == date_str:
-                        st.markdown(f"""
-                        <div class="event-card">
-                            <b>{event['title']}</b><br>
-                            <span style="font-size:0.8em;">{event.get('time', '')}</span><br>
-                            <span style="font-size:0.7em; color:#ccc">{mod}</span>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        events_found = True
+            for mod, event in week_events.get(date_str, []):
+                st.markdown(f"""
+                <div class="event-card">
+                    <b>{event['title']}</b><br>
+                    <span style="font-size:0.8em;">{event.get('time', '')}</span><br>
+                    <span style="font-size:0.7em; color:#ccc">{mod}</span>
+                </div>
+                """, unsafe_allow_html=True)
+                events_found = True
             
             if not events_found:
                 st.markdown('<div style="opacity:0.3; padding:10px;">Empty</div>', unsafe_allow_html=True)
@@ -216,9 +258,7 @@ elif view == "✅ Tasks":
             t_date = c2.date_input("Due Date")
             t_details = st.text_area("Details")
             
-            schedule_classes = utils.get_all_classes()
-            all_options = sorted(list(set(schedule_classes + list(modules.keys()))))
-            t_module = st.selectbox("Module", ["General"] + all_options)
+            t_module = st.selectbox("Module", utils.get_module_options(modules))
             
             if st.form_submit_button("Save Task"):
                 utils.add_manual_item(t_module, "tasks", t_title, t_details, str(t_date))
@@ -237,44 +277,66 @@ elif view == "✅ Tasks":
             with cols[idx]:
                 st.subheader(mod_name)
                 for task in content.get("tasks", []):
-                    if isinstance(task, dict):
-                        st.warning(f"**{task['title']}**\n\n{task.get('date', '')}")
-                    else:
+                    if isinstance(task, str):
                         st.warning(f"☐ {task}")
+                    else:
+                        st.warning(f"**{task['title']}**\n\n{task.get('date', '')}")
 
 elif view == "🧠 Knowledge":
     st.header("🧠 Knowledge Base")
     
-    for mod_name, content in modules.items():
-        with st.expander(f"📂 {mod_name}", expanded=False):
-            knowledge_items = content.get("knowledge", [])
+    query = st.text_input("🔎 Search notes", placeholder="e.g. contract law remedies")
+    if query:
+        hits = utils.search_knowledge(query)
+        st.caption(f"{len(hits)} result(s)")
+        for hit in hits:
+            st.markdown(f"#### {hit['title'] or 'Note'}")
+            st.caption(f"📂 {hit['module']} · {hit['date'] or ''}")
+            st.markdown(hit["snippet"])
+            st.divider()
+    else:
+        for mod_name, content in modules.items():
+            with st.expander(f"📂 {mod_name}", expanded=False):
+                knowledge_items = content.get("knowledge", [])
             
-            if knowledge_items:
-                for item in knowledge_items:
-                    st.markdown(f"#### {item.get('title', 'Note')}")
-                    st.caption(item.get('date', ''))
-                    st.write(item.get('details', ''))
-                    st.divider()
-            else:
-                st.caption("No notes.")
+                if knowledge_items:
+                    for item in knowledge_items:
+                        st.markdown(f"#### {item.get('title', 'Note')}")
+                        st.caption(item.get('date', ''))
+                        st.write(item.get('details', ''))
+                        st.divider()
+                else:
+                    st.caption("No notes.")
 
 elif view == "🗣️ Coach":
     st.header("🗣️ Presentation Coach")
     
     audio_coach = st.audio_input("Practice Speech")
     
-    if audio_coach:
+    # Only analyze a new recording; reruns show the stored result
+    if audio_coach and audio_coach != st.session_state.get("last_coach_audio"):
         with st.spinner("Analyzing..."):
-            transcript = utils.transcribe_audio(audio_coach, for_coach=True)
-            st.markdown(f"**Transcript:** {transcript}")
-            stats = utils.analyze_speech_coach(transcript)
-            
-            c1, c2, c3 = st.columns(3)
-            c1.metric("Grade", stats.get("grade", "N/A"))
-            c2.metric("Pacing", f"{stats.get('pacing_score', 0)}/10")
-            c3.metric("Fillers", stats.get("filler_count", 0))
-            
-            st.info(f"Critique: {stats.get('critique', '')}")
+            timed = utils.transcribe_with_timestamps(audio_coach)
+            st.session_state["coach_result"] = (timed["text"], utils.analyze_speech_coach(timed["text"], timed["words"]))
+            st.session_state["last_coach_audio"] = audio_coach
+    
+    if audio_coach and "coach_result" in st.session_state:
+        transcript, stats = st.session_state["coach_result"]
+        st.markdown(f"**Transcript:** {transcript}")
+        
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Grade", stats.get("grade", "N/A"))
+        c2.metric("Pacing", f"{stats.get('pacing_score', 0)}/10")
+        c3.metric("Fillers", stats.get("filler_count", 0))
+        
+        if stats.get("word_count"):
+            c4, c5, c6 = st.columns(3)
+            c4.metric("Words / min", stats["wpm"], help=f"Range {stats['wpm_min']}–{stats['wpm_max']} over 30s windows")
+            c5.metric("Long Pauses", stats["long_pauses"], help=f"{stats['pause_count']} pauses, median {stats['pause_p50']}s, longest {stats['pause_max']}s")
+            c6.metric("Repeats", stats["immediate_repeats"], help=f"{stats['bigram_repeat_ratio']:.1%} of word pairs reused")
+            if stats["fillers"]: st.caption("Fillers: " + ", ".join(f"{w} ×{n}" for w, n in stats["fillers"].items()))
+        
+        st.info(f"Critique: {stats.get('critique', '')}")
 
 # --- OMNISCIENT CHAT ---
 st.divider()
@@ -299,17 +361,18 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
         
-    with st.spinner("Working..."):
-        history = [m for m in st.session_state.messages if m["role"] != "system"]
-        response = utils.chat_with_emily(prompt, history)
+    # Earlier turns only (the prompt is passed separately); the CHAT branch trims them to a token budget
+    history = [m for m in st.session_state.messages[:-1] if m["role"] != "system"]
+    with st.chat_message("assistant"):
+        # Tokens render as they arrive; write_stream returns the full text
+        response = st.write_stream(utils.chat_with_emily_stream(prompt, history))
         
     st.session_state.messages.append({"role": "assistant", "content": response})
-    with st.chat_message("assistant"):
-        st.markdown(response)
-        if "✅" in response: # If action taken, refresh UI
-            st.rerun()
+    if "✅" in response: # If action taken, refresh UI
+        st.rerun()
 
-if uploaded_file:
+if uploaded_file and uploaded_file != st.session_state.get("last_upload"):
+    st.session_state["last_upload"] = uploaded_file
     with st.spinner("Transcribing..."):
         note = utils.analyze_image(uploaded_file, manual_module="General")
         st.session_state.messages.append({"role": "user", "content": "[Uploaded Document]"})
@@ -0,0 +1,95 @@
+"""
+Command line maintenance for the Andy OS data store.
+
+    python manage.py import-json data.json --sqlite data.db
+    python manage.py dedupe-ids [--sqlite data.db]
+    python manage.py import-ndjson items.ndjson [--sqlite data.db] [--strict]
+    python manage.py export-ndjson out.ndjson [--module "Business Law"] [--since 2025-01-01] [--until 2025-06-30]
+"""
+import argparse
+import sys
+import bulk
+import store
+
+
+def cmd_import_json(args):
+    target = store.SQLiteStore(args.sqlite) if args.sqlite else store.JournalStore(args.data_file)
+    count = store.import_json(target, args.source)
+    print(f"✅ Imported {count} items from {args.source}")
+
+
+def cmd_dedupe_ids(args):
+    target = store.SQLiteStore(args.sqlite) if args.sqlite else store.JournalStore(args.data_file)
+    print(f"✅ Gave {target.dedupe_ids()} items with a shared id a fresh one")
+
+
+def cmd_import_ndjson(args):
+    if args.strict and args.source == "-": sys.exit("❌ --strict reads the file twice, so it needs a file, not stdin")
+    target = store.SQLiteStore(args.sqlite) if args.sqlite else store.JournalStore(args.data_file)
+    source = sys.stdin if args.source == "-" else open(args.source, encoding="utf-8")
+    errors = []
+
+    def report(line, message):
+        errors.append(line)
+        print(f"⚠️ line {line}: {message}", file=sys.stderr)
+
+    with source:
+        if args.strict:
+            # Validate the whole file first so a bad line leaves the store untouched
+            for n, record in bulk.parse_lines(source):
+                try: bulk.validate(record)
+                except bulk.RecordError as e: report(n, e)
+            if errors: sys.exit(f"❌ {len(errors)} invalid lines, nothing imported")
+            source.seek(0)
+        imported, skipped = bulk.import_ndjson(target, source, args.chunk, report)
+    print(f"✅ Imported {imported} items from {args.source}" + (f", skipped {skipped}" if skipped else ""))
+
+
+def cmd_export_ndjson(args):
+    source = store.SQLiteStore(args.sqlite) if args.sqlite else store.JournalStore(args.data_file)
+    types = list(dict.fromkeys(bulk.TYPES[t] for t in args.type)) if args.type else store.ITEM_TYPES
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    with out:
+        count = bulk.export_ndjson(source, out, modules=args.module, types=types, start=args.since, end=args.until)
+    if args.output != "-": print(f"✅ Exported {count} items to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Andy OS data store tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import-json", help="one-shot import of a legacy data.json")
+    p.add_argument("source", help="data.json to import")
+    p.add_argument("--sqlite", help="target SQLite database (omit to import into the journal store)")
+    p.add_argument("--data-file", default="data.json", help="journal store snapshot (default: data.json)")
+    p.set_defaults(func=cmd_import_json)
+
+    p = sub.add_parser("dedupe-ids", help="give items that share an id (written by older versions) unique ids")
+    p.add_argument("--sqlite", help="SQLite database (omit to use the journal store)")
+    p.add_argument("--data-file", default="data.json", help="journal store snapshot (default: data.json)")
+    p.set_defaults(func=cmd_dedupe_ids)
+
+    p = sub.add_parser("import-ndjson", help="stream items from NDJSON (one JSON object per line, see bulk.py)")
+    p.add_argument("source", help="NDJSON file, or - for stdin")
+    p.add_argument("--sqlite", help="target SQLite database (omit to import into the journal store)")
+    p.add_argument("--data-file", default="data.json", help="journal store snapshot (default: data.json)")
+    p.add_argument("--chunk", type=int, default=bulk.CHUNK_SIZE, help=f"items per transaction (default: {bulk.CHUNK_SIZE})")
+    p.add_argument("--strict", action="store_true", help="import nothing if any line is invalid (needs a file, not stdin)")
+    p.set_defaults(func=cmd_import_ndjson)
+
+    p = sub.add_parser("export-ndjson", help="stream items out as NDJSON")
+    p.add_argument("output", nargs="?", default="-", help="NDJSON file (default: stdout)")
+    p.add_argument("--sqlite", help="SQLite database (omit to use the journal store)")
+    p.add_argument("--data-file", default="data.json", help="journal store snapshot (default: data.json)")
+    p.add_argument("--module", action="append", help="only this module (repeatable)")
+    p.add_argument("--type", action="append", choices=sorted(bulk.TYPES), help="only this item type (repeatable)")
+    p.add_argument("--since", help="only items dated on or after YYYY-MM-DD")
+    p.add_argument("--until", help="only items dated on or before YYYY-MM-DD")
+    p.set_defaults(func=cmd_export_ndjson)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Token-budgeted chat history: the newest turns go to the model verbatim, older ones are
+folded into a running summary that is only recomputed when more turns fall out of the
+window.
+"""
+import re
+from functools import lru_cache
+
+HISTORY_TOKENS = 3000   # verbatim history per prompt
+KEEP_RATIO = 0.6        # after an eviction the window drops to this share of the budget,
+                        # so the summary is refreshed every few turns, not every turn
+SUMMARY_TOKENS = 400    # upper bound asked of the summarizer
+MESSAGE_OVERHEAD = 4    # role and framing tokens per chat message
+ENCODING_MODEL = "gpt-4o"
+
+_PIECE_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]|\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken's encoding for the chat model, or None (not installed, or its BPE file can't be fetched)"""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(ENCODING_MODEL)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    enc = _encoding()
+    if enc: return len(enc.encode(text, disallowed_special=()))
+    # Estimate: a CJK character or a punctuation mark is about a token, a word one per 4 letters
+    return sum(1 if len(p) == 1 else (len(p) + 3) // 4 for p in _PIECE_RE.findall(text))
+
+
+def message_tokens(messages):
+    return sum(MESSAGE_OVERHEAD + count_tokens(m["content"]) for m in messages)
+
+
+def fallback_summary(summary, evicted, limit=SUMMARY_TOKENS):
+    """Summary without a model: the opening line of each evicted user message, newest kept"""
+    lines = [summary] if summary else []
+    lines += ["- " + m["content"].strip().splitlines()[0][:200] for m in evicted if m["role"] == "user" and m["content"].strip()]
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > limit: lines.pop(0)
+    return "\n".join(lines)
+
+
+class ChatMemory:
+    """
+    Per-conversation history manager. window(messages) returns what to send: a system
+    message with the summary of evicted turns (if any) followed by the newest messages,
+    which stay within `budget` tokens.
+
+    `summarize(summary, evicted)` returns the new summary for the previous one plus newly
+    evicted messages. It is only called when the window moves.
+    """
+
+    def __init__(self, budget=HISTORY_TOKENS, summarize=fallback_summary, keep_ratio=KEEP_RATIO):
+        self.budget = budget
+        self.summarize = summarize
+        self.keep_ratio = keep_ratio
+        self.summary = ""
+        self.evicted = 0        # messages[:evicted] are folded into the summary
+        self.summaries = 0
+
+    def window(self, messages):
+        if len(messages) < self.evicted: self.summary, self.evicted = "", 0  # conversation was cleared
+        start = self.evicted
+        if message_tokens(messages[start:]) > self.budget:
+            # Drop whole turns from the front until the rest fits the lower watermark
+            target, size, cut = self.budget * self.keep_ratio, message_tokens(messages[start:]), start
+            while cut < len(messages) and (size > target or messages[cut]["role"] != "user"):
+                size -= MESSAGE_OVERHEAD + count_tokens(messages[cut]["content"])
+                cut += 1
+            if cut == len(messages): cut = len(messages) - 1  # never drop the newest message
+            if cut > start:
+                self.summary = self.summarize(self.summary, messages[start:cut])
+                self.summaries += 1
+                self.evicted = start = cut
+        head = [{"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}] if self.summary else []
+        return head + list(messages[start:])
@@ -0,0 +1,164 @@
+import threading
+import time
+import requests
+import tracing
+from requests.adapters import HTTPAdapter
+
+API_BASE = "https://api.telegram.org"
+MAX_MESSAGE = 4096         # Telegram's limit for one text message
+TIMEOUT = (3.05, 10)       # (connect, read) seconds
+RATE = 1.0                 # messages per second to one chat...
+BURST = 3                  # ...with a few allowed back to back
+MAX_RETRY_AFTER = 30       # longer 429 waits fail the send (the outbox retries it later)
+
+
+class NotifierError(Exception):
+    sent = 0  # chunks of the message delivered before the failure (see TelegramNotifier.send)
+
+
+class ParseError(NotifierError):
+    """Telegram couldn't parse the Markdown, and the plain-text fallback was turned off"""
+
+
+class RateLimited(NotifierError):
+    def __init__(self, retry_after):
+        super().__init__(f"Telegram rate limit, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def split_message(text, limit=MAX_MESSAGE):
+    """Splits text into chunks of at most `limit` characters, preferring paragraph, line and word breaks"""
+    chunks = []
+    while len(text) > limit:
+        window = text[:limit]
+        for sep in ("\n\n", "\n", " "):
+            cut = window.rfind(sep)
+            if cut > limit // 2: break
+        else:
+            cut = limit
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not chunks: chunks.append(text)
+    return chunks
+
+
+class TokenBucket:
+    """Blocking token bucket; pause() holds every caller back (used for 429 retry_after)"""
+
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until one is available. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class RequestsTransport:
+    """Keep-alive HTTPS session; swap in another object with the same post() to test or benchmark"""
+
+    def __init__(self, pool_size=4):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, url, payload, timeout):
+        """Returns (status code, decoded JSON body or {})"""
+        r = self.session.post(url, json=payload, timeout=timeout)
+        try: body = r.json()
+        except ValueError: body = {}
+        return r.status_code, body
+
+
+class TelegramNotifier:
+    """
+    Sends bot messages to one chat over a persistent connection. It splits long texts at
+    Telegram's size limit and spaces sends with a token bucket. A 429 pauses the bucket for
+    the requested retry_after and retries the chunk (or raises RateLimited if that is too long).
+    """
+
+    def __init__(self, token, chat_id, transport=None, api_base=API_BASE, rate=RATE, burst=BURST,
+                 timeout=TIMEOUT, max_retry_after=MAX_RETRY_AFTER):
+        self.chat_id = chat_id
+        self.url = f"{api_base.rstrip('/')}/bot{token}/sendMessage"
+        self.transport = transport or RequestsTransport()
+        self.bucket = TokenBucket(rate, burst)
+        self.timeout = timeout
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._stats = {"messages": 0, "requests": 0, "chunks": 0, "rate_limited": 0, "throttled_s": 0.0, "errors": 0,
+                       "plain_fallbacks": 0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items(): self._stats[k] += v
+
+    def _post_chunk(self, text, parse_mode, plain_fallback=True):
+        payload = {"chat_id": self.chat_id, "text": text}
+        if parse_mode: payload["parse_mode"] = parse_mode
+        while True:
+            self._count(throttled_s=self.bucket.acquire(), requests=1)
+            try:
+                with tracing.span("telegram.send_message", bytes_in=len(text)) as span:
+                    status, body = self.transport.post(self.url, payload, self.timeout)
+                    span.set(status=status, outcome="ok" if status < 400 else "rate_limited" if status == 429 else "error")
+            except (requests.RequestException, OSError) as e:
+                self._count(errors=1)
+                raise NotifierError(f"Telegram request failed: {e}") from e
+            if status == 429:
+                retry_after = (body.get("parameters") or {}).get("retry_after", 1)
+                self._count(rate_limited=1)
+                self.bucket.pause(retry_after)
+                if retry_after > self.max_retry_after: raise RateLimited(retry_after)
+                continue
+            if status == 400 and parse_mode and "can't parse entities" in body.get("description", ""):
+                if not plain_fallback: raise ParseError(f"Telegram HTTP 400: {body['description']}")
+                # Unbalanced Markdown ("chapter_3"): deliver the text as it is
+                self._count(plain_fallbacks=1)
+                payload.pop("parse_mode")
+                parse_mode = None
+                continue
+            if status >= 400 or not body.get("ok", False):
+                self._count(errors=1)
+                raise NotifierError(f"Telegram HTTP {status}: {body.get('description', '')}")
+            return body
+
+    def send(self, text, parse_mode="Markdown", skip=0, plain_fallback=True):
+        """
+        Delivers text (split if needed), leaving out the first `skip` chunks that an earlier
+        attempt already sent. Returns True or raises NotifierError, whose .sent is then
+        the number of chunks delivered so far (the `skip` for the retry). Markdown Telegram
+        can't parse is sent as plain text, or raises ParseError without `plain_fallback`.
+        """
+        chunks = split_message(text)
+        for i in range(skip, len(chunks)):
+            try: self._post_chunk(chunks[i], parse_mode, plain_fallback)
+            except NotifierError as e:
+                e.sent = i
+                raise
+        self._count(messages=1, chunks=len(chunks) - skip)
+        return True
+
+    def stats(self):
+        with self._lock: return dict(self._stats)
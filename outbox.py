@@ -0,0 +1,216 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_at REAL NOT NULL,
+    created REAL NOT NULL,
+    last_error TEXT,
+    dead INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox(dead, kind, next_at);
+"""
+# Per kind: how many entries one send may carry (Google batches take 50 calls)...
+BATCH_SIZES = {"calendar": 50, "telegram": 20}
+# ...and how long a new entry waits before it is due, so a burst is joined into one message
+HOLD = {"telegram": 0.5}
+LEASE = 60   # seconds a claimed entry stays hidden from other flushers; renewed while it is sent
+POLL = 5     # seconds between looks at the table for entries queued by other processes
+
+
+class Progress:
+    """Sender outcome for an entry that went out in part: retry it later with `payload` instead"""
+
+    def __init__(self, payload, error):
+        self.payload = payload
+        self.error = error
+
+    def __str__(self):
+        return str(self.error)
+
+
+class Outbox:
+    """
+    Durable queue for outbound side effects (Calendar inserts, Telegram messages).
+
+    Entries are committed to SQLite before anything touches the network, so a failing or
+    slow endpoint neither loses the write nor blocks the caller. Each kind has its own
+    background flusher, so one kind's slow endpoint never holds up another's: it claims
+    due entries, hands them to the kind's sender as one batch, deletes what went through
+    and reschedules the rest with jittered exponential backoff. After `max_attempts`
+    an entry is kept as dead for inspection instead of being retried forever.
+
+    `senders` maps kind -> fn(list of payloads) returning one outcome per payload: True when
+    delivered, Progress(new payload, error) when part of it went out, anything else (False,
+    an exception, a message) to retry it. The lease on claimed entries is renewed for as
+    long as the sender runs, so a slow send is never claimed a second time.
+    """
+
+    def __init__(self, path, senders, batch_sizes=BATCH_SIZES, hold=HOLD, base_delay=2.0,
+                 max_delay=600.0, max_attempts=12, lease=LEASE, poll=POLL):
+        self.senders = senders
+        self.batch_sizes = batch_sizes
+        self.hold = hold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._wake = {kind: threading.Event() for kind in senders}
+        self._stop = threading.Event()
+        self._threads = []
+        self._futures = {}  # entry id -> Future, for entries queued by this process
+        self._stats = {"enqueued": 0, "delivered": 0, "retries": 0, "dead": 0, "sends": 0, "last_error": None}
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    # Producing
+    def enqueue(self, kind, payload):
+        """
+        Stores the effect and wakes the flusher. The returned future resolves True once it
+        was delivered, or False when the first attempt failed (it keeps being retried).
+        """
+        if kind not in self.senders: raise ValueError(f"Unknown outbox kind: {kind}")
+        now = time.time()
+        fut = Future()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO outbox (kind, payload, next_at, created) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), now + self.hold.get(kind, 0), now),
+            )
+            self._futures[cur.lastrowid] = fut
+            self._stats["enqueued"] += 1
+        self._wake[kind].set()
+        return fut
+
+    # Flushing
+    def _claim(self, kind, now):
+        """Due entries of one kind, leased to this flusher (safe across processes)"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, payload, attempts FROM outbox WHERE dead = 0 AND kind = ? AND next_at <= ? ORDER BY id LIMIT ?",
+                    (kind, now, self.batch_sizes.get(kind, 1)),
+                ).fetchall()
+                self._db.executemany("UPDATE outbox SET next_at = ? WHERE id = ?", [(now + self.lease, r[0]) for r in rows])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _backoff(self, attempts):
+        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _renew(self, ids, stop):
+        """Keeps extending the lease on `ids` until `stop` is set"""
+        while not stop.wait(self.lease / 2):
+            until = time.time() + self.lease
+            with self._lock:
+                self._db.executemany("UPDATE outbox SET next_at = ? WHERE id = ?", [(until, i) for i in ids])
+
+    def _send(self, kind, rows):
+        stop = threading.Event()
+        renewer = threading.Thread(target=self._renew, args=([r[0] for r in rows], stop), name="outbox-lease", daemon=True)
+        renewer.start()
+        try:
+            outcomes = list(self.senders[kind]([json.loads(r[1]) for r in rows]))
+        except Exception as e:
+            outcomes = [e] * len(rows)
+        finally:
+            stop.set()
+            renewer.join()
+        outcomes += [RuntimeError("no outcome from sender")] * (len(rows) - len(outcomes))
+
+        now = time.time()
+        done, retry, dead, settled, last_error = [], [], [], {}, None
+        for (entry_id, payload, attempts), outcome in zip(rows, outcomes):
+            settled[entry_id] = outcome is True
+            if outcome is True:
+                done.append((entry_id,))
+                continue
+            if isinstance(outcome, Progress): payload = json.dumps(outcome.payload, ensure_ascii=False)
+            attempts += 1
+            last_error = error = str(outcome) if outcome is not False else "send failed"
+            if attempts >= self.max_attempts: dead.append((attempts, error, payload, entry_id))
+            else: retry.append((attempts, now + self._backoff(attempts), error, payload, entry_id))
+
+        with self._lock:
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", done)
+            self._db.executemany("UPDATE outbox SET attempts = ?, next_at = ?, last_error = ?, payload = ? WHERE id = ?", retry)
+            self._db.executemany("UPDATE outbox SET attempts = ?, dead = 1, last_error = ?, payload = ? WHERE id = ?", dead)
+            self._stats["sends"] += 1
+            self._stats["delivered"] += len(done)
+            self._stats["retries"] += len(retry)
+            self._stats["dead"] += len(dead)
+            if last_error: self._stats["last_error"] = last_error
+            futures = [(self._futures.pop(i), ok) for i, ok in settled.items() if i in self._futures]
+        for fut, ok in futures: fut.set_result(ok)
+        return len(done)
+
+    def flush(self, kinds=None):
+        """Sends everything of `kinds` (default: all) that is due right now, batch by batch. Returns the number delivered."""
+        delivered = 0
+        for kind in kinds or self.senders:
+            while True:
+                rows = self._claim(kind, time.time())
+                if not rows: break
+                delivered += self._send(kind, rows)
+        return delivered
+
+    def _next_wait(self, kind):
+        with self._lock:
+            (due,) = self._db.execute("SELECT MIN(next_at) FROM outbox WHERE dead = 0 AND kind = ?", (kind,)).fetchone()
+        if due is None: return self.poll
+        return min(max(due - time.time(), 0), self.poll)
+
+    def _run(self, kind):
+        while not self._stop.is_set():
+            self._wake[kind].clear()
+            try: self.flush([kind])
+            except Exception as e:
+                print(f"❌ Outbox Flush Error ({kind}): {e}")
+                self._stats["last_error"] = str(e)
+            self._wake[kind].wait(self._next_wait(kind))
+
+    def start(self):
+        """Starts the background flushers, one per kind (once)"""
+        with self._lock:
+            if not self._threads:
+                self._threads = [threading.Thread(target=self._run, args=(kind,), name=f"outbox-{kind}", daemon=True) for kind in self.senders]
+                for t in self._threads: t.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        for wake in self._wake.values(): wake.set()
+        for t in self._threads: t.join(timeout)
+
+    # Metrics
+    def stats(self):
+        """Queue depth per kind, age of the oldest pending entry, and delivery/retry counters"""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, COUNT(*), MIN(created), MAX(attempts) FROM outbox WHERE dead = 0 GROUP BY kind"
+            ).fetchall()
+            (dead_rows,) = self._db.execute("SELECT COUNT(*) FROM outbox WHERE dead = 1").fetchone()
+            s = dict(self._stats)
+        s["depth"] = {kind: n for kind, n, _, _ in rows}
+        s["pending"] = sum(s["depth"].values())
+        s["oldest_age"] = now - min(r[2] for r in rows) if rows else 0.0
+        s["max_attempts"] = max((r[3] for r in rows), default=0)
+        s["dead_entries"] = dead_rows
+        return s
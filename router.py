@@ -0,0 +1,236 @@
+import datetime
+import json
+import re
+import threading
+import tracing
+
+# --- 1. RELATIVE DATES ---
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+# Full names, or one of these abbreviations as a whole word; "sat", "sun", "wed" and
+# "mon" ("mon ami") are ordinary words, so abbreviations only count after on/this/by/...
+_WD_FULL = r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+_WD = r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday|mon|tues?|wed(?:s|nes)?|thu(?:rs?)?|fri|sat|sun)\b\.?"
+_MON = (r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+        r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b\.?")
+
+DATE_PATTERNS = [
+    ("iso", re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")),
+    ("day_after", re.compile(r"\b(the )?day after (tomorrow|tmrw?)\b", re.I)),
+    ("tomorrow", re.compile(r"\b(tomorrow|tmrw?)\b", re.I)),
+    ("yesterday", re.compile(r"\byesterday\b", re.I)),
+    ("today", re.compile(r"\b(today|tonight|this (morning|afternoon|evening))\b", re.I)),
+    ("in_days", re.compile(r"\bin (\d+|a|one|two|three) (day|week)s?\b", re.I)),
+    ("next_week", re.compile(r"\bnext week\b", re.I)),
+    ("next_wd", re.compile(r"\bnext " + _WD, re.I)),
+    ("wd", re.compile(r"\b(?:on|this|coming|by|for) " + _WD, re.I)),
+    ("wd", re.compile(r"\b" + _WD_FULL + r"\b", re.I)),
+    ("day_month", re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)? (?:of )?" + _MON, re.I)),
+    ("month_day", re.compile(r"\b" + _MON + r" (\d{1,2})(?:st|nd|rd|th)?\b", re.I)),
+]
+_SMALL = {"a": 1, "one": 1, "two": 2, "three": 3}
+
+
+def _weekday_index(token):
+    return next(i for i, name in enumerate(WEEKDAYS) if name.startswith(token.lower()[:3]))
+
+def _month_date(today, month_token, day):
+    month = MONTHS.index(month_token.lower()[:3]) + 1
+    d = datetime.date(today.year, month, day)
+    # A date that already passed this year means next year's ("Jan 5" said in December)
+    return d.replace(year=today.year + 1) if d < today else d
+
+def parse_date(text, today):
+    """
+    Finds the first date phrase in `text` ("tomorrow", "next Friday", "in 3 days", "Nov 26", ...).
+    Returns (date, (start, end)) with the span of the phrase, or (None, None).
+    """
+    for kind, pattern in DATE_PATTERNS:
+        m = pattern.search(text)
+        if not m: continue
+        try:
+            if kind == "iso": d = datetime.date(int(m[1]), int(m[2]), int(m[3]))
+            elif kind == "day_after": d = today + datetime.timedelta(days=2)
+            elif kind == "tomorrow": d = today + datetime.timedelta(days=1)
+            elif kind == "yesterday": d = today - datetime.timedelta(days=1)
+            elif kind == "today": d = today
+            elif kind == "in_days":
+                n = int(m[1]) if m[1].isdigit() else _SMALL[m[1].lower()]
+                d = today + datetime.timedelta(days=n * (7 if m[2].lower() == "week" else 1))
+            elif kind == "next_week": d = today + datetime.timedelta(days=7 - today.weekday())
+            elif kind == "next_wd":
+                # "next Friday" = Friday of next week
+                d = today + datetime.timedelta(days=7 - today.weekday() + _weekday_index(m[1]))
+            elif kind == "wd":
+                # "Friday" / "on Friday" = the coming Friday, today included
+                d = today + datetime.timedelta(days=(_weekday_index(m[1]) - today.weekday()) % 7)
+            elif kind == "day_month": d = _month_date(today, m[2], int(m[1]))
+            else: d = _month_date(today, m[1], int(m[2]))
+        except (ValueError, KeyError, StopIteration):
+            continue
+        return d, m.span()
+    return None, None
+
+
+# --- 2. LOCAL FAST PATH ---
+# Obvious phrasings are routed without a model round-trip. Anything ambiguous returns None
+# and goes to the single structured LLM pass below.
+
+QUERY_RE = re.compile(
+    r"\b(do i have|have i got|am i (free|busy|available)|what'?s (on|happening|planned)|what is (on|happening|planned)"
+    r"|anything (on|planned|scheduled)|my (schedule|calendar|agenda|day)|any (meetings|events|classes|plans))\b",
+    re.I,
+)
+ADD_RE = re.compile(
+    r"^\s*(?:please\s+)?(?:add|create|new|save)\s+(?:a\s+|another\s+)?(?P<kind>task|todo|to-do|note)\b\s*(?:[:\-–]\s*|to\s+)?(?P<rest>.+)$",
+    re.I,
+)
+CHAT_RE = re.compile(
+    r"^\s*(hi|hello|hey|yo|thanks|thank you|thx|ok|okay|cool|great|good (morning|afternoon|evening|night))\b[\s!.,a-z]{0,12}$",
+    re.I,
+)
+# Date words left in the title once the date phrase is cut out ("call bank sun", "in 3 months",
+# "this weekend", "12/20"): a date parse_date() didn't understand, so the model has to read it
+LEFTOVER_DATE_RE = re.compile(
+    r"\d|/|\b(?:" + _WD + r"|" + _MON + r"|days?|weeks?|weekends?|weekdays?|months?|years?|fortnight|end of)\b", re.I
+)
+# Needs a time, a reminder or a phone push: leave these to the model
+DEFER_RE = re.compile(r"\b(remind|reminder|at \d|\d\s*(am|pm)|\d{1,2}:\d{2}|send|telegram|phone|schedule|meeting)\b", re.I)
+
+
+def classify_local(text, today, modules=()):
+    """
+    Deterministic router for common phrasings. Returns the same shape as route_with_llm()
+    ({"intent", "date", "action"}) or None when the message isn't obvious.
+    """
+    if CHAT_RE.match(text):
+        return {"intent": "CHAT", "date": None, "action": None}
+
+    m = ADD_RE.match(text)
+    if m and not DEFER_RE.search(text):
+        rest = m["rest"].strip()
+        d, span = parse_date(rest, today)
+        if span: rest = rest[:span[0]] + rest[span[1]:]
+        if LEFTOVER_DATE_RE.search(rest): return None
+        title = re.sub(r"\s+(by|on|for|due)\s*$", "", re.sub(r"\s+", " ", rest)).strip(" .,-")
+        if not title: return None
+        module = next((mod for mod in modules if mod.lower() in text.lower() and mod != "General"), None)
+        item_type = "note" if m["kind"].lower() == "note" else "task"
+        return {"intent": "ACTION", "date": None, "action": {
+            "type": item_type,
+            "module": module,
+            "title": title,
+            "details": "",
+            "date": (d or today).isoformat(),
+            "notify_telegram": False,
+        }}
+
+    if QUERY_RE.search(text) and not ADD_RE.match(text):
+        d, _ = parse_date(text, today)
+        if d: return {"intent": "QUERY", "date": d.isoformat(), "action": None}
+    return None
+
+
+# --- 3. SINGLE STRUCTURED LLM PASS ---
+
+ROUTE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "route",
+        "description": "Classify the user's message and extract everything needed to handle it.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "intent": {"type": "string", "enum": ["ACTION", "QUERY", "CHAT"]},
+                "date": {"type": "string", "description": "QUERY only: the day asked about, YYYY-MM-DD"},
+                "action": {
+                    "type": "object",
+                    "description": "ACTION only: the item to save or command to run",
+                    "properties": {
+                        "type": {"type": "string", "enum": ["task", "event", "note", "command"]},
+                        "module": {"type": "string", "description": "Subject or 'General'"},
+                        "title": {"type": "string"},
+                        "details": {"type": "string"},
+                        "date": {"type": "string", "description": "YYYY-MM-DD"},
+                        "time": {"type": "string", "description": "HH:MM"},
+                        "reminder_minutes": {"type": "integer"},
+                        "notify_telegram": {"type": "boolean"},
+                    },
+                },
+            },
+            "required": ["intent"],
+        },
+    },
+}
+
+def router_prompt(now_str):
+    return f"""
+    You are Andy. Current Time: {now_str}
+    Call `route` exactly once.
+
+    INTENT:
+    - ACTION: create a task, schedule an event, save a note, or run a command.
+    - QUERY: questions about the calendar ("what do I have on Friday?", "am I free?"). Fill `date`.
+    - CHAT: general conversation.
+
+    ACTION PAYLOAD (`action`):
+    1. TYPE (CRITICAL):
+       - EXECUTE/REPORT ("Send me a list", "What are my tasks?", "Send morning brief", "Send reminder now") -> command (Do NOT save).
+       - CREATE/SAVE ("Add task", "Buy milk", "Schedule meeting") -> task or event.
+       - INFORMATIONAL ("Notes", "Remember that", "The formula is...") -> note.
+    2. REMINDERS: TRAVEL -> 60m. VIRTUAL -> 15m. CALL -> 2m. EXAM -> 120m.
+    3. TELEGRAM: If user says "Send to phone" OR type is command -> notify_telegram = true.
+    """
+
+def route_with_llm(client, text, now_str, context_module="General"):
+    """One tool-calling round-trip that returns intent, date and action payload together"""
+    with tracing.span("openai.route", bytes_in=len(text)) as span:
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": router_prompt(now_str)},
+                {"role": "user", "content": f"Context: {context_module}. Input: {text}"},
+            ],
+            tools=[ROUTE_TOOL],
+            tool_choice={"type": "function", "function": {"name": "route"}},
+        )
+        arguments = response.choices[0].message.tool_calls[0].function.arguments
+        span.set(bytes_out=len(arguments))
+    args = json.loads(arguments)
+    intent = str(args.get("intent", "CHAT")).upper()
+    return {"intent": intent, "date": args.get("date"), "action": args.get("action")}
+
+
+# --- 4. ROUND-TRIP ACCOUNTING ---
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+def record(intent, path, llm_calls, seconds, first_token=None):
+    """
+    path is "local" or "llm"; llm_calls counts every model round-trip of the turn.
+    first_token is the time until the first piece of the reply was ready (streaming).
+    """
+    with _stats_lock:
+        s = _stats.setdefault((intent, path), {"turns": 0, "llm_calls": 0, "seconds": 0.0, "first_token": 0.0})
+        s["turns"] += 1
+        s["llm_calls"] += llm_calls
+        s["seconds"] += seconds
+        s["first_token"] += seconds if first_token is None else first_token
+
+def reset_stats():
+    with _stats_lock: _stats.clear()
+
+def stats():
+    """{(intent, path): {"turns", "avg_llm_calls", "avg_ms", "avg_first_token_ms"}}"""
+    with _stats_lock:
+        return {
+            key: {
+                "turns": s["turns"],
+                "avg_llm_calls": s["llm_calls"] / s["turns"],
+                "avg_ms": s["seconds"] * 1000 / s["turns"],
+                "avg_first_token_ms": s["first_token"] * 1000 / s["turns"],
+            }
+            for key, s in _stats.items()
+        }
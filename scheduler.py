@@ -0,0 +1,133 @@
+"""
+Once-a-day morning briefing, sent out of band instead of on every page rerun.
+
+The app starts one BriefingScheduler thread per process (utils.get_briefing_scheduler).
+It can also run on its own, with BRIEFING_SCHEDULER=off set for the app:
+
+    python scheduler.py            # keep running, send at BRIEFING_TIME every day
+    python scheduler.py --once     # send today's briefing now if it is due and unsent
+
+Any number of instances may run: a lease in Meta lets only one of them send, and
+Meta.last_briefing stops a second send on the same day.
+"""
+import argparse
+import datetime
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import wait
+
+LEASE_SECONDS = 300
+OVERDUE_LIMIT = 10  # overdue tasks listed by name; the rest are only counted
+
+
+def briefing_message(db, today_str):
+    """Builds the briefing from the store's date index (today's items + overdue tasks)"""
+    todays_tasks = []
+    todays_events = []
+    for mod, type_, item in db.items_between(today_str, today_str):
+        if type_ == "tasks": todays_tasks.append(f"• {item['title']}")
+        else: todays_events.append(f"• {item.get('time','?')}: {item['title']}")
+    overdue_tasks = [f"• {t['title']}" for mod, type_, t in db.overdue_tasks(today_str, OVERDUE_LIMIT)]  # oldest first
+    more = db.overdue_count(today_str) - OVERDUE_LIMIT if len(overdue_tasks) == OVERDUE_LIMIT else 0
+    if more > 0: overdue_tasks.append(f"…and {more} more")
+
+    msg = f"☕ **Morning Briefing** ({today_str})\n\n"
+
+    if todays_events: msg += f"📅 **Schedule:**\n" + "\n".join(todays_events) + "\n\n"
+    else: msg += "📅 Schedule is clear.\n\n"
+
+    if todays_tasks: msg += f"✅ **To-Do:**\n" + "\n".join(todays_tasks) + "\n\n"
+    else: msg += "✅ No deadlines today.\n\n"
+
+    if overdue_tasks:
+        msg += f"\n🛑 **Outstanding:**\n" + "\n".join(overdue_tasks)
+    return msg
+
+
+class BriefingScheduler:
+    """
+    Sends the briefing once per local day at `at` ("HH:MM" in `tz`). Started after that
+    time, it catches up immediately. `send(text)` should queue durably (send_telegram_alert).
+    """
+
+    def __init__(self, db, send, tz, at="07:00", lease_seconds=LEASE_SECONDS):
+        self.db = db
+        self.send = send
+        self.tz = tz
+        self.at = datetime.time.fromisoformat(at)
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent = 0
+
+    def _due_at(self, day):
+        return self.tz.localize(datetime.datetime.combine(day, self.at))
+
+    def _take_lease(self, today_str):
+        meta = self.db.load()["Meta"]
+        if meta.get("last_briefing") == today_str: return False
+        lease = meta.get("briefing_lease")
+        if lease and lease["until"] > time.time() and lease["owner"] != self.owner: return False
+        if not self.db.compare_and_set_meta("briefing_lease", lease, {"owner": self.owner, "until": time.time() + self.lease_seconds}):
+            return False
+        # Someone may have finished today's briefing between our read and the swap
+        return self.db.load()["Meta"].get("last_briefing") != today_str
+
+    def run_once(self, now=None):
+        """Sends today's briefing if it is due, unsent and ours to send. Returns the send result or None."""
+        now = now or datetime.datetime.now(self.tz)
+        if now < self._due_at(now.date()): return None
+        today_str = now.strftime("%Y-%m-%d")
+        if not self._take_lease(today_str): return None
+        result = self.send(briefing_message(self.db, today_str))
+        # CRITICAL: Save that we sent it so it doesn't send again
+        self.db.set_meta("last_briefing", today_str)
+        self.sent += 1
+        return result
+
+    def seconds_until_next(self, now=None):
+        now = now or datetime.datetime.now(self.tz)
+        due = self._due_at(now.date())
+        if now >= due: due = self._due_at(now.date() + datetime.timedelta(days=1))
+        return (due - now).total_seconds()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try: self.run_once()
+            except Exception as e: print(f"❌ Briefing Error: {e}")
+            # Wake up at the next send time; re-check hourly in case the clock jumped
+            self._stop.wait(min(self.seconds_until_next() + 1, 3600))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="briefing", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send the morning briefing out of band")
+    parser.add_argument("--once", action="store_true", help="send today's briefing if due, then exit")
+    args = parser.parse_args()
+
+    import utils
+    briefing = BriefingScheduler(utils.get_store(), utils.send_telegram_alert, utils.BEIJING_TZ, at=utils.BRIEFING_TIME)
+    if args.once:
+        result = briefing.run_once()
+        # The outbox keeps the message if this wait runs out; the app's flusher sends it later
+        if result is not None: wait([result], timeout=30)
+        print("Briefing sent." if briefing.sent else "Nothing to send.")
+        return
+    print(f"Sending the briefing daily at {utils.BRIEFING_TIME} ({utils.USER_TIMEZONE}).")
+    briefing.start()._thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import collections
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections.abc import Mapping
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import islice
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    rowid INTEGER PRIMARY KEY,
+    module TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    date TEXT,
+    UNIQUE (module, item_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(title, details, tokenize = 'unicode61 remove_diacritics 2');
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+INDEXED_TYPE = "knowledge"
+TITLE_WEIGHT = 5.0  # bm25 weight of a title hit relative to a details hit
+RESULT_CACHE = 64  # searches kept per index version (reruns repeat the same query)
+SNIPPET_WORDS = 16
+SNIPPET_WORD_CHARS = 7  # rough word length used to size the snippet window
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(words, prefix=True):
+    """Query words -> safe FTS5 MATCH expression: every word must appear, the last one as a prefix"""
+    return " ".join(f'"{w}"' for w in words) + ("*" if prefix else "")
+
+
+@lru_cache(maxsize=65536)
+def _fold(word):
+    """Case and accent folding, as the unicode61 tokenizer does it"""
+    return "".join(c for c in unicodedata.normalize("NFKD", word.casefold()) if not unicodedata.combining(c))
+
+
+def highlighter(words, prefix=False):
+    """
+    mark(text, window=None): `text` with the query words wrapped in **. With `window`, only
+    `window` words starting at the densest run of matches are kept. This is FTS5's
+    highlight() and snippet() done in Python on the page of results, because they need a
+    MATCH per row and re-running a prefix MATCH costs more than the search itself.
+    """
+    exact = {_fold(w) for w in words}
+    stem = _fold(words[-1]) if prefix else None
+    # Folding plain ASCII is just lowercasing, so one case-insensitive regex finds every hit
+    alternatives = [re.escape(w) + r"\b" for w in exact] + ([re.escape(stem) + r"\w*"] if stem is not None else [])
+    pattern = re.compile(r"\b(?:" + "|".join(alternatives) + ")", re.IGNORECASE)
+    ascii_query = all(w.isascii() for w in exact)
+
+    def hits(text):
+        if ascii_query and text.isascii(): return [m.span() for m in pattern.finditer(text)]
+        return [m.span() for m in _WORD_RE.finditer(text) if (t := _fold(m.group())) in exact or (stem is not None and t.startswith(stem))]
+
+    def mark(text, window=None):
+        spans = hits(text)
+        if window:
+            start = 0
+            if spans:  # the hit followed by the most hits within ~`window` words
+                reach = window * SNIPPET_WORD_CHARS
+                best = max(range(len(spans)), key=lambda i: bisect_left(spans, (spans[i][0] + reach,)) - i)
+                start = spans[best][0]
+            tokens = list(islice(_WORD_RE.finditer(text, start), window + 1))
+            end = tokens[window - 1].end() if len(tokens) > window else len(text)
+            spans = [(a - start, b - start) for a, b in spans if start <= a and b <= end]
+            text = ("… " if start else "") + text[start:end] + (" …" if len(tokens) > window else "")
+            if start: spans = [(a + 2, b + 2) for a, b in spans]
+        out, pos = [], 0
+        for a, b in spans:
+            out += [text[pos:a], "**", text[a:b], "**"]
+            pos = b
+        return "".join(out) + text[pos:]
+
+    return mark
+
+
+class KnowledgeIndex:
+    """
+    SQLite FTS5 index over knowledge titles and details, ranked with bm25.
+
+    It follows the store through Store.subscribe: every op this process writes or replays
+    is applied as it happens, tagged with the store version it produced. Several processes
+    may share the index file; ops already applied by another process are skipped by
+    version. Whenever the index can't prove it is current (a gap, a whole-document save,
+    a fresh file) it is rebuilt from the store before the next search.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._results = collections.OrderedDict()  # (version, text, limit, module) -> hits
+        self.rebuilds = 0
+
+    # Version bookkeeping
+    def _synced(self):
+        row = self._db.execute("SELECT value FROM state WHERE key = 'version'").fetchone()
+        return row[0] if row else -1
+
+    def _set_synced(self, version):
+        self._db.execute(
+            "INSERT INTO state (key, value) VALUES ('version', ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (version,),
+        )
+
+    # Writing
+    def _remove(self, module, item_id):
+        row = self._db.execute("SELECT rowid FROM docs WHERE module = ? AND item_id = ?", (module, item_id)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM docs_fts WHERE rowid = ?", row)
+            self._db.execute("DELETE FROM docs WHERE rowid = ?", row)
+
+    def _add(self, module, item):
+        if not isinstance(item, Mapping): return
+        item_id = str(item.get("id"))
+        self._remove(module, item_id)
+        cur = self._db.execute("INSERT INTO docs (module, item_id, date) VALUES (?, ?, ?)", (module, item_id, item.get("date")))
+        self._db.execute(
+            "INSERT INTO docs_fts (rowid, title, details) VALUES (?, ?, ?)",
+            (cur.lastrowid, str(item.get("title", "")), str(item.get("details", ""))),
+        )
+
+    def on_change(self, ops, version):
+        """Store listener (see Store.subscribe)"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                synced = self._synced()
+                first = version - len(ops) + 1 if ops is not None else None
+                if version <= synced:
+                    pass  # another process sharing the file got here first
+                elif ops is None or first > synced + 1:
+                    self._set_synced(-1)  # can't follow: rebuild before the next search
+                else:
+                    for offset, op in enumerate(ops):
+                        if first + offset <= synced or op.get("type") != INDEXED_TYPE: continue
+                        if op["op"] == "add": self._add(op["mod"], op["item"])
+                        elif op["op"] == "delete": self._remove(op["mod"], str(op["id"]))
+                    self._set_synced(version)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def rebuild(self, doc):
+        """Re-indexes every knowledge item of a store document"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM docs")
+                self._db.execute("DELETE FROM docs_fts")
+                for module, content in doc["Modules"].items():
+                    for item in content.get(INDEXED_TYPE, []): self._add(module, item)
+                self._db.execute("INSERT INTO docs_fts (docs_fts) VALUES ('optimize')")
+                self._set_synced(doc["Meta"].get("version", 0))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self.rebuilds += 1
+
+    def ensure_current(self, db):
+        doc = db.load()  # may replay other processes' ops into on_change first
+        if self._synced() != doc["Meta"].get("version", 0): self.rebuild(doc)
+
+    # Reading
+    def search(self, text, limit=20, module=None):
+        """[{"module", "id", "date", "title", "snippet", "score"}], best match first"""
+        words = _WORD_RE.findall(text)
+        if not words: return []
+        # bm25 scores every match, which is what a query for a word found in most notes
+        # costs; the same search on the same index version is answered from memory
+        with self._lock:
+            key = (self._synced(), text, limit, module)
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        hits = self._search(words, limit, module)
+        with self._lock:
+            self._results[key] = hits
+            if len(self._results) > RESULT_CACHE: self._results.popitem(last=False)
+        return hits
+
+    def _search(self, words, limit, module):
+        # Whole words first. Prefix queries merge the postings of every word they expand to,
+        # so the last word is only completed when it matches nothing on its own.
+        for prefix in (False, True):
+            ranked = self._rank(fts_query(words, prefix), limit, module)
+            if ranked: break
+        if not ranked: return []
+        scores, mark = dict(ranked), highlighter(words, prefix)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT d.rowid, d.module, d.item_id, d.date, f.title, f.details FROM docs d JOIN docs_fts f ON f.rowid = d.rowid"
+                f" WHERE d.rowid IN ({','.join('?' * len(scores))})",
+                tuple(scores),
+            ).fetchall()
+        rows.sort(key=lambda row: scores[row[0]])
+        return [
+            {
+                "module": m, "id": i, "date": d, "score": round(-scores[rowid], 3),
+                "title": mark(title), "snippet": mark(details, SNIPPET_WORDS),
+            }
+            for rowid, m, i, d, title, details in rows
+        ]
+
+    def _rank(self, query, limit, module):
+        """[(rowid, bm25)] for the best `limit` of all matches"""
+        where = "docs_fts MATCH ?" + (" AND rowid IN (SELECT rowid FROM docs WHERE module = ?)" if module else "")
+        match = (query, *((module,) if module else ()))
+        with self._lock:
+            return self._db.execute(
+                f"SELECT rowid, bm25(docs_fts, ?, 1.0) AS score FROM docs_fts WHERE {where} ORDER BY score LIMIT ?",
+                (TITLE_WEIGHT, *match, limit),
+            ).fetchall()
+
+    def count(self):
+        with self._lock: return self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
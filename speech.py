@@ -0,0 +1,156 @@
+"""
+Deterministic delivery metrics for the Coach, computed from word-level timestamps
+(whisper-1 verbose_json with timestamp_granularities=["word"]).
+
+Everything here is arithmetic over NumPy arrays of word start/end times and token ids,
+so the same recording always scores the same and an hour-long talk takes milliseconds.
+"""
+import re
+import numpy as np
+
+# Only clear disfluencies: matches are counted without looking at context, so words that
+# are usually content ("like", "so", "right", "actually") would flag clean speech
+FILLERS = ("um", "uh", "erm", "er", "ah", "hmm", "you know", "i mean")
+WINDOW_SECONDS = 30     # sliding window for words-per-minute
+STEP_SECONDS = 5
+PAUSE_SECONDS = 0.3     # a gap between words longer than this is a pause...
+LONG_PAUSE_SECONDS = 1.5  # ...and longer than this, a long one
+PAUSE_BINS = (0.3, 0.5, 1.0, 1.5, 3.0, float("inf"))
+TARGET_WPM = (120, 160)
+
+_TOKEN_RE = re.compile(r"[^\w']+")
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.sub(" ", text.lower()).split() if t]
+
+
+def _arrays(words):
+    """Token ids (one per word), start and end times; words without letters are dropped"""
+    tokens, starts, ends = [], [], []
+    for w in words:
+        # Hyphenated words become several tokens sharing the word's timing
+        for t in tokenize(w["word"]):
+            tokens.append(t)
+            starts.append(w["start"])
+            ends.append(w["end"])
+    vocab, ids = np.unique(np.array(tokens, dtype=str), return_inverse=True)
+    return vocab, ids.astype(np.int64).ravel(), np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64)
+
+
+def _phrase_hits(vocab, ids, phrase):
+    """Positions where the token sequence of `phrase` starts"""
+    parts = phrase.split()
+    where = np.searchsorted(vocab, parts) if len(vocab) else np.zeros(len(parts), dtype=np.int64)
+    if len(ids) < len(parts) or any(i >= len(vocab) or vocab[i] != p for i, p in zip(where, parts)):
+        return np.array([], dtype=np.int64)
+    n = len(ids) - len(parts) + 1
+    hit = np.ones(n, dtype=bool)
+    for k, token_id in enumerate(where): hit &= ids[k:k + n] == token_id
+    return np.flatnonzero(hit)
+
+
+def filler_counts(vocab, ids, fillers=FILLERS):
+    """{filler: count}. Multi-word fillers are matched first and their words not counted again."""
+    counts, used = {}, np.zeros(len(ids), dtype=bool)
+    for phrase in sorted(fillers, key=lambda p: -len(p.split())):
+        size = len(phrase.split())
+        starts = _phrase_hits(vocab, ids, phrase)
+        if size > 1 and len(starts):
+            span = starts[:, None] + np.arange(size)
+            starts = starts[~used[span].any(axis=1)]
+            used[(starts[:, None] + np.arange(size)).ravel()] = True
+        elif len(starts):
+            starts = starts[~used[starts]]
+            used[starts] = True
+        if len(starts): counts[phrase] = int(len(starts))
+    return counts
+
+
+def sliding_wpm(starts, window=WINDOW_SECONDS, step=STEP_SECONDS):
+    """Words per minute in windows of `window` seconds, every `step` seconds"""
+    if len(starts) == 0: return np.array([])
+    t0, t1 = starts[0], starts[-1]
+    if t1 - t0 <= window: return np.array([len(starts) * 60 / max(t1 - t0, 1e-9)]) if len(starts) > 1 else np.array([])
+    edges = np.arange(t0, t1 - window + step, step)
+    counts = np.searchsorted(starts, edges + window, side="left") - np.searchsorted(starts, edges, side="left")
+    return counts * 60.0 / window
+
+
+def pauses(starts, ends, threshold=PAUSE_SECONDS):
+    gaps = starts[1:] - ends[:-1]
+    return gaps[gaps > threshold]
+
+
+def repetition(ids):
+    """Immediate word repeats ("I I think") and repeated bigrams (reused phrasing), as counts and ratio"""
+    if len(ids) < 2: return {"immediate_repeats": 0, "repeated_bigrams": 0, "bigram_repeat_ratio": 0.0}
+    immediate = int(np.count_nonzero(ids[1:] == ids[:-1]))
+    bigrams = ids[:-1] * (int(ids.max()) + 1) + ids[1:]
+    _, counts = np.unique(bigrams, return_counts=True)
+    repeated = int((counts[counts > 1] - 1).sum())
+    return {"immediate_repeats": immediate, "repeated_bigrams": repeated, "bigram_repeat_ratio": round(repeated / len(bigrams), 4)}
+
+
+def pacing_score(wpm, windows):
+    """1-10: ten inside TARGET_WPM, one point off per 10 wpm outside, up to three off for uneven pace"""
+    lo, hi = TARGET_WPM
+    score = 10 - (max(lo - wpm, wpm - hi, 0) / 10)
+    if len(windows) > 1 and windows.mean() > 0:
+        score -= min(3.0, 10 * max(windows.std() / windows.mean() - 0.15, 0))
+    return int(round(min(10, max(1, score))))
+
+
+def grade(pace, fillers_per_minute, long_pauses_per_minute, repeat_ratio):
+    points = pace - min(4, fillers_per_minute) - min(2, long_pauses_per_minute) - min(2, 20 * repeat_ratio)
+    for letter, floor in (("A", 8.5), ("B", 7), ("C", 5.5), ("D", 4)):
+        if points >= floor: return letter
+    return "F"
+
+
+def analyze(words, fillers=FILLERS, window=WINDOW_SECONDS, step=STEP_SECONDS, pause_threshold=PAUSE_SECONDS):
+    """
+    Metrics for a list of {"word", "start", "end"} (seconds). Returns plain Python values:
+    grade, pacing_score, filler_count, fillers, wpm (+ min/max/std over sliding windows),
+    pause stats and histogram, and repetition counts.
+    """
+    vocab, ids, starts, ends = _arrays(words)
+    if len(ids) == 0:
+        return {"grade": "N/A", "pacing_score": 0, "filler_count": 0, "fillers": {}, "word_count": 0, "duration": 0.0}
+
+    duration = float(ends[-1] - starts[0])
+    minutes = max(duration / 60, 1e-9)
+    wpm = len(ids) / minutes
+    windows = sliding_wpm(starts, window, step)
+    gaps = pauses(starts, ends, pause_threshold)
+    counts = filler_counts(vocab, ids, fillers)
+    filler_total = sum(counts.values())
+    rep = repetition(ids)
+    long_pauses = int(np.count_nonzero(gaps > LONG_PAUSE_SECONDS))
+    pace = pacing_score(wpm, windows)
+    hist, _ = np.histogram(gaps, bins=(pause_threshold,) + PAUSE_BINS[1:]) if len(gaps) else (np.zeros(len(PAUSE_BINS) - 1, dtype=int), None)
+
+    return {
+        "grade": grade(pace, filler_total / minutes, long_pauses / minutes, rep["bigram_repeat_ratio"]),
+        "pacing_score": pace,
+        "filler_count": filler_total,
+        "fillers": dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))),
+        "fillers_per_minute": round(filler_total / minutes, 2),
+        "word_count": int(len(ids)),
+        "duration": round(duration, 2),
+        "wpm": round(wpm, 1),
+        "wpm_min": round(float(windows.min()), 1) if len(windows) else round(wpm, 1),
+        "wpm_max": round(float(windows.max()), 1) if len(windows) else round(wpm, 1),
+        "wpm_std": round(float(windows.std()), 1) if len(windows) else 0.0,
+        "pause_count": int(len(gaps)),
+        "long_pauses": long_pauses,
+        "pause_mean": round(float(gaps.mean()), 3) if len(gaps) else 0.0,
+        "pause_p50": round(float(np.percentile(gaps, 50)), 3) if len(gaps) else 0.0,
+        "pause_p90": round(float(np.percentile(gaps, 90)), 3) if len(gaps) else 0.0,
+        "pause_max": round(float(gaps.max()), 3) if len(gaps) else 0.0,
+        "pause_histogram": dict(zip(
+            [f"{a}-{b}s" if b != float("inf") else f">{a}s" for a, b in zip(PAUSE_BINS, PAUSE_BINS[1:])],
+            [int(c) for c in hist],
+        )),
+        **rep,
+    }
@@ -0,0 +1,871 @@
+import bisect
+import contextlib
+import copy
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from collections.abc import Mapping, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- 1. DOCUMENT MODEL ---
+# The store keeps the familiar data.json shape in memory:
+#   {"Modules": {mod: {"tasks": [], "events": [], "knowledge": []}}, "Meta": {...}}
+# Every mutation is a small "op" dict that is appended to the journal and
+# replayed on top of the last snapshot when the store is opened.
+
+ITEM_TYPES = ("tasks", "events", "knowledge")
+COMPACT_EVERY = 500  # journal entries before a background compaction kicks in
+
+
+class StoreError(Exception):
+    """The data files can't be read safely"""
+
+
+class ConflictError(StoreError):
+    """save() was handed a document that is older than the stored version"""
+
+
+def empty_db():
+    return {"Modules": {}, "Meta": {"last_briefing": ""}}
+
+def empty_module():
+    return {"tasks": [], "events": [], "knowledge": []}
+
+def new_id():
+    """Collision-free item id. Older data keeps its ids (numbers or UUID strings); all are matched as strings."""
+    return uuid.uuid4().hex
+
+
+class Model:
+    """
+    In-memory document that journal ops are applied to. It also maintains a date index,
+    type -> {date: {id(item): (module, item)}} plus the sorted list of dates per type, updated
+    incrementally on add/delete so agenda queries cost O(log n + result), and an id index,
+    (module, type, id) -> items, so finding an item by id is O(1). Deletes keep insertion
+    order, the order the journal and SQLite (ORDER BY seq) reload items in: an item's
+    position is the one it was appended at minus the deletes before it, counted with a
+    bisect over that list's deleted positions, and the list closes the gap with one
+    memmove. The deleted positions are reset once they outnumber the items.
+    """
+
+    def __init__(self, data):
+        if not isinstance(data.get("Modules"), dict): data["Modules"] = {}
+        if not isinstance(data.get("Meta"), dict): data["Meta"] = {"last_briefing": ""}
+        self.data = data
+        self._by_date = {}
+        self._dates = {}
+        self._by_id = {}
+        self._origin = {}  # (module, type) -> {id(item): position it was appended at}
+        self._gone = {}    # (module, type) -> sorted positions of the items deleted since
+        for mod, content in data["Modules"].items():
+            for type_, items in content.items():
+                self._rebase(mod, type_)
+                for item in items:
+                    self._index(mod, type_, item)
+                    self._index_id(mod, type_, item)
+
+    @property
+    def version(self):
+        return self.data["Meta"].get("version", 0)
+
+    # Date index
+    def _index(self, mod, type_, item):
+        d = item.get("date") if isinstance(item, dict) else None
+        if not isinstance(d, str): return
+        buckets = self._by_date.setdefault(type_, {})
+        if d not in buckets:
+            buckets[d] = {}
+            bisect.insort(self._dates.setdefault(type_, []), d)
+        buckets[d][id(item)] = (mod, item)
+
+    def _unindex(self, mod, type_, item):
+        d = item.get("date") if isinstance(item, dict) else None
+        bucket = self._by_date.get(type_, {}).get(d)
+        if bucket is None: return
+        bucket.pop(id(item), None)
+        if not bucket:
+            del self._by_date[type_][d]
+            dates = self._dates[type_]
+            del dates[bisect.bisect_left(dates, d)]
+
+    # Id index. Several items only for legacy data whose ids collided.
+    def _index_id(self, mod, type_, item):
+        if isinstance(item, dict): self._by_id.setdefault((mod, type_, str(item.get("id"))), []).append(item)
+
+    # Positions
+    def _rebase(self, mod, type_):
+        self._origin[(mod, type_)] = {id(item): pos for pos, item in enumerate(self.data["Modules"][mod][type_])}
+        self._gone[(mod, type_)] = []
+
+    def _append(self, mod, type_, item):
+        items = self.data["Modules"][mod].setdefault(type_, [])
+        if (mod, type_) not in self._origin: self._rebase(mod, type_)
+        self._origin[(mod, type_)][id(item)] = len(items) + len(self._gone[(mod, type_)])
+        items.append(item)
+
+    def _remove(self, mod, type_, item):
+        items, origin, gone = self.data["Modules"][mod][type_], self._origin[(mod, type_)], self._gone[(mod, type_)]
+        start = origin.pop(id(item))
+        del items[start - bisect.bisect_left(gone, start)]
+        bisect.insort(gone, start)
+        if len(gone) > len(items): self._rebase(mod, type_)
+
+    def _collect(self, types, span, limit=None):
+        """
+        (module, type, item) for the dates picked by span(sorted_dates) -> (i, j), ordered by date.
+        With a limit the walk stops after the first `limit` items of each type.
+        """
+        found = []
+        for type_ in types:
+            dates, start = self._dates.get(type_, []), len(found)
+            i, j = span(dates)
+            for k in range(i, j):
+                found.extend((mod, type_, item) for mod, item in self._by_date[type_][dates[k]].values())
+                if limit is not None and len(found) - start >= limit: break
+        if len(types) > 1: found.sort(key=lambda e: e[2]["date"])
+        return found if limit is None else found[:limit]
+
+    def between(self, start, end, types):
+        return self._collect(types, lambda ds: (bisect.bisect_left(ds, start), bisect.bisect_right(ds, end)))
+
+    def before(self, date, types, limit=None):
+        return self._collect(types, lambda ds: (0, bisect.bisect_left(ds, date)), limit)
+
+    def count_before(self, date, types):
+        """Items dated before `date`, counted from the index buckets without collecting them"""
+        total = 0
+        for type_ in types:
+            dates = self._dates.get(type_, [])
+            total += sum(len(self._by_date[type_][d]) for d in dates[:bisect.bisect_left(dates, date)])
+        return total
+
+    def apply(self, op):
+        kind = op["op"]
+        mods = self.data["Modules"]
+        if kind == "add":
+            if op["mod"] not in mods: mods[op["mod"]] = empty_module()
+            self._append(op["mod"], op["type"], op["item"])
+            self._index(op["mod"], op["type"], op["item"])
+            self._index_id(op["mod"], op["type"], op["item"])
+        elif kind == "delete":
+            # Every item with the id goes (legacy duplicates included)
+            for item in self._by_id.pop((op["mod"], op["type"], str(op["id"])), ()):
+                self._unindex(op["mod"], op["type"], item)
+                self._remove(op["mod"], op["type"], item)
+        elif kind == "meta":
+            self.data["Meta"][op["key"]] = op["value"]
+        if "seq" in op: self.data["Meta"]["version"] = op["seq"]
+
+    def has_item(self, mod, type_, id_):
+        return (mod, type_, str(id_)) in self._by_id
+
+    def duplicate_ids(self):
+        """[(module, type, id)] shared by more than one item (written before ids were unique)"""
+        return [key for key, items in self._by_id.items() if len(items) > 1]
+
+
+def diff_ops(before, after):
+    """Ops that turn document `before` into `after`; items are matched by id"""
+    ops = []
+    old_mods, new_mods = before.get("Modules", {}), after.get("Modules", {})
+    for mod in new_mods:
+        for type_ in set(old_mods.get(mod, {})) | set(new_mods[mod]):
+            old_items = _group_by_id(old_mods.get(mod, {}).get(type_, []))
+            new_items = _group_by_id(new_mods[mod].get(type_, []))
+            for id_ in old_items.keys() | new_items.keys():
+                if old_items.get(id_) == new_items.get(id_): continue
+                if id_ in old_items: ops.append({"op": "delete", "mod": mod, "type": type_, "id": id_})
+                for item in new_items.get(id_, []): ops.append({"op": "add", "mod": mod, "type": type_, "item": item})
+    for mod in old_mods.keys() - new_mods.keys():
+        for type_, items in old_mods[mod].items():
+            for id_ in _group_by_id(items): ops.append({"op": "delete", "mod": mod, "type": type_, "id": id_})
+    old_meta, new_meta = before.get("Meta", {}), after.get("Meta", {})
+    for key, value in new_meta.items():
+        if key != "version" and old_meta.get(key) != value: ops.append({"op": "meta", "key": key, "value": value})
+    return ops
+
+def _group_by_id(items):
+    groups = {}
+    for item in items:
+        if isinstance(item, dict): groups.setdefault(str(item.get("id")), []).append(item)
+    return groups
+
+
+class ReadOnlyDict(Mapping):
+    """Zero-copy, read-only view over a dict of the live document"""
+    __slots__ = ("_d",)
+
+    def __init__(self, d):
+        self._d = d
+
+    def __getitem__(self, key):
+        return freeze(self._d[key])
+
+    def __iter__(self):
+        return iter(list(self._d))  # snapshot the keys so a concurrent write can't break iteration
+
+    def __len__(self):
+        return len(self._d)
+
+    def __repr__(self):
+        return f"ReadOnlyDict({self._d!r})"
+
+    def to_dict(self):
+        """Mutable deep copy, e.g. for the legacy save_data() path"""
+        return copy.deepcopy(self._d)
+
+
+class ReadOnlyList(Sequence):
+    """Zero-copy, read-only view over a list of the live document"""
+    __slots__ = ("_l",)
+
+    def __init__(self, l):
+        self._l = l
+
+    def __getitem__(self, i):
+        if isinstance(i, slice): return ReadOnlyList(self._l[i])
+        return freeze(self._l[i])
+
+    def __len__(self):
+        return len(self._l)
+
+    def __add__(self, other):
+        return ReadOnlyList(self._l + list(other))
+
+    def __repr__(self):
+        return f"ReadOnlyList({self._l!r})"
+
+
+def freeze(obj):
+    if isinstance(obj, dict): return ReadOnlyDict(obj)
+    if isinstance(obj, list): return ReadOnlyList(obj)
+    return obj
+
+def thaw(obj):
+    return obj.to_dict() if isinstance(obj, ReadOnlyDict) else obj
+
+
+# --- 2. BACKEND INTERFACE ---
+
+class Store:
+    """
+    Common API of the storage backends. Subclasses implement _document/save/apply/delete_item;
+    the range queries below fall back to a scan of the document unless a backend has an index.
+
+    Each backend caches the parsed document in memory and only goes back to disk when the
+    files were changed by someone else, so repeated load() calls on unchanged data do no I/O.
+    `generation` is bumped on every change the cache sees, own writes included.
+    """
+    generation = 0
+    _listeners = ()
+
+    def subscribe(self, fn):
+        """
+        Calls fn(ops, version) after every change this process sees: its own writes and, on
+        the journal backend, ops replayed from other processes. `version` is the document
+        version after the ops, which are contiguous. ops is None when the whole document
+        was (re)loaded or replaced.
+        """
+        self._listeners = (*self._listeners, fn)
+
+    def _notify(self, ops, version):
+        for fn in self._listeners:
+            try: fn(ops, version)
+            except Exception as e: print(f"❌ Store Listener Error: {e}")
+
+    def _document(self):
+        """The cached, up-to-date document (plain dicts, never handed out)"""
+        raise NotImplementedError
+
+    def load(self):
+        """Read-only view of the whole document"""
+        return ReadOnlyDict(self._document())
+
+    def save(self, data, expected_version=None):
+        """Replaces the whole document; raises ConflictError if it moved past expected_version"""
+        raise NotImplementedError
+
+    def update(self, fn):
+        """
+        Read-modify-write of the whole document without clobbering other writers: fn(doc)
+        runs on a private copy of the latest data while the write lock is held, and only
+        the differences it made are applied as ops. Costs one deep copy of the document.
+        """
+        with self._write_lock():
+            current = self._document()
+            doc = copy.deepcopy(current)
+            fn(doc)
+            self.apply(diff_ops(current, doc))
+
+    def _write_lock(self):
+        raise NotImplementedError
+
+    def apply(self, ops):
+        raise NotImplementedError
+
+    def delete_item(self, mod, type_, id_):
+        raise NotImplementedError
+
+    def has_item(self, mod, type_, id_):
+        raise NotImplementedError
+
+    def add_item(self, mod, type_, item):
+        self.apply([{"op": "add", "mod": mod, "type": type_, "item": item}])
+
+    def dedupe_ids(self):
+        """Gives a fresh id to every item whose id is shared with an earlier one. Returns how many changed."""
+        with self._write_lock():
+            data = self._document()
+            ops, changed = [], 0
+            for mod, type_, id_ in self._model.duplicate_ids():
+                same = [i for i in data["Modules"][mod][type_] if isinstance(i, dict) and str(i.get("id")) == id_]
+                ops.append({"op": "delete", "mod": mod, "type": type_, "id": id_})
+                ops += [{"op": "add", "mod": mod, "type": type_, "item": dict(item, id=item.get("id") if n == 0 else new_id())}
+                        for n, item in enumerate(same)]
+                changed += len(same) - 1
+            self.apply(ops)
+            return changed
+
+    def set_meta(self, key, value):
+        self.apply([{"op": "meta", "key": key, "value": value}])
+
+    def compare_and_set_meta(self, key, expected, value):
+        """Sets Meta[key] only if it still equals `expected` (across processes). Returns True if it did."""
+        with self._write_lock():
+            if self._document()["Meta"].get(key) != thaw(expected): return False
+            self.set_meta(key, value)
+            return True
+
+    def iter_items(self, modules=None, types=ITEM_TYPES, start=None, end=None):
+        """
+        (module, type, item view) in storage order, one at a time. With `start`/`end`
+        (YYYY-MM-DD, inclusive) only dated items inside the range are produced.
+        """
+        doc = self.load()
+        for mod, content in doc["Modules"].items():
+            if modules and mod not in modules: continue
+            for type_ in types:
+                for item in content.get(type_, []):
+                    if start or end:
+                        d = item.get("date") if isinstance(item, Mapping) else None
+                        if not isinstance(d, str) or (start and d < start) or (end and d > end): continue
+                    yield mod, type_, item
+
+    def items_between(self, start, end, types=("tasks", "events")):
+        """[(module, type, item)] with start <= date <= end (YYYY-MM-DD), ordered by date"""
+        found = []
+        with self._lock:
+            for mod, content in self._document()["Modules"].items():
+                for type_ in types:
+                    for item in content.get(type_, []):
+                        d = item.get("date") if isinstance(item, dict) else None
+                        if isinstance(d, str) and start <= d <= end: found.append((mod, type_, freeze(item)))
+        found.sort(key=lambda e: e[2]["date"])
+        return found
+
+    def overdue_tasks(self, today, limit=None):
+        """[(module, "tasks", item)] dated before today, oldest first; only the first `limit` if given"""
+        found = []
+        with self._lock:
+            for mod, content in self._document()["Modules"].items():
+                for item in content.get("tasks", []):
+                    d = item.get("date") if isinstance(item, dict) else None
+                    if isinstance(d, str) and d < today: found.append((mod, "tasks", freeze(item)))
+        found.sort(key=lambda e: e[2]["date"])
+        return found if limit is None else found[:limit]
+
+    def overdue_count(self, today):
+        return len(self.overdue_tasks(today))
+
+
+# --- 3. JOURNAL STORE ---
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return None
+
+
+class FileLock:
+    """
+    Advisory inter-process lock on a side file (flock on POSIX, msvcrt on Windows).
+    Re-entrant for the owning store; callers must already hold the store's thread lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl: fcntl.flock(self._fd, fcntl.LOCK_EX)
+            else: msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl: fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else: msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            self._fd = None
+
+
+def _write_atomic(path, payload):
+    """Writes to a private temp file in the same directory, then renames it over `path`"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+
+class JournalStore(Store):
+    """
+    Snapshot file (the legacy data.json) plus an append-only journal.
+    A write costs one appended line instead of re-serializing the whole database;
+    the snapshot is rewritten by a background compaction every COMPACT_EVERY ops.
+    An existing data.json is simply the first snapshot, so no migration step is needed.
+
+    Writers from any process serialize on an advisory lock file, catch up with the journal
+    and only then number and append their ops, so concurrent adds/deletes merge instead of
+    overwriting each other. Snapshots are replaced by atomic rename and readers skip a
+    half-written journal line, so nobody ever parses a torn file.
+    """
+
+    def __init__(self, path, journal_path=None, compact_every=COMPACT_EVERY, lock_path=None):
+        self.path = path
+        self.journal_path = journal_path or os.path.splitext(path)[0] + ".journal"
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(lock_path or os.path.splitext(path)[0] + ".lock")
+        self._model = None
+        self._snapshot_sig = None
+        self._snapshot_version = 0
+        self._journal_ino = None
+        self._offset = 0   # bytes of the journal already replayed
+        self._pending = 0  # journal entries not yet folded into the snapshot
+        self._compacting = False
+
+    # Reading
+    def _read_snapshot(self):
+        if not os.path.exists(self.path): return empty_db()
+        with open(self.path, "r") as f:
+            try: return json.load(f)
+            except ValueError as e:
+                # Snapshots are only ever replaced atomically, so this is real corruption.
+                # Never fall back to an empty database: the next write would wipe the file.
+                raise StoreError(f"{self.path} is not valid JSON: {e}") from e
+
+    def _reload(self):
+        self._snapshot_sig = _stat(self.path)
+        self._model = Model(self._read_snapshot())
+        self._snapshot_version = self._model.version
+        self.generation += 1
+        self._journal_ino = None
+        self._offset = 0
+        self._pending = 0
+        self._notify(None, self._model.version)
+
+    def _replay_tail(self, retry=True):
+        sig = _stat(self.journal_path)
+        if sig is None:
+            self._journal_ino, self._offset = None, 0
+            return
+        if sig[0] != self._journal_ino:
+            # Journal was rewritten by a compaction: start from the top, seq filters old entries
+            self._journal_ino, self._offset = sig[0], 0
+        if sig[2] <= self._offset: return
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1  # leave a half-written last line for the next read
+        replayed = []
+        for line in chunk[:end].splitlines():
+            if not line.strip(): continue
+            op = json.loads(line)
+            seq = op.get("seq", 0)
+            if seq <= self._model.version: continue
+            if seq != self._model.version + 1:
+                # Another process compacted the missing entries into a newer snapshot
+                if not retry: raise StoreError(f"{self.journal_path} jumps from {self._model.version} to {seq}")
+                if replayed: self._notify(replayed, self._model.version)
+                self._reload()
+                return self._replay_tail(retry=False)
+            self._model.apply(op)
+            replayed.append(op)
+            self._pending += 1
+            self.generation += 1
+        self._offset += end
+        if replayed: self._notify(replayed, self._model.version)
+
+    def _refresh(self):
+        # Two stat() calls when nothing changed; files are only read for new journal bytes
+        if self._model is None or _stat(self.path) != self._snapshot_sig:
+            self._reload()
+        self._replay_tail()
+
+    def _document(self):
+        with self._lock:
+            self._refresh()
+            return self._model.data
+
+    def items_between(self, start, end, types=("tasks", "events")):
+        with self._lock:
+            self._refresh()
+            return [(mod, type_, freeze(item)) for mod, type_, item in self._model.between(start, end, types)]
+
+    def overdue_tasks(self, today, limit=None):
+        with self._lock:
+            self._refresh()
+            return [(mod, type_, freeze(item)) for mod, type_, item in self._model.before(today, ("tasks",), limit)]
+
+    def overdue_count(self, today):
+        with self._lock:
+            self._refresh()
+            return self._model.count_before(today, ("tasks",))
+
+    # Writing
+    @contextlib.contextmanager
+    def _write_lock(self):
+        with self._lock, self._file_lock:
+            yield
+
+    def apply(self, ops):
+        """Appends ops to the journal and applies them to the in-memory document"""
+        if not ops: return
+        with self._write_lock():
+            self._refresh()
+            lines, numbered = [], []
+            for op in ops:
+                op = dict(op, seq=self._model.version + 1)
+                self._model.apply(op)
+                numbered.append(op)
+                lines.append(json.dumps(op, ensure_ascii=False))
+            self.generation += 1
+            with open(self.journal_path, "ab") as f:
+                f.write(("\n".join(lines) + "\n").encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+                self._offset = f.tell()
+            self._journal_ino = _stat(self.journal_path)[0]
+            self._pending += len(ops)
+            self._notify(numbered, self._model.version)
+            if self._pending >= self.compact_every and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self.compact, daemon=True).start()
+
+    def has_item(self, mod, type_, id_):
+        with self._lock:
+            self._refresh()
+            return self._model.has_item(mod, type_, id_)
+
+    def delete_item(self, mod, type_, id_):
+        with self._write_lock():
+            self._refresh()
+            if not self._model.has_item(mod, type_, id_): return False
+            self.apply([{"op": "delete", "mod": mod, "type": type_, "id": str(id_)}])
+            return True
+
+    def save(self, data, expected_version=None):
+        """Replaces the whole document (legacy save_data path) and clears the journal"""
+        data = thaw(data)
+        with self._write_lock():
+            self._refresh()
+            if expected_version is not None and expected_version != self._model.version:
+                raise ConflictError(f"document is at version {self._model.version}, not {expected_version}")
+            data.setdefault("Meta", {})["version"] = self._model.version + 1
+            self._write_snapshot(json.dumps(data, indent=4).encode("utf-8"), data["Meta"]["version"])
+            self._rewrite_journal(after=data["Meta"]["version"])
+            self._model = Model(data)
+            self.generation += 1
+            self._notify(None, self._model.version)
+
+    # Compaction
+    def _write_snapshot(self, payload, version):
+        _write_atomic(self.path, payload)
+        self._snapshot_sig = _stat(self.path)
+        self._snapshot_version = version
+
+    def _rewrite_journal(self, after):
+        """Drops journal entries already contained in the snapshot (seq <= after)"""
+        keep = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"): break
+                    if line.strip() and json.loads(line).get("seq", 0) > after: keep.append(line)
+        _write_atomic(self.journal_path, b"".join(keep))
+        sig = _stat(self.journal_path)
+        self._journal_ino, self._offset, self._pending = sig[0], sig[2], len(keep)
+
+    def _replayed_copy(self, version):
+        """A private Model of the snapshot file with the journal replayed up to `version`, or None"""
+        model = Model(self._read_snapshot())
+        if model.version < version and os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    if model.version >= version or not line.endswith(b"\n"): break
+                    if not line.strip(): continue
+                    op = json.loads(line)
+                    if op.get("seq", 0) <= model.version: continue
+                    if op["seq"] != model.version + 1: return None  # another process compacted meanwhile
+                    model.apply(op)
+        return model if model.version == version else None
+
+    def compact(self):
+        """Folds the journal into a fresh snapshot. Safe to run in a background thread."""
+        try:
+            with self._lock:
+                self._refresh()
+                version = self._model.version
+            # The snapshot is rebuilt from the files and serialized without any lock held, so
+            # load() and other writers carry on meanwhile; only the file swap is locked
+            model = self._replayed_copy(version)
+            if model is None: return
+            payload = json.dumps(model.data, indent=4).encode("utf-8")
+            with self._write_lock():
+                self._refresh()
+                if self._snapshot_version >= version: return  # another process got there first
+                self._write_snapshot(payload, version)
+                self._rewrite_journal(after=version)
+        except Exception as e:
+            print(f"❌ Compaction Error: {e}")
+        finally:
+            self._compacting = False
+
+
+# --- 4. SQLITE STORE ---
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS modules (name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS items (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    module TEXT NOT NULL,
+    type TEXT NOT NULL,
+    date TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_date ON items(date);
+CREATE INDEX IF NOT EXISTS items_type_date ON items(type, date);
+CREATE INDEX IF NOT EXISTS items_module_type ON items(module, type);
+CREATE INDEX IF NOT EXISTS items_id ON items(id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class SQLiteStore(Store):
+    """
+    SQLite backend. Items keep their full JSON in `body`; id, module, type and date are
+    broken out into indexed columns so agenda queries never touch unrelated rows.
+    The full document for load() is cached and invalidated through PRAGMA data_version,
+    which only changes when another connection commits.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._model = None
+        self._data_version = None
+        self._txn_depth = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def is_empty(self):
+        with self._lock:
+            row = self._conn.execute("SELECT (SELECT COUNT(*) FROM modules) + (SELECT COUNT(*) FROM meta)").fetchone()
+            return row[0] == 0
+
+    def _read_all(self):
+        with self._lock:
+            data = empty_db()
+            for (name,) in self._conn.execute("SELECT name FROM modules ORDER BY rowid"):
+                data["Modules"][name] = empty_module()
+            for mod, type_, body in self._conn.execute("SELECT module, type, body FROM items ORDER BY seq"):
+                data["Modules"].setdefault(mod, empty_module()).setdefault(type_, []).append(json.loads(body))
+            for key, value in self._conn.execute("SELECT key, value FROM meta"):
+                data["Meta"][key] = json.loads(value)
+            return data
+
+    def _document(self):
+        with self._lock:
+            dv = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._model is None or dv != self._data_version:
+                self._model = Model(self._read_all())
+                self._data_version = dv
+                self.generation += 1
+                self._notify(None, self._model.version)
+            return self._model.data
+
+    def _version(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return json.loads(row[0]) if row else 0
+
+    def _insert(self, mod, type_, item):
+        self._conn.execute("INSERT OR IGNORE INTO modules (name) VALUES (?)", (mod,))
+        d = item.get("date")
+        self._conn.execute(
+            "INSERT INTO items (id, module, type, date, body) VALUES (?, ?, ?, ?, ?)",
+            (str(item.get("id")), mod, type_, d if isinstance(d, str) else None, json.dumps(item, ensure_ascii=False)),
+        )
+
+    def _set(self, key, value):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        """Re-entrant write transaction; BEGIN IMMEDIATE serializes writers across processes"""
+        with self._lock:
+            if self._txn_depth:
+                self._txn_depth += 1
+                try: yield
+                finally: self._txn_depth -= 1
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._txn_depth = 1
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._model = None
+                raise
+            finally:
+                self._txn_depth = 0
+
+    def apply(self, ops):
+        if not ops: return
+        with self._write_lock():
+            version = self._version()
+            for op in ops:
+                if op["op"] == "add":
+                    self._insert(op["mod"], op["type"], op["item"])
+                elif op["op"] == "delete":
+                    self._conn.execute(
+                        "DELETE FROM items INDEXED BY items_id WHERE module = ? AND type = ? AND id = ?",
+                        (op["mod"], op["type"], str(op["id"])),
+                    )
+                elif op["op"] == "meta":
+                    self._set(op["key"], op["value"])
+            self._set("version", version + len(ops))
+            # Route the write through the cache instead of re-reading the database
+            if self._model is not None and self._model.version == version:
+                for op in ops: self._model.apply(op)
+                self._model.data["Meta"]["version"] = version + len(ops)
+            else:
+                self._model = None
+            self.generation += 1
+            self._notify(ops, version + len(ops))
+
+    def has_item(self, mod, type_, id_):
+        # Without ANALYZE statistics the planner prefers items_module_type, a scan of the whole module
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM items INDEXED BY items_id WHERE module = ? AND type = ? AND id = ? LIMIT 1", (mod, type_, str(id_))
+            ).fetchone() is not None
+
+    def delete_item(self, mod, type_, id_):
+        with self._write_lock():
+            if not self.has_item(mod, type_, id_): return False
+            self.apply([{"op": "delete", "mod": mod, "type": type_, "id": str(id_)}])
+            return True
+
+    def save(self, data, expected_version=None):
+        data = thaw(data)
+        with self._write_lock():
+            self._model = None
+            version = self._version()
+            if expected_version is not None and expected_version != version:
+                raise ConflictError(f"document is at version {version}, not {expected_version}")
+            for table in ("items", "modules", "meta"): self._conn.execute(f"DELETE FROM {table}")
+            for mod, content in data.get("Modules", {}).items():
+                self._conn.execute("INSERT OR IGNORE INTO modules (name) VALUES (?)", (mod,))
+                for type_, items in content.items():
+                    for item in items:
+                        if isinstance(item, dict): self._insert(mod, type_, item)
+            for key, value in data.get("Meta", {}).items(): self._set(key, value)
+            self._set("version", version + 1)
+            self.generation += 1
+            self._notify(None, version + 1)
+
+    def iter_items(self, modules=None, types=ITEM_TYPES, start=None, end=None, batch=500):
+        # Straight from the table in batches, without building the cached document
+        where, args = [f"type IN ({','.join('?' * len(types))})"], list(types)
+        if modules: where.append(f"module IN ({','.join('?' * len(modules))})"); args += list(modules)
+        if start: where.append("date >= ?"); args.append(start)
+        if end: where.append("date <= ?"); args.append(end)
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT seq, module, type, body FROM items WHERE seq > ? AND {' AND '.join(where)} ORDER BY seq LIMIT ?",
+                    (last, *args, batch),
+                ).fetchall()
+            if not rows: return
+            for seq, mod, type_, body in rows: yield mod, type_, freeze(json.loads(body))
+            last = rows[-1][0]
+
+    def _rows(self, sql, args):
+        with self._lock:
+            return [(mod, type_, freeze(json.loads(body))) for mod, type_, body in self._conn.execute(sql, args)]
+
+    def items_between(self, start, end, types=("tasks", "events")):
+        marks = ",".join("?" * len(types))
+        return self._rows(
+            f"SELECT module, type, body FROM items WHERE date BETWEEN ? AND ? AND type IN ({marks}) ORDER BY date, seq",
+            (start, end, *types),
+        )
+
+    def overdue_tasks(self, today, limit=None):
+        return self._rows(
+            "SELECT module, type, body FROM items WHERE date < ? AND type = 'tasks' ORDER BY date, seq LIMIT ?",
+            (today, -1 if limit is None else limit),
+        )
+
+    def overdue_count(self, today):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM items WHERE date < ? AND type = 'tasks'", (today,)).fetchone()[0]
+
+
+# --- 5. FACTORY & IMPORT ---
+
+BACKENDS = ("journal", "sqlite")
+
+def import_json(target, json_path):
+    """One-shot copy of a legacy data.json into any backend"""
+    with open(json_path, "r") as f: data = json.load(f)
+    target.save(data)
+    return sum(len(items) for content in data.get("Modules", {}).values() for items in content.values())
+
+def open_store(backend, data_file, journal_file=None, sqlite_file=None):
+    """Builds the configured backend. An empty SQLite database is seeded from data_file once."""
+    if backend == "sqlite":
+        db = SQLiteStore(sqlite_file or os.path.splitext(data_file)[0] + ".db")
+        if db.is_empty() and os.path.exists(data_file): import_json(db, data_file)
+        return db
+    if backend == "journal":
+        return JournalStore(data_file, journal_file)
+    raise ValueError(f"Unknown storage backend: {backend} (expected one of {BACKENDS})")
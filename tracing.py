@@ -0,0 +1,237 @@
+"""
+Lightweight spans around external calls (OpenAI, Calendar, Telegram) and store operations.
+
+    with tracing.span("openai.route", model="gpt-4o", bytes_in=len(text)) as s:
+        response = client.chat.completions.create(...)
+        s.set(bytes_out=len(response.choices[0].message.content))
+
+Payload sizes (bytes_in: sent, bytes_out: received) of text are counted in characters.
+
+Tracing is off until configure() is called (TRACING=on, see utils.py); span() then returns
+a shared no-op object, so instrumented code costs one function call. When on, every
+finished span is appended as one JSON line to this process's rotating trace file
+(trace.jsonl -> trace.<pid>.jsonl) and its duration is kept in a per-operation window for
+the p50/p95/p99 in stats(). Spans opened inside another span in the same thread share its
+trace id, so a slow chat turn can be taken apart.
+
+    python tracing.py [trace.<pid>.jsonl ...]    # percentiles from trace files (default: all of trace.jsonl's)
+"""
+import collections
+import contextvars
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+WINDOW = 2000           # durations kept per operation for the percentiles
+MAX_BYTES = 5 * 2**20   # trace file size at which it rotates...
+BACKUPS = 3             # ...keeping this many old files next to it
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_lock = threading.Lock()
+_ops = {}               # op -> {"ms": deque, "count", "errors", "bytes", "sized"}
+_file = None
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def set(self, **attrs): pass
+
+
+NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("op", "attrs", "trace", "id", "parent", "start", "_token")
+
+    def __init__(self, op, attrs):
+        self.op = op
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Adds attributes (payload sizes, counts, outcome="...") to the record"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.trace = parent.trace if parent else os.urandom(6).hex()
+        self.parent = parent.id if parent else None
+        self.id = os.urandom(4).hex()
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self.start) * 1000
+        try: _current.reset(self._token)
+        except ValueError: pass  # a generator closed from another context
+        record = {"ts": round(time.time(), 3), "op": self.op, "ms": round(ms, 2),
+                  "outcome": self.attrs.pop("outcome", None) or ("error" if exc_type else "ok"),
+                  "trace": self.trace, "span": self.id}
+        if self.parent: record["parent"] = self.parent
+        if exc_type: record["error"] = f"{exc_type.__name__}: {exc}"[:300]
+        record.update(self.attrs)
+        _record(record)
+        return False
+
+
+def process_path(path, pid=None):
+    """trace.jsonl -> trace.<pid>.jsonl, the file one process writes"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid or os.getpid()}{ext}"
+
+
+def files(path):
+    """Every process's trace file for `path`, rotated ones included"""
+    root, ext = os.path.splitext(path)
+    name = re.compile(re.escape(os.path.basename(root)) + r"\.\d+" + re.escape(ext) + r"(\.\d+)?")
+    return sorted(p for p in glob.glob(glob.escape(root) + ".*") if name.fullmatch(os.path.basename(p)))
+
+
+class TraceFile:
+    """
+    Append-only JSONL file of one process, process_path(path), that rotates to .1 ... .N
+    once it reaches max_bytes. A file per process means no process ever rotates a file
+    another one is still appending to; a forked child moves to its own file.
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.base = path
+        self.path = None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._f = None
+        self._pid = None
+        self._size = 0
+
+    def write(self, line):
+        """Writes one line; callers serialize (the module lock)"""
+        if self._f is None or self._pid != os.getpid():
+            self.close()
+            self._pid = os.getpid()
+            self.path = process_path(self.base, self._pid)
+            self._f = open(self.path, "a", encoding="ascii")
+            self._size = self._f.tell()
+        if self._size and self._size + len(line) + 1 > self.max_bytes: self._rotate()
+        self._f.write(line + "\n")
+        self._f.flush()
+        self._size += len(line) + 1
+
+    def _rotate(self):
+        self.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"): os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups: os.replace(self.path, f"{self.path}.1")
+        else: os.remove(self.path)
+        self._f = open(self.path, "a", encoding="ascii")
+        self._size = 0
+
+    def close(self):
+        if self._f: self._f.close()
+        self._f = None
+
+
+def span(op, **attrs):
+    """Context manager timing one operation (see the module docstring)"""
+    if _file is None: return NOOP
+    return Span(op, attrs)
+
+
+def enabled():
+    return _file is not None
+
+
+def configure(path, max_bytes=MAX_BYTES, backups=BACKUPS):
+    """Turns tracing on, appending spans to `path`. Calling it again with the same path is a no-op."""
+    global _file
+    path = os.path.abspath(path)
+    with _lock:
+        if _file and _file.base == path: return
+        if _file: _file.close()
+        _file = TraceFile(path, max_bytes, backups)
+
+
+def disable():
+    global _file
+    with _lock:
+        if _file: _file.close()
+        _file = None
+
+
+def _add(ops, op, ms, error, size, window=WINDOW):
+    s = ops.get(op)
+    if s is None: s = ops[op] = {"ms": collections.deque(maxlen=window), "count": 0, "errors": 0, "bytes": 0, "sized": 0}
+    s["ms"].append(ms)
+    s["count"] += 1
+    s["errors"] += error
+    if size is not None:
+        s["bytes"] += size
+        s["sized"] += 1
+
+
+def _size(record):
+    sizes = [record[k] for k in ("bytes_in", "bytes_out") if isinstance(record.get(k), (int, float))]
+    return sum(sizes) if sizes else None
+
+
+def _record(record):
+    line = json.dumps(record, default=str)  # ASCII, so len(line) is its size on disk
+    with _lock:
+        _add(_ops, record["op"], record["ms"], record["outcome"] == "error", _size(record))
+        if _file is None: return
+        try: _file.write(line)
+        except (OSError, ValueError): pass  # tracing must never break the traced call
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summary(s):
+    ordered = sorted(s["ms"])
+    return {
+        "count": s["count"], "errors": s["errors"],
+        "p50_ms": _percentile(ordered, 0.50), "p95_ms": _percentile(ordered, 0.95),
+        "p99_ms": _percentile(ordered, 0.99), "max_ms": ordered[-1],
+        "avg_bytes": round(s["bytes"] / s["sized"]) if s["sized"] else None,
+    }
+
+
+def stats():
+    """{op: {"count", "errors", "p50_ms", "p95_ms", "p99_ms", "max_ms", "avg_bytes"}} for this process,
+    percentiles over the last WINDOW spans of each op"""
+    with _lock: return {op: _summary(s) for op, s in sorted(_ops.items())}
+
+
+def reset_stats():
+    with _lock: _ops.clear()
+
+
+def read_stats(paths):
+    """stats() computed from trace files: every span of every process that wrote them"""
+    ops = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try: r = json.loads(line)
+                except ValueError: continue  # torn last line
+                _add(ops, r["op"], r["ms"], r.get("outcome") == "error", _size(r), window=None)
+    return {op: _summary(s) for op, s in sorted(ops.items())}
+
+
+def main():
+    paths = sys.argv[1:] or files("trace.jsonl")
+    print(f"{'operation':28} {'count':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'avg bytes':>10}")
+    for op, s in read_stats(paths).items():
+        print(f"{op:28} {s['count']:7} {s['errors']:6} {s['p50_ms']:9.1f} {s['p95_ms']:9.1f} {s['p99_ms']:9.1f} "
+              f"{s['max_ms']:9.1f} {s['avg_bytes'] if s['avg_bytes'] is not None else '':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,52 @@ import json
 import os
 import datetime
 import pytz
-import requests
 import base64
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import time
+import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import store
+import gcal
+import outbox
+import notifier
+import scheduler
+import audio
+import images
+import speech
+import search
+import vectors
+import memory
+import re
+import router
+import llm_cache
+import tracing
 from openai import OpenAI
 
 # --- 1. CONFIGURATION ---
 DATA_FILE = "data.json"
+JOURNAL_FILE = "data.journal"
+SQLITE_FILE = "data.db"
+LLM_CACHE_FILE = "llm_cache.db"
+OUTBOX_FILE = "outbox.db"
+SEARCH_FILE = "search.db"
+VECTORS_FILE = "vectors.db"       # row bookkeeping + embedding cache
+VECTORS_MATRIX = "vectors.f32"    # memory-mapped embedding matrix
+EMBED_MODEL = "text-embedding-3-small"
+EMBED_DIMENSIONS = 512            # shortened embeddings: a third of the memory, same ranking quality for short items
+RETRIEVAL_K = 8                   # stored items injected into a CHAT prompt
+RETRIEVAL_MIN_SCORE = 0.3         # cosine similarity below which an item is not worth the tokens
+CONTEXT_CHARS = 600               # per injected item
+CHAT_HISTORY_TOKENS = int(os.environ.get("CHAT_HISTORY_TOKENS", memory.HISTORY_TOKENS))  # verbatim chat history per prompt
+SCAN_CONCURRENCY = int(os.environ.get("SCAN_CONCURRENCY", 4))  # pages transcribed at once
+# Filler lexicon for the Coach, comma-separated (e.g. "um,uh,you know")
+COACH_FILLERS = tuple(f.strip().lower() for f in os.environ.get("COACH_FILLERS", ",".join(speech.FILLERS)).split(",") if f.strip())
+BRIEFING_TIME = os.environ.get("BRIEFING_TIME", "07:00")  # local time (USER_TIMEZONE)
+BRIEFING_SCHEDULER = os.environ.get("BRIEFING_SCHEDULER", "app")  # "app" | "off" (run scheduler.py instead)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "journal")  # "journal" | "sqlite"
+TRACING = os.environ.get("TRACING", "off")  # "on" records spans of API calls and store operations (tracing.py)
+TRACE_FILE = os.environ.get("TRACE_FILE", "trace.jsonl")  # each process writes trace.<pid>.jsonl
+if TRACING == "on": tracing.configure(TRACE_FILE)
 USER_TIMEZONE = 'Asia/Shanghai' 
 BEIJING_TZ = pytz.timezone(USER_TIMEZONE)
 
@@ -22,16 +60,126 @@ def get_openai_client():
         return OpenAI(api_key=api_key)
     return None
 
+@st.cache_resource
+def get_llm_cache():
+    return llm_cache.LLMCache(LLM_CACHE_FILE)
+
+# Messages whose meaning depends on the clock ("in 2 hours", "now") are cached per minute
+TIME_SENSITIVE_RE = re.compile(r"\b(now|soon|later|tonight|in (\d+|an?|half an) (min|minute|hour|hr)s?)\b", re.I)
+
+def _cache_key(cache, site, parts, time_sensitive=False):
+    now = datetime.datetime.now(BEIJING_TZ)
+    return cache.key(site, parts, now.strftime("%Y-%m-%d"), now.strftime("%H:%M") if time_sensitive else None)
+
+def cached_llm(site, parts, compute, time_sensitive=False):
+    """
+    Runs compute() through the LLM response cache. The key covers the call site, the
+    normalized prompt parts (model + inputs) and today's date; TTLs live in llm_cache.TTLS.
+    """
+    cache = get_llm_cache()
+    return cache.get_or_compute(site, _cache_key(cache, site, parts, time_sensitive), compute)
+
+def stream_llm(client, messages, site=None, parts=None, on_call=None):
+    """
+    Yields gpt-4o completion text as the tokens arrive. With a cache `site`, a cached
+    answer is yielded in one piece and a fresh one is stored once the stream completes.
+    """
+    cache = key = None
+    if site:
+        cache = get_llm_cache()
+        key = _cache_key(cache, site, parts)
+        hit, value = cache.get(site, key)
+        if hit:
+            yield value
+            return
+    if on_call: on_call()
+    chunks = []
+    with tracing.span("openai.chat", site=site, bytes_in=_text_size(messages)) as span:
+        started = time.perf_counter()
+        for chunk in client.chat.completions.create(model="gpt-4o", messages=messages, stream=True):
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not chunks: span.set(first_token_ms=round((time.perf_counter() - started) * 1000, 1))
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunks[-1]
+        span.set(bytes_out=sum(map(len, chunks)))
+    if cache: cache.put(site, key, "".join(chunks))
+
+def _text_size(messages):
+    """Characters of prompt text (payload size for tracing)"""
+    return sum(len(m["content"]) if isinstance(m["content"], str) else 0 for m in messages)
+
 # --- 2. DATABASE HELPERS ---
+# Backend is picked by STORAGE_BACKEND (see store.py). The journal backend uses data.json
+# as its snapshot; the SQLite backend imports data.json on first start.
+@st.cache_resource
+def get_store():
+    """One store per process, shared by every session and rerun. It keeps the parsed data
+    in memory and only re-reads disk when another process changed the files."""
+    return store.open_store(STORAGE_BACKEND, DATA_FILE, JOURNAL_FILE, SQLITE_FILE)
+
+@st.cache_resource
+def get_search_index():
+    """Full-text index over knowledge notes. It follows every store write from here on and
+    catches up by itself after writes it missed (other processes, restarts)."""
+    index = search.KnowledgeIndex(SEARCH_FILE)
+    get_store().subscribe(index.on_change)
+    return index
+
+def search_knowledge(query, limit=20, module=None):
+    """Ranked knowledge hits with highlighted snippets (see search.KnowledgeIndex.search)"""
+    index = get_search_index()
+    index.ensure_current(get_store())
+    return index.search(query, limit=limit, module=module)
+
+def _embed(texts):
+    client = get_openai_client()
+    if not client: raise RuntimeError("API Key Missing")
+    with tracing.span("openai.embed", texts=len(texts), bytes_in=sum(map(len, texts))):
+        resp = client.embeddings.create(model=EMBED_MODEL, input=texts, dimensions=EMBED_DIMENSIONS)
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+@st.cache_resource
+def get_vector_index():
+    """Embeddings of every stored item; collects store writes and embeds them in the background"""
+    index = vectors.VectorIndex(VECTORS_FILE, VECTORS_MATRIX, EMBED_DIMENSIONS, EMBED_MODEL)
+    get_store().subscribe(index.on_change)
+    return index
+
+def sync_vectors():
+    """Starts embedding whatever changed since the last sync (batched, on the index's worker
+    thread). Errors are logged there, not raised."""
+    get_vector_index().request_sync(get_store(), _embed)
+
+def retrieve_context(query, k=RETRIEVAL_K):
+    """
+    Stored items most related to `query` ([] when embeddings are unavailable). Items the
+    backfill hasn't embedded yet are left out rather than embedded on the chat turn.
+    """
+    sync_vectors()
+    try:
+        vector = cached_llm("embed_query", [EMBED_MODEL, str(EMBED_DIMENSIONS), query], lambda: _embed([query])[0])
+    except Exception as e:
+        print(f"❌ Retrieval Error: {e}")
+        return []
+    return get_vector_index().search(vector, k=k, min_score=RETRIEVAL_MIN_SCORE)
+
 def load_data():
-    if not os.path.exists(DATA_FILE): 
-        return {"Modules": {}, "Meta": {"last_briefing": ""}}
-    with open(DATA_FILE, "r") as f:
-        try: return json.load(f)
-        except: return {"Modules": {}, "Meta": {"last_briefing": ""}}
+    """Read-only view of the database (use the helpers below to change it)"""
+    with tracing.span("store.load"):
+        return get_store().load()
 
 def save_data(data):
-    with open(DATA_FILE, "w") as f: json.dump(data, f, indent=4)
+    """Whole-document write. Raises store.ConflictError if someone else wrote since `data` was
+    loaded; prefer the item helpers below, or get_store().update(fn) which retries."""
+    with tracing.span("store.save", modules=len(data.get("Modules", {}))):
+        get_store().save(data, expected_version=data.get("Meta", {}).get("version"))
+
+def get_items_between(start_date, end_date, types=("tasks", "events")):
+    """[(module, type, item)] dated between start_date and end_date (inclusive)"""
+    with tracing.span("store.items_between") as span:
+        rows = get_store().items_between(start_date, end_date, types)
+        span.set(rows=len(rows))
+        return rows
 
 def get_beijing_time_str():
     return datetime.datetime.now(BEIJING_TZ).strftime("%H:%M")
@@ -61,23 +209,39 @@ def get_current_module():
 
 # --- 3. GOOGLE CALENDAR ENGINE (Read & Write) ---
 
-def get_calendar_service():
-    """Authenticates and returns the Google Calendar Service"""
+@st.cache_resource
+def get_calendar_client():
+    """Process-wide client: credentials, token and discovery document are reused across calls"""
     if "google" in st.secrets:
         creds_dict = dict(st.secrets["google"])
         creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-        creds = service_account.Credentials.from_service_account_info(
-            creds_dict, scopes=['https://www.googleapis.com/auth/calendar']
+        return gcal.CalendarClient(
+            creds_dict,
+            calendar_id=creds_dict.get("calendar_email", "primary"),
+            api_endpoint=os.environ.get("GOOGLE_CALENDAR_ENDPOINT"),
         )
-        return build('calendar', 'v3', credentials=creds), creds_dict.get("calendar_email", "primary")
-    return None, None
+    return None
+
+@st.cache_resource
+def get_calendar_mirror():
+    """Local syncToken-driven copy of the calendar used for availability questions"""
+    client = get_calendar_client()
+    if not client: return None
+    return gcal.CalendarMirror(
+        client, BEIJING_TZ,
+        refresh_after=float(os.environ.get("CALENDAR_REFRESH_AFTER", 30)),
+        max_staleness=float(os.environ.get("CALENDAR_MAX_STALENESS", 300)),
+    )
 
 def add_google_calendar_event(summary, start_iso, duration_minutes=60, reminder_minutes=15):
-    """Adds event with Smart Buffer"""
+    """
+    Adds event with Smart Buffer. The insert goes through the outbox, so this returns at once
+    with a future that resolves True when Google has the event (False if it is being retried).
+    Returns None when nothing was queued (Calendar not connected, or a bad start time).
+    """
     try:
-        service, target_id = get_calendar_service()
-        if not service: return False
-        
+        if not get_calendar_client(): return None
+
         start_dt = datetime.datetime.fromisoformat(start_iso)
         end_dt = start_dt + datetime.timedelta(minutes=duration_minutes)
         
@@ -86,17 +250,23 @@ def add_google_calendar_event(summary, start_iso, duration_minutes=60, reminder_
             overrides.append({'method': 'popup', 'minutes': reminder_minutes})
         
         event = {
+            'id': uuid.uuid4().hex,  # our own id makes retries idempotent
             'summary': f"{summary}", 
             'start': {'dateTime': start_dt.isoformat(), 'timeZone': USER_TIMEZONE},
             'end': {'dateTime': end_dt.isoformat(), 'timeZone': USER_TIMEZONE},
             'reminders': {'useDefault': False, 'overrides': overrides},
         }
-        
-        service.events().insert(calendarId=target_id, body=event).execute()
-        return True
+        return get_outbox().enqueue("calendar", event)
     except Exception as e:
         print(f"❌ Calendar Write Error: {e}")
-        return False
+        return None
+
+def _insert_calendar_events(events):
+    """Outbox sender: queued inserts go to Google as one batch request"""
+    client = get_calendar_client()
+    if not client: return [RuntimeError("Calendar not connected")] * len(events)
+    mirror = get_calendar_mirror()
+    return client.insert_events(events, on_created=mirror.record if mirror else None)
 
 def check_calendar_availability(date_str):
     """
@@ -104,27 +274,11 @@ def check_calendar_availability(date_str):
     date_str format: "YYYY-MM-DD"
     """
     try:
-        service, target_id = get_calendar_service()
-        if not service: return "⚠️ Calendar not connected."
+        mirror = get_calendar_mirror()
+        if not mirror: return "⚠️ Calendar not connected."
 
-        # Define start and end of that day in user timezone
-        tz = pytz.timezone(USER_TIMEZONE)
-        dt_start = datetime.datetime.strptime(date_str, "%Y-%m-%d")
-        dt_end = dt_start + datetime.timedelta(days=1)
-        
-        # Convert to ISO format with Timezone info
-        iso_start = tz.localize(dt_start).isoformat()
-        iso_end = tz.localize(dt_end).isoformat()
-
-        events_result = service.events().list(
-            calendarId=target_id, 
-            timeMin=iso_start, 
-            timeMax=iso_end, 
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
+        # Served from the local mirror; Google is only asked for changes when it is stale
+        events = mirror.events_on(date_str)
         
         if not events:
             return "No events found. You are free."
@@ -143,105 +297,231 @@ def check_calendar_availability(date_str):
 
 # --- 4. NOTIFICATION & AUDIT ---
 
-def send_telegram_alert(message):
+@st.cache_resource
+def get_notifier():
+    """Process-wide Telegram sender: one keep-alive session, rate limited per chat"""
     try:
-        if "telegram" in st.secrets:
-            token = st.secrets["telegram"]["bot_token"]
-            chat_id = st.secrets["telegram"]["chat_id"]
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-            requests.post(url, json={"chat_id": chat_id, "text": message, "parse_mode": "Markdown"})
-    except Exception as e: print(f"Telegram Failed: {e}")
-
-def check_and_send_briefing():
-    data = load_data()
-    today_str = get_current_date_str()
-    
-    # Ensure Meta exists
-    if "Meta" not in data: 
-        data["Meta"] = {"last_briefing": ""}
-    
-    last_sent = data["Meta"].get("last_briefing", "")
-    
-    # Only run if we haven't sent it today
-    if last_sent != today_str:
-        todays_tasks = []
-        todays_events = []
-        overdue_tasks = []
-        
-        for mod, content in data.get("Modules", {}).items():
-            # Tasks
-            for t in content.get("tasks", []):
-                if t.get("date") == today_str: todays_tasks.append(f"• {t['title']}")
-                elif t.get("date") < today_str: overdue_tasks.append(f"• {t['title']}")
-            # Events
-            for e in content.get("events", []):
-                if e.get("date") == today_str:
-                    todays_events.append(f"• {e.get('time','?')}: {e['title']}")
-        
-        # Build Message
-        msg = f"☕ **Morning Briefing** ({today_str})\n\n"
-        
-        if todays_events: msg += f"📅 **Schedule:**\n" + "\n".join(todays_events) + "\n\n"
-        else: msg += "📅 Schedule is clear.\n\n"
-        
-        if todays_tasks: msg += f"✅ **To-Do:**\n" + "\n".join(todays_tasks) + "\n\n"
-        else: msg += "✅ No deadlines today.\n\n"
-        
-        if overdue_tasks:
-            msg += f"\n🛑 **Outstanding:**\n" + "\n".join(overdue_tasks)
-            
-        # Send Alert
-        send_telegram_alert(msg)
-            
-        # CRITICAL: Save that we sent it so it doesn't send again
-        data["Meta"]["last_briefing"] = today_str
-        save_data(data)
+        if "telegram" not in st.secrets: return None
+        tg = st.secrets["telegram"]
+    except Exception: return None
+    return notifier.TelegramNotifier(tg["bot_token"], tg["chat_id"], api_base=os.environ.get("TELEGRAM_API_BASE", notifier.API_BASE))
+
+def send_telegram_alert(message):
+    """Queues a Telegram message in the outbox; returns a future like add_google_calendar_event (None without Telegram)"""
+    if not get_notifier(): return None
+    return get_outbox().enqueue("telegram", message)
+
+def _telegram_runs(pending):
+    """[(first, end)]: consecutive fresh alerts that fit in one Telegram message together"""
+    runs, first = [], 0
+    while first < len(pending):
+        end, size = first + 1, len(pending[first][0])
+        while (end < len(pending) and pending[first][1] == pending[end][1] == 0
+               and size + 2 + len(pending[end][0]) <= notifier.MAX_MESSAGE):
+            size += 2 + len(pending[end][0])
+            end += 1
+        runs.append((first, end))
+        first = end
+    return runs
+
+def _send_telegram_messages(messages):
+    """
+    Outbox sender. A burst of short alerts goes out joined as one message (one request
+    against the 1/s per-chat limit); if Telegram can't parse the joined Markdown they are
+    sent one by one, so only the broken one loses its formatting. Other alerts are sent and
+    acknowledged on their own: one that fails after some of its 4096-char chunks went out is
+    requeued with that count, so the retry carries on from the next chunk.
+    """
+    sender, outcomes = get_notifier(), []
+    pending = [(p, 0) if isinstance(p, str) else (p["text"], p["sent"]) for p in messages]
+    for first, end in _telegram_runs(pending):
+        if end - first > 1:
+            try:
+                sender.send("\n\n".join(text for text, _ in pending[first:end]), plain_fallback=False)
+                outcomes += [True] * (end - first)
+                continue
+            except notifier.ParseError: pass
+            except notifier.NotifierError as e:
+                outcomes += [e] * (end - first)
+                if isinstance(e, notifier.RateLimited): return outcomes + [e] * (len(pending) - end)
+                continue
+        for text, sent in pending[first:end]:
+            try: outcomes.append(sender.send(text, skip=sent))
+            except notifier.NotifierError as e:
+                outcomes.append(outbox.Progress({"text": text, "sent": e.sent}, e) if e.sent > sent else e)
+                # Telegram asked for a long pause: leave the rest of the batch for later
+                if isinstance(e, notifier.RateLimited): return outcomes + [e] * (len(pending) - len(outcomes))
+    return outcomes
+
+@st.cache_resource
+def get_outbox():
+    """Durable queue for Calendar/Telegram writes, drained by one background flusher per kind and process"""
+    return outbox.Outbox(OUTBOX_FILE, {
+        "calendar": _insert_calendar_events,
+        "telegram": _send_telegram_messages,
+    }).start()
+
+def get_trace_stats():
+    """p50/p95/p99 per traced operation in this process (see tracing.stats), None when TRACING is off"""
+    return tracing.stats() if tracing.enabled() else None
+
+@st.cache_resource
+def get_briefing_scheduler():
+    """Morning briefing thread, started once per process (see scheduler.py)"""
+    if BRIEFING_SCHEDULER != "app": return None
+    return scheduler.BriefingScheduler(get_store(), send_telegram_alert, BEIJING_TZ, at=BRIEFING_TIME).start()
 
 # --- 5. BRAIN: VISION, VOICE, & ROUTER ---
 
 def transcribe_audio(audio_file, for_coach=False):
+    """
+    Whisper transcript of a recording. The clip is downmixed/resampled to 16 kHz mono first,
+    long ones are split at silences and transcribed in parallel, and the result is cached
+    by content hash so the same audio is never sent twice.
+    """
     client = get_openai_client()
     if not client: return "⚠️ API Key Missing"
-    return client.audio.transcriptions.create(model="whisper-1", file=audio_file, response_format="text")
+    raw = audio_file.getvalue()
+    cache = get_llm_cache()
+    key = cache.key("transcribe", ["whisper-1", hashlib.sha256(raw).hexdigest(), for_coach], None)
+    return cache.get_or_compute("transcribe", key, lambda: _transcribe_chunks(client, raw, getattr(audio_file, "name", "audio.wav"))["text"])
+
+def transcribe_with_timestamps(audio_file):
+    """Like transcribe_audio, plus word timings: {"text", "words": [{"word", "start", "end"}]}"""
+    client = get_openai_client()
+    if not client: return {"text": "⚠️ API Key Missing", "words": []}
+    raw = audio_file.getvalue()
+    cache = get_llm_cache()
+    key = cache.key("transcribe", ["whisper-1", "words", hashlib.sha256(raw).hexdigest()], None)
+    return cache.get_or_compute("transcribe", key, lambda: _transcribe_chunks(client, raw, getattr(audio_file, "name", "audio.wav"), words=True))
+
+def _transcribe_chunks(client, raw, name, words=False):
+    chunks = audio.prepare(raw)
+    def transcribe(i):
+        offset, data = chunks[i]
+        file = (name if data is raw else f"chunk{i}.wav", data)
+        with tracing.span("openai.transcribe", bytes_in=len(data), words=words) as span:
+            if not words:
+                text = client.audio.transcriptions.create(model="whisper-1", file=file, response_format="text").strip()
+                span.set(bytes_out=len(text))
+                return {"text": text}
+            resp = client.audio.transcriptions.create(model="whisper-1", file=file, response_format="verbose_json", timestamp_granularities=["word"])
+            span.set(bytes_out=len(resp.text))
+        # Chunk timings start at zero; shift them to the position in the whole recording
+        return {"text": resp.text.strip(), "words": [
+            {"word": w.word, "start": round(w.start + offset, 3), "end": round(w.end + offset, 3)} for w in (resp.words or [])
+        ]}
+    if len(chunks) == 1: parts = [transcribe(0)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(chunks), 4), thread_name_prefix="whisper") as pool:
+            parts = list(pool.map(transcribe, range(len(chunks))))
+    result = {"text": " ".join(p["text"] for p in parts)}
+    if words: result["words"] = [w for p in parts for w in p["words"]]
+    return result
+
+def _transcribe_scan(client, raw):
+    """(content hash, verbatim transcription) of one page; cached so a page is sent once"""
+    scan_hash = images.content_hash(raw)
+
+    def transcribe():
+        base64_image = base64.b64encode(images.prepare(raw)).decode('utf-8')
+        with tracing.span("openai.vision", bytes_in=len(base64_image)) as span:
+            response = client.chat.completions.create(
+                model="gpt-4o",
+                messages=[{
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "Transcribe this document VERBATIM. Format cleanly with bullets. No summarizing."},
+                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    ],
+                }],
+                max_tokens=1500
+            )
+            span.set(bytes_out=len(response.choices[0].message.content or ""))
+        return response.choices[0].message.content
+
+    cache = get_llm_cache()
+    return scan_hash, cache.get_or_compute("vision", cache.key("vision", ["gpt-4o", scan_hash], None), transcribe)
+
+def _known_scans(manual_module):
+    knowledge = load_data()["Modules"].get(manual_module, {}).get("knowledge", [])
+    return {k.get("scan_hash") for k in knowledge if not isinstance(k, str)}
+
+def _scan_item(id_, title, details, scan_hash):
+    return {
+        "id": id_,
+        "title": title,
+        "details": details,
+        "date": get_current_date_str(),
+        "created_at": get_beijing_time_str(),
+        "scan_hash": scan_hash,
+    }
 
 def analyze_image(image_file, manual_module="General"):
+    """
+    Verbatim transcription of a document photo, saved to the module's Knowledge. The image
+    is shrunk (and grayscaled) before upload; the same image is transcribed and saved once.
+    """
     client = get_openai_client()
     if not client: return "⚠️ API Key Missing"
 
     try:
-        base64_image = base64.b64encode(image_file.getvalue()).decode('utf-8')
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Transcribe this document VERBATIM. Format cleanly with bullets. No summarizing."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                ],
-            }],
-            max_tokens=1500
-        )
-        analysis = response.choices[0].message.content
-        
-        data = load_data()
-        if manual_module not in data["Modules"]: data["Modules"][manual_module] = {"tasks":[], "events":[], "knowledge":[]}
-        if "knowledge" not in data["Modules"][manual_module]: data["Modules"][manual_module]["knowledge"] = []
-        
-        item = {
-            "id": len(data["Modules"][manual_module]["knowledge"]) + 1,
-            "title": "📷 Document Scan",
-            "details": analysis,
-            "date": get_current_date_str(),
-            "created_at": get_beijing_time_str()
-        }
-        data["Modules"][manual_module]["knowledge"].append(item)
-        save_data(data)
+        scan_hash, analysis = _transcribe_scan(client, image_file.getvalue())
+        # Already in the Knowledge Base: don't append another copy
+        if scan_hash in _known_scans(manual_module): return analysis
+        item = _scan_item(store.new_id(), "📷 Document Scan", analysis, scan_hash)
+        with tracing.span("store.add", type="knowledge"): get_store().add_item(manual_module, "knowledge", item)
         return analysis
     except Exception as e: return f"Error: {str(e)}"
-def process_assistant_input(user_text, manual_module="General", last_task_metadata=None):
+
+def ingest_documents(files, manual_module="General", combine=True, concurrency=None):
+    """
+    Batch scan: transcribes many pages concurrently (at most `concurrency` requests in flight)
+    and saves them in one store transaction, as one Knowledge item (combine=True, pages in
+    upload order) or one item per page. A generator of progress events:
+      {"type": "page", "page": n, "done": k, "total": N, "error": None | str}  as pages finish
+      {"type": "saved", "items": [...], "failed": [page numbers]}              at the end
+    """
+    client = get_openai_client()
+    if not client:
+        yield {"type": "saved", "items": [], "failed": list(range(1, len(files) + 1)), "error": "API Key Missing"}
+        return
+
+    pages = [f.getvalue() for f in files]
+    results = [None] * len(pages)  # (scan_hash, text) per page, in upload order
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency or SCAN_CONCURRENCY, len(pages))), thread_name_prefix="scan") as pool:
+        futures = {pool.submit(_transcribe_scan, client, raw): i for i, raw in enumerate(pages)}
+        for done, fut in enumerate(as_completed(futures), 1):
+            i, error = futures[fut], None
+            try: results[i] = fut.result()
+            except Exception as e: error = str(e)
+            yield {"type": "page", "page": i + 1, "done": done, "total": len(pages), "error": error}
+
+    failed = [i + 1 for i, r in enumerate(results) if r is None]
+    ok = [(i + 1, r) for i, r in enumerate(results) if r is not None]
+    known = _known_scans(manual_module)
+    items = []
+    if combine and ok:
+        details = "\n\n".join(f"**Page {n}**\n\n{text}" for n, (_, text) in ok)
+        # A partial document gets no hash, so rescanning it later is not treated as a duplicate
+        batch_hash = images.content_hash("".join(h for _, (h, _) in ok).encode()) if not failed else None
+        if batch_hash is None or batch_hash not in known:
+            items.append(_scan_item(store.new_id(), f"📷 Document Scan ({len(ok)} pages)", details, batch_hash))
+    elif not combine:
+        for n, (scan_hash, text) in ok:
+            if scan_hash in known: continue
+            known.add(scan_hash)
+            items.append(_scan_item(store.new_id(), f"📷 Document Scan (page {n})", text, scan_hash))
+
+    with tracing.span("store.add", type="knowledge", items=len(items)):
+        get_store().apply([{"op": "add", "mod": manual_module, "type": "knowledge", "item": item} for item in items])
+    # Embed the new pages now, in batched requests, rather than on the next chat message
+    if items: sync_vectors()
+    yield {"type": "saved", "items": items, "failed": failed}
+
+def _classify_capture(user_text, manual_module):
     client = get_openai_client()
     if not client: return {"error": "API Key Missing"}
-    data = load_data()
     
     # --- UPDATED PROMPT: STRICT 'COMMAND' SEPARATION ---
     system_prompt = f"""
@@ -271,165 +551,311 @@ def process_assistant_input(user_text, manual_module="General", last_task_metada
     }}
     """
     
+    def classify():
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": f"Context: {manual_module}. Input: {user_text}"}]
+        with tracing.span("openai.capture", bytes_in=_text_size(messages)) as span:
+            response = client.chat.completions.create(model="gpt-4o", messages=messages, response_format={"type": "json_object"})
+            span.set(bytes_out=len(response.choices[0].message.content or ""))
+        return json.loads(response.choices[0].message.content)
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": f"Context: {manual_module}. Input: {user_text}"}],
-            response_format={"type": "json_object"}
-        )
-        result = json.loads(response.choices[0].message.content)
+        return cached_llm("capture", ["gpt-4o", manual_module, user_text], classify,
+                          time_sensitive=bool(TIME_SENSITIVE_RE.search(user_text)))
     except Exception as e: return {"error": str(e)}
 
+def process_assistant_input(user_text, manual_module="General", last_task_metadata=None, parsed=None, wait=True):
+    """
+    Classifies and handles a capture. `parsed` is an action payload the router already
+    extracted (same keys as the JSON above), which skips the classification call.
+    With wait=False the result comes back as soon as the local save committed; its
+    Calendar/Telegram outcomes are then collected with iter_effects()/gather_effects().
+    """
+    result = dict(parsed) if parsed is not None else _classify_capture(user_text, manual_module)
+    if "error" in result: return result
+
     # Force Reminders to Calendar
     if "remind" in user_text.lower() and result.get("type") == "task":
         result["type"] = "event"
+    _fill_defaults(result)
 
     # --- SAVE LOGIC (ONLY IF NOT A COMMAND) ---
     # This prevents her from saving "Send me a reminder" as a note
     if result.get("type") != "command":
         item_type = result.get("type")
         db_key = "events" if item_type == "event" else "knowledge" if item_type == "note" else "tasks"
-        target_mod = result.get("module", manual_module)
-        
-        if target_mod not in data["Modules"]: data["Modules"][target_mod] = {"tasks": [], "events": [], "knowledge": []}
-        if db_key not in data["Modules"][target_mod]: data["Modules"][target_mod][db_key] = []
+        target_mod = result.get("module") or manual_module
 
         item = {
-            "id": len(data["Modules"][target_mod][db_key]) + 1,
+            "id": store.new_id(),
             "title": result.get("title"),
             "details": result.get("details"),
-            "date": result.get("date", get_current_date_str()),
+            "date": result["date"],
             "created_at": get_beijing_time_str()
         }
-        if item_type == "event": item["time"] = result.get("time", "09:00")
+        if item_type == "event": item["time"] = result["time"]
+        result["module"] = target_mod
             
-        data["Modules"][target_mod][db_key].append(item)
-        save_data(data)
+        with tracing.span("store.add", type=db_key): get_store().add_item(target_mod, db_key, item)
     
-    # --- ACTIONS ---
+    # --- ACTIONS (remote side effects are queued in the outbox once the local save committed) ---
+    # Only effects that were actually queued are reported; a missing integration stays silent
+    effects = {}
     if result.get("type") == "event":
-        iso = f"{result.get('date')}T{result.get('time','09:00')}:00"
-        buffer = result.get("reminder_minutes", 10)
-        success = add_google_calendar_event(result.get('title'), iso, reminder_minutes=buffer)
-        result["calendar_status"] = success
+        iso = f"{result['date']}T{result['time']}:00"
+        buffer = result["reminder_minutes"]
+        effects["calendar_status"] = add_google_calendar_event(result.get('title'), iso, reminder_minutes=buffer)
         result["buffer"] = buffer
 
     # Send Telegram if explicit request OR if it is a Command
     if result.get("notify_telegram") == True or result.get("type") == "command":
         # If command, send details. If item, send title.
         txt = result.get("details") if result.get("type") == "command" else result.get("title")
-        send_telegram_alert(f"📱 **Andy:**\n{txt}")
-        result["telegram_sent"] = True
-        
+        effects["telegram_sent"] = send_telegram_alert(f"📱 **Andy:**\n{txt}")
+
+    result["effects"] = {name: fut for name, fut in effects.items() if fut is not None}
+    return gather_effects(result) if wait else result
+
+def _matches(value, fmt):
+    try: datetime.datetime.strptime(str(value), fmt)
+    except ValueError: return False
+    return True
+
+def _fill_defaults(result):
+    """
+    The router's tool schema doesn't require date, time or reminder_minutes, so a payload
+    may leave them out or send nulls: default them before anything is saved or queued.
+    """
+    if not _matches(result.get("date"), "%Y-%m-%d"): result["date"] = get_current_date_str()
+    if result.get("type") == "event":
+        if not _matches(result.get("time"), "%H:%M"): result["time"] = "09:00"
+        try: result["reminder_minutes"] = max(int(result.get("reminder_minutes")), 0)
+        except (TypeError, ValueError): result["reminder_minutes"] = 10
+
+# Seconds to wait for each remote effect before reporting it as still pending (None)
+EFFECT_TIMEOUTS = {"calendar_status": 15, "telegram_sent": 10}
+
+def iter_effects(result):
+    """
+    Yields (name, outcome) for each pending side effect of a process_assistant_input(wait=False)
+    result as soon as it finishes, and records the outcome in result[name].
+    False means the first attempt failed and the outbox keeps retrying; an effect that exceeds
+    its EFFECT_TIMEOUTS entry is reported as None (still queued).
+    """
+    pending = {fut: name for name, fut in (result.pop("effects", None) or {}).items()}
+    start = time.monotonic()
+    while pending:
+        elapsed = time.monotonic() - start
+        timeout = max(min(EFFECT_TIMEOUTS[n] for n in pending.values()) - elapsed, 0)
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for fut in done:
+            name = pending.pop(fut)
+            try: result[name] = bool(fut.result())
+            except Exception as e:
+                print(f"❌ {name} failed: {e}")
+                result[name] = False
+            yield name, result[name]
+        elapsed = time.monotonic() - start
+        for fut, name in list(pending.items()):
+            if elapsed >= EFFECT_TIMEOUTS[name]:
+                del pending[fut]
+                result[name] = None
+                yield name, None
+
+def gather_effects(result):
+    for _ in iter_effects(result): pass
     return result
 
-def chat_with_emily(user_message, history):
+def _summarize_turns(summary, evicted):
+    """Running summary of chat turns that left the history window (memory.ChatMemory)"""
     client = get_openai_client()
-    if not client: return "⚠️ API Key Missing."
+    if not client: return memory.fallback_summary(summary, evicted)
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in evicted)
+    messages = [
+        {"role": "system", "content": f"Update the running summary of a conversation between a student and their assistant Andy. Keep facts, decisions, open questions and preferences; drop small talk. At most {memory.SUMMARY_TOKENS} tokens."},
+        {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"},
+    ]
+    def compute():
+        with tracing.span("openai.summary", bytes_in=_text_size(messages)) as span:
+            resp = client.chat.completions.create(model="gpt-4o", messages=messages, max_tokens=memory.SUMMARY_TOKENS)
+            span.set(bytes_out=len(resp.choices[0].message.content or ""))
+        return resp.choices[0].message.content
+    try: return cached_llm("chat_summary", ["gpt-4o", messages[1]["content"]], compute)
+    except Exception as e:
+        print(f"❌ Summary Error: {e}")
+        return memory.fallback_summary(summary, evicted)
 
-    # 1. CHECK INTENT (Router)
-    router_prompt = f"""
-    Analyze user input. 
-    Current Date: {get_current_date_str()}.
-    
-    Does the user want to:
-    A. PERFORM an action (create task, schedule event, save note).
-    B. QUERY the calendar (ask "what do I have on Friday?", "am I free?").
-    C. CHAT (general conversation).
-    
-    Output one word: ACTION, QUERY, or CHAT.
+def get_chat_memory():
+    """This session's history manager (kept in st.session_state)"""
+    if "chat_memory" not in st.session_state:
+        st.session_state.chat_memory = memory.ChatMemory(CHAT_HISTORY_TOKENS, summarize=_summarize_turns)
+    return st.session_state.chat_memory
+
+def chat_with_emily(user_message, history):
+    return "".join(chat_with_emily_stream(user_message, history))
+
+def chat_with_emily_stream(user_message, history):
     """
-    check = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role":"system","content":router_prompt}, {"role":"user","content":user_message}]
-    )
-    intent = check.choices[0].message.content.upper()
+    Generator version of chat_with_emily: yields the reply in pieces as they become
+    available (model tokens for QUERY/CHAT, a status line first for ACTION).
+    """
+    # One trace per turn: the route, calendar, store and Telegram spans below nest in it
+    with tracing.span("chat.turn", bytes_in=len(user_message)) as turn:
+        yield from _chat_turn(user_message, history, turn)
 
-    # 2. HANDLE INTENTS
-    
-    # --- QUERY CALENDAR (READ) ---
-    if "QUERY" in intent:
-        # Ask GPT to extract the date
-        date_extract = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role":"system","content":f"Extract the target date from the user's question. Current Date: {get_current_date_str()}. Output ONLY YYYY-MM-DD."},
-                {"role":"user","content":user_message}
-            ]
-        )
-        target_date = date_extract.choices[0].message.content.strip()
-        
-        # Check API
-        calendar_data = check_calendar_availability(target_date)
-        
-        # Synthesize Answer
-        final_answer = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+def _chat_turn(user_message, history, turn):
+    client = get_openai_client()
+    if not client:
+        yield "⚠️ API Key Missing."
+        return
+    started = time.perf_counter()
+    first_token = None
+    llm_calls = 0
+
+    def count_call():
+        nonlocal llm_calls
+        llm_calls += 1
+
+    def counted(fn):
+        def run():
+            count_call()
+            return fn()
+        return run
+
+    # 1. ROUTE: deterministic fast path first, otherwise ONE structured model call
+    #    that returns intent, date and action payload together
+    now = datetime.datetime.now(BEIJING_TZ)
+    route_error = None
+    with tracing.span("chat.route") as span:
+        route = router.classify_local(user_message, now.date(), get_all_classes())
+        path = "local" if route else "llm"
+        span.set(path=path)
+        if not route:
+            try:
+                route = cached_llm(
+                    "router", ["gpt-4o", user_message],
+                    counted(lambda: router.route_with_llm(client, user_message, now.strftime("%Y-%m-%d %H:%M"))),
+                    time_sensitive=bool(TIME_SENSITIVE_RE.search(user_message)),
+                )
+            except Exception as e:
+                route_error = e
+                span.set(outcome="error", error=str(e)[:300])
+    if route_error:
+        turn.set(outcome="error", path=path)
+        yield f"❌ Error: {str(route_error)}"
+        return
+    intent = route["intent"]
+
+    def replies():
+        # --- QUERY CALENDAR (READ) ---
+        if intent == "QUERY":
+            target_date = route.get("date") or get_current_date_str()
+            calendar_data = check_calendar_availability(target_date)
+            
+            # Synthesize Answer (cached while the calendar data stays the same)
+            messages = [
                 {"role":"system","content":"You are Andy. Report the schedule to the user based on the data provided."},
-                {"role":"user","content":f"User Question: {user_message}\nCalendar Data: {calendar_data}"}
+                {"role":"user","content":f"User Question: {user_message}\nDate: {target_date}\nCalendar Data: {calendar_data}"}
             ]
-        )
-        return final_answer.choices[0].message.content
-
-    # --- ACTION (WRITE) ---
-    elif "ACTION" in intent:
-        res = process_assistant_input(user_message)
-        if "error" in res: return f"❌ Error: {res['error']}"
-        
-        msg = "✅ **Handled.**"
-        if res.get("type") == "event":
-            buffer = res.get("buffer", 10)
-            msg += f" Scheduled **{res.get('title')}**."
-            msg += f" (Alert {buffer} mins prior)."
-        elif res.get("type") == "note":
-             msg += f" Saved note to **{res.get('module')}**."
-        else:
-            msg += f" Added task **{res.get('title')}**."
+            yield from stream_llm(client, messages, site="query_answer", parts=["gpt-4o", messages[1]["content"]], on_call=count_call)
+
+        # --- ACTION (WRITE) ---
+        elif intent == "ACTION":
+            action = route.get("action")
+            # Show what we understood right away; saving and calendar sync follow
+            if action and action.get("title"):
+                yield f"⏳ On it: {action.get('type', 'task')} **{action['title']}**…\n\n"
+            # The router already extracted the payload; only re-classify if it didn't
+            if not action: count_call()  # upper bound: the capture cache may answer
+            res = process_assistant_input(user_message, parsed=action, wait=False)
+            if "error" in res:
+                yield f"❌ Error: {res['error']}"
+                return
             
-        if res.get("telegram_sent"): msg += " 📲 Sent to phone."
-        return msg
-        
-    # --- CHAT ---
-    else:
-        msgs = [{"role":"system","content":"You are Andy Sachs. Professional, efficient."}] + history + [{"role":"user","content":user_message}]
-        return client.chat.completions.create(model="gpt-4o", messages=msgs).choices[0].message.content
+            msg = "✅ **Handled.**"
+            if res.get("type") == "event":
+                buffer = res.get("buffer", 10)
+                msg += f" Scheduled **{res.get('title')}**."
+                msg += f" (Alert {buffer} mins prior)."
+            elif res.get("type") == "note":
+                 msg += f" Saved note to **{res.get('module')}**."
+            else:
+                msg += f" Added task **{res.get('title')}**."
+            yield msg
+            
+            # Remote effects report in as they finish (sent by the outbox thread, traced there)
+            with tracing.span("chat.effects", effects=",".join(res["effects"])) if res["effects"] else tracing.NOOP:
+                for name, ok in iter_effects(res):
+                    if name == "telegram_sent" and ok: yield " 📲 Sent to phone."
+                    elif name == "calendar_status" and ok is False: yield " ⚠️ Calendar unreachable, will retry."
+                    elif name == "telegram_sent" and ok is False: yield " ⚠️ Telegram unreachable, will retry."
+                    elif ok is None: yield " ⏳ Still syncing in the background."
+            
+        # --- CHAT ---
+        else:
+            system = "You are Andy Sachs. Professional, efficient."
+            # Ground the answer in the user's own tasks, events and notes
+            context = retrieve_context(user_message)
+            if context:
+                system += "\n\nRelevant items from the user's records (use them when they help; don't invent others):\n"
+                system += "\n".join(f"- {hit['text'][:CONTEXT_CHARS]}" for hit in context)
+            # Recent turns verbatim, older ones as a running summary
+            msgs = [{"role":"system","content":system}] + get_chat_memory().window(history) + [{"role":"user","content":user_message}]
+            yield from stream_llm(client, msgs, on_call=count_call)
+
+    # 2. HANDLE INTENTS
+    try:
+        for piece in replies():
+            if first_token is None: first_token = time.perf_counter() - started
+            yield piece
+    except Exception as e:
+        turn.set(outcome="error", error=str(e)[:300])
+        yield f"❌ Error: {str(e)}"
+    finally:
+        router.record(intent, path, llm_calls, time.perf_counter() - started, first_token)
+        turn.set(intent=intent, path=path, llm_calls=llm_calls,
+                 first_token_ms=round(first_token * 1000, 1) if first_token is not None else None)
 
 # --- 6. UI HELPERS ---
 def delete_item(mod, type_, id_):
-    data = load_data()
-    if mod in data["Modules"] and type_ in data["Modules"][mod]:
-        # Filter out the item with the matching ID
-        original_len = len(data["Modules"][mod][type_])
-        
-        # Keep items that DO NOT match the ID
-        data["Modules"][mod][type_] = [
-            i for i in data["Modules"][mod][type_] 
-            if str(i.get("id")) != str(id_)
-        ]
-        
-        # Save only if something actually changed
-        if len(data["Modules"][mod][type_]) < original_len:
-            save_data(data)
+    # Journals a delete only if an item with that ID actually exists (id index lookup)
+    with tracing.span("store.delete", type=type_): get_store().delete_item(mod, type_, id_)
 
 def add_manual_item(mod, type_, title, details, date):
-    data = load_data()
-    if mod not in data["Modules"]: data["Modules"][mod] = {"tasks": [], "events": [], "knowledge": []}
-    if type_ not in data["Modules"][mod]: data["Modules"][mod][type_] = []
-    new_id = len(data["Modules"][mod][type_]) + 1
-    item = {"id": new_id, "title": title, "details": details, "date": date}
-    data["Modules"][mod][type_].append(item)
-    save_data(data)
-
-def analyze_speech_coach(transcript):
+    item = {"id": store.new_id(), "title": title, "details": details, "date": date}
+    with tracing.span("store.add", type=type_): get_store().add_item(mod, type_, item)
+
+def get_module_options(modules):
+    """Module dropdown: General first, then schedule classes and stored modules A-Z"""
+    return ["General"] + sorted(set(get_all_classes() + list(modules)) - {"General"})
+
+def get_focus_items(today_str):
+    """Today's Focus sidebar: [{"mod", "type", "item"}] dated today (indexed lookup)"""
+    return [{"mod": mod, "type": type_, "item": item} for mod, type_, item in get_items_between(today_str, today_str)]
+
+def get_week_events(week_dates):
+    """Week grid: {"YYYY-MM-DD": [(module, event)]} from one range query over the week"""
+    week_events = {}
+    for mod, _, event in get_items_between(week_dates[0].strftime("%Y-%m-%d"), week_dates[-1].strftime("%Y-%m-%d"), types=("events",)):
+        week_events.setdefault(event["date"], []).append((mod, event))
+    return week_events
+
+def analyze_speech_coach(transcript, words=()):
+    """
+    Delivery metrics (grade, pacing, fillers, pauses, repetition) are computed locally from
+    the word timestamps (speech.py); only the free-text critique comes from gpt-4o, and it
+    runs while the metrics are computed.
+    """
     client = get_openai_client()
-    if not client: return {"grade": "N/A", "critique": "API Key Missing"}
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o", 
-            messages=[{"role": "user", "content": f"Analyze speech. Grade (A-F), score pacing (1-10), count fillers. JSON. Text: {transcript}"}],
-            response_format={"type": "json_object"}
-        )
-        return json.loads(response.choices[0].message.content)
-    except:
-        return {"grade": "N/A", "pacing_score": 0, "filler_count": 0, "critique": "Error analyzing."}
+    def critique():
+        messages = [{"role": "user", "content": f"Critique this practice speech in 2-4 sentences: structure, clarity, delivery. Plain text. Text: {transcript}"}]
+        with tracing.span("openai.coach", bytes_in=_text_size(messages)) as span:
+            response = client.chat.completions.create(model="gpt-4o", messages=messages)
+            span.set(bytes_out=len(response.choices[0].message.content or ""))
+        return response.choices[0].message.content
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="coach") as pool:
+        pending = pool.submit(cached_llm, "coach", ["gpt-4o", "critique", transcript], critique) if client else None
+        stats = speech.analyze(words, fillers=COACH_FILLERS)
+        try: stats["critique"] = pending.result() if pending else "API Key Missing"
+        except Exception: stats["critique"] = "Error analyzing."
+    return stats
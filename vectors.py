@@ -0,0 +1,295 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    slot INTEGER PRIMARY KEY,
+    module TEXT NOT NULL,
+    type TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE (module, type, item_id)
+);
+CREATE TABLE IF NOT EXISTS free (slot INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, vector BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+LABELS = {"tasks": "Task", "events": "Event", "knowledge": "Note"}
+EMBED_BATCH = 256     # texts per embedding request
+EMBED_CHARS = 8000    # longer items are embedded by their beginning (the model reads ~8k tokens)
+MIN_CAPACITY = 1024   # rows; the matrix file doubles when full
+MAX_PENDING = 10000   # ops held between syncs before falling back to a full comparison
+
+
+def item_text(module, type_, item):
+    """What gets embedded (and shown to the model) for a stored item"""
+    head = f"{LABELS.get(type_, type_)} ({module}{', ' + str(item['date']) if item.get('date') else ''}): {item.get('title', '')}"
+    details = str(item.get("details") or "").strip()
+    return (head + ("\n" + details if details else ""))[:EMBED_CHARS]
+
+
+class VectorIndex:
+    """
+    Embeddings of every stored item in a memory-mapped float32 matrix (`matrix_path`,
+    one unit-length row per item), searched by cosine similarity with one matrix-vector
+    product. Row bookkeeping and an embedding cache keyed by content hash live in SQLite
+    (`path`), so an unchanged or reverted item is never embedded twice.
+
+    Several processes may share the files: rows are handed out and freed only inside a
+    SQLite write transaction, and each process reloads its view of which rows are in use
+    when the `generation` in state moves.
+
+    Store writes are collected through Store.subscribe and embedded on the next
+    ensure_current(), all missing texts in EMBED_BATCH-sized requests; request_sync() runs
+    it on a background thread instead. When the ops since the last sync aren't all known
+    (restart, other processes, whole-document saves) every item's content hash is compared.
+    """
+
+    def __init__(self, path, matrix_path, dimensions, model):
+        self.dimensions = dimensions
+        self.model = model
+        self.matrix_path = matrix_path
+        self.embed_calls = 0
+        self._lock = threading.RLock()     # the connection and the in-memory view
+        self._sync_lock = threading.Lock()  # one sync at a time; held while embedding
+        self._wake = threading.Event()
+        self._worker = None
+        self._job = None
+        self._pending = []  # [(ops, version)] since the last sync, or None: compare everything
+        self._pending_ops = 0
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        layout = f"{model}/{dimensions}"
+        if self._state("layout") != layout:  # new file, or another model: start over
+            self._db.executescript("DELETE FROM items; DELETE FROM free; DELETE FROM state;")
+            self._set_state("layout", layout)
+            if os.path.exists(matrix_path): os.remove(matrix_path)
+        self._active = np.zeros(0, dtype=bool)
+        self._open(MIN_CAPACITY)
+        self._reload()
+
+    # Matrix file
+    def _open(self, capacity):
+        row_bytes = self.dimensions * 4
+        size = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+        capacity = max(capacity, size // row_bytes)
+        if size < capacity * row_bytes:
+            with open(self.matrix_path, "ab") as f: f.truncate(capacity * row_bytes)  # zero-filled
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+        self._active = np.concatenate([self._active, np.zeros(len(self._matrix) - len(self._active), dtype=bool)])
+
+    def _refresh(self):
+        """Reloads the rows in use if any process committed a sync since we last looked"""
+        if self._state("generation") != self._generation: self._reload()
+
+    def _reload(self):
+        generation = self._state("generation")  # read first: a commit racing the reload only causes another one
+        self._high = self._high_mark()
+        if self._high > len(self._matrix): self._open(self._high)  # another process grew the file
+        self._active[:] = False
+        self._active[[row[0] for row in self._db.execute("SELECT slot FROM items")]] = True
+        self._generation = generation
+
+    def _high_mark(self):
+        """Rows in use are all below this"""
+        high = self._state("high")
+        return int(high) if high is not None else self._db.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM items").fetchone()[0]
+
+    def _slot(self):
+        """A free row; only called inside the write transaction, so no two processes get the same one"""
+        row = self._db.execute("SELECT MIN(slot) FROM free").fetchone()
+        if row[0] is not None:
+            self._db.execute("DELETE FROM free WHERE slot = ?", row)
+            return row[0]
+        if self._high == len(self._matrix):
+            self._matrix.flush()
+            self._open(2 * len(self._matrix))
+        self._high += 1
+        self._set_state("high", self._high)
+        return self._high - 1
+
+    # Bookkeeping
+    def _state(self, key):
+        row = self._db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key, value):
+        self._db.execute(
+            "INSERT INTO state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value))
+        )
+
+    def content_hash(self, text):
+        return hashlib.sha256(f"{self.model}/{self.dimensions}\n{text}".encode("utf-8")).hexdigest()
+
+    def on_change(self, ops, version):
+        """Store listener (see Store.subscribe); runs under the store's write lock, so it only takes notes"""
+        with self._lock:
+            if self._pending is None: return
+            self._pending_ops += len(ops) if ops is not None else 0
+            if ops is None or self._pending_ops > MAX_PENDING: self._pending = None
+            else: self._pending.append((ops, version))
+
+    def _touched(self, pending, synced, version):
+        """(module, type, id) keys changed between versions `synced` and `version`, None if unknown"""
+        if pending is None or synced is None: return None
+        keys, at = set(), synced
+        for ops, to in pending:
+            first = to - len(ops) + 1
+            if to <= at: continue
+            if first > at + 1: return None
+            for op in ops[at + 1 - first:]:
+                if op["op"] in ("add", "delete"):
+                    keys.add((op["mod"], op["type"], str(op["item"].get("id") if op["op"] == "add" else op["id"])))
+            at = to
+        return keys if at == version else None
+
+    # Syncing
+    def ensure_current(self, db, embed):
+        """
+        Brings the index up to the store's version. `embed(texts)` returns one vector per
+        text and is only called for texts whose content hash has no cached embedding.
+        Searches keep answering from the rows already indexed while it waits on `embed`.
+        """
+        doc = db.load()  # may replay other processes' ops into on_change first
+        version = doc["Meta"].get("version", 0)
+        with self._sync_lock:
+            with self._lock:
+                pending, self._pending, self._pending_ops = self._pending, [], 0
+                synced = self._state("version")
+                synced = int(synced) if synced is not None else None
+                if synced == version: return
+                texts, existing = self._diff(doc, self._touched(pending, synced, version))
+            changed = {}
+            for key, text in texts.items():
+                h = self.content_hash(text)
+                if existing.get(key, (None, None))[1] != h: changed[key] = (text, h)
+            vectors = self._vectors({h: text for text, h in changed.values()}, embed)
+            with self._lock: self._apply(existing.keys() - texts.keys(), changed, vectors, version)
+
+    def request_sync(self, db, embed):
+        """ensure_current() on the index's worker thread; returns at once"""
+        with self._lock:
+            self._job = (db, embed)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embed", daemon=True)
+                self._worker.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # Cleared before syncing: a write that lands during the sync asks for another
+            self._wake.clear()
+            try: self.ensure_current(*self._job)
+            except Exception as e: print(f"❌ Embedding Error: {e}")
+
+    def _diff(self, doc, keys):
+        """({key: text} of the store's items, {key: (slot, hash)} indexed now), for `keys` or everything"""
+        texts = {}  # (module, type, id) -> text; items sharing an id are embedded together
+        for module, content in doc["Modules"].items():
+            for type_, items in content.items():
+                if keys is not None and not any(k[0] == module and k[1] == type_ for k in keys): continue
+                for item in items:
+                    key = (module, type_, str(item.get("id")))
+                    if keys is not None and key not in keys: continue
+                    text = item_text(module, type_, item)
+                    texts[key] = texts[key] + "\n\n" + text if key in texts else text
+        if keys is None:
+            existing = {(m, t, i): (slot, h) for slot, m, t, i, h in self._db.execute("SELECT slot, module, type, item_id, hash FROM items")}
+        else:
+            existing = {}
+            for key in keys:
+                row = self._db.execute("SELECT slot, hash FROM items WHERE module = ? AND type = ? AND item_id = ?", key).fetchone()
+                if row: existing[key] = row
+        return texts, existing
+
+    def _apply(self, removed, changed, vectors, version):
+        """Writes a sync's result. Rows are looked up again inside the transaction, since
+        another process may have synced the same items while we were embedding."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            synced = self._state("version")
+            if synced is not None and int(synced) >= version:  # another process got here first
+                self._db.execute("ROLLBACK")
+                return
+            self._refresh()
+            for key in removed:
+                row = self._db.execute("SELECT slot FROM items WHERE module = ? AND type = ? AND item_id = ?", key).fetchone()
+                if not row: continue
+                self._db.execute("DELETE FROM items WHERE slot = ?", row)
+                self._db.execute("INSERT INTO free (slot) VALUES (?)", row)
+                self._matrix[row[0]] = 0
+                self._active[row[0]] = False
+            for key, (text, h) in changed.items():
+                row = self._db.execute("SELECT slot, hash FROM items WHERE module = ? AND type = ? AND item_id = ?", key).fetchone()
+                if row and row[1] == h: continue
+                slot = row[0] if row else self._slot()
+                self._matrix[slot] = vectors[h]
+                self._active[slot] = True
+                self._db.execute(
+                    "INSERT INTO items (slot, module, type, item_id, hash, text) VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(slot) DO UPDATE SET hash = excluded.hash, text = excluded.text",
+                    (slot, *key, h, text),
+                )
+            self._matrix.flush()
+            self._generation = str(int(self._generation or 0) + 1)
+            self._set_state("generation", self._generation)
+            self._set_state("version", version)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            self._generation = "stale"  # reload on next use: the in-memory view may be ahead of the file
+            raise
+
+    def _vectors(self, texts, embed):
+        """{hash: unit float32 vector} for {hash: text}, embedding only what isn't cached"""
+        out = {}
+        hashes = list(texts)
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows = self._db.execute(f"SELECT hash, vector FROM embeddings WHERE hash IN ({','.join('?' * len(chunk))})", chunk)
+                out.update((h, np.frombuffer(blob, dtype=np.float32)) for h, blob in rows)
+        missing = [h for h in hashes if h not in out]
+        for i in range(0, len(missing), EMBED_BATCH):
+            batch = missing[i:i + EMBED_BATCH]
+            self.embed_calls += 1
+            vectors = [self.normalize(vector) for vector in embed([texts[h] for h in batch])]
+            with self._lock:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings (hash, vector) VALUES (?, ?)", [(h, v.tobytes()) for h, v in zip(batch, vectors)])
+            out.update(zip(batch, vectors))
+        return out
+
+    def normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    # Reading
+    def search(self, vector, k=8, min_score=0.0):
+        """[{"score", "module", "type", "id", "text"}] of the k items closest to `vector`"""
+        query = self.normalize(vector)
+        with self._lock:
+            self._refresh()
+            if not self._high: return []
+            scores = self._matrix[:self._high] @ query
+            scores[~self._active[:self._high]] = -np.inf
+            k = min(k, self._high)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            hits = []
+            for slot in top:
+                if scores[slot] < min_score: break
+                row = self._db.execute("SELECT module, type, item_id, text FROM items WHERE slot = ?", (int(slot),)).fetchone()
+                if row: hits.append({"score": round(float(scores[slot]), 4), "module": row[0], "type": row[1], "id": row[2], "text": row[3]})
+        return hits
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return int(self._active.sum())